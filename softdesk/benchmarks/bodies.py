@@ -0,0 +1,107 @@
+"""
+Latency of the issue and comment list pages when descriptions are long.
+
+A project is filled with issues and comments whose Markdown descriptions are about
+``--body-size`` characters. The list endpoints, which defer the compressed descriptions
+and send their excerpts, are measured over HTTP; the query and serialization of a
+list page are then timed with the excerpts and with the full descriptions, as list
+responses were built before. Run from the ``softdesk`` directory:
+
+    python -m benchmarks.bodies --issues 500 --body-size 20000 --requests 100
+"""
+import argparse
+import random
+import tempfile
+import time
+
+WORDS = ('issue', 'login', 'crash', 'stack', 'trace', 'server', 'client', 'request', 'timeout', 'cache', 'retry',
+         'fix', 'deploy', 'token', 'user', 'page', 'error', 'expected', 'actual', 'steps', 'reproduce', 'version')
+
+
+def markdown(rng, size):
+    """Return a Markdown body of about ``size`` characters, with headings, lists and code."""
+    parts = []
+    while sum(len(part) for part in parts) < size:
+        parts.append(f"## {' '.join(rng.choices(WORDS, k=3))}\n")
+        parts.append(' '.join(rng.choices(WORDS, k=60)) + '.\n')
+        parts.append(''.join(f"- **{rng.choice(WORDS)}** {' '.join(rng.choices(WORDS, k=6))}\n" for _ in range(4)))
+        parts.append(f"```\n{' '.join(rng.choices(WORDS, k=12))}\n```\n")
+    return ''.join(parts)[:size]
+
+
+def fill_bodies(project, size):
+    """Give every issue and comment of a project a long Markdown description, with bulk updates."""
+    from projects.fields import excerpt
+    from projects.models import Comment, Issue
+
+    rng = random.Random(0)
+    for model, lookup in ((Issue, 'project'), (Comment, 'issue__project')):
+        rows = list(model.objects.filter(**{lookup: project}).only('pk'))
+        length = model._meta.get_field('excerpt').max_length
+        for row in rows:
+            row.description = markdown(rng, size)
+            row.excerpt = excerpt(row.description, length)
+        model.objects.bulk_update(rows, ['description', 'excerpt'], batch_size=200)
+
+
+def per_call(function, calls):
+    """Return the mean duration (ms) of a call of the function."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--issues', type=int, default=200, help="Issues of the project.")
+    parser.add_argument('--comments', type=int, default=50, help="Comments of the measured issue.")
+    parser.add_argument('--body-size', type=int, default=10000, help="Characters per description.")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per scenario.")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        from benchmarks.partitioning import configure, create_tenant, measure, report
+        configure(directory)
+        from django.db import connection
+        from rest_framework.test import APIClient
+
+        from projects.models import Comment, Issue, comment_path
+        from projects.serializers import IssueListSerializer, IssueSerializer
+
+        project, owner = create_tenant('bodies', users=3, issues=options.issues, comments_per_issue=0)
+        issue = Issue.objects.filter(project=project).first()
+        comments = Comment.objects.bulk_create([Comment(description='benchmark', issue=issue, author=owner)
+                                                for _ in range(options.comments)])
+        for comment in comments:
+            comment.path = comment_path('', comment.pk)
+        Comment.objects.bulk_update(comments, ['path'])
+        fill_bodies(project, options.body_size)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT SUM(LENGTH(description)) FROM projects_issue')
+            stored = cursor.fetchone()[0]
+        print(f'issue descriptions: {options.issues * options.body_size / 1e6:.1f} MB of text, '
+              f'{stored / 1e6:.2f} MB stored compressed')
+
+        client = APIClient()
+        client.force_authenticate(owner)
+        urls = {
+            'issue list (excerpts)': f'/projects/{project.pk}/issues/',
+            'comment list (excerpts)': f'/projects/{project.pk}/issues/{issue.pk}/comments/',
+            'issue detail (full body)': f'/projects/{project.pk}/issues/{issue.pk}/',
+        }
+        measure(client, list(urls.values()), 10)  # Warm up the connection and caches.
+        for label, url in urls.items():
+            report(label, measure(client, [url], options.requests))
+
+        issues = Issue.objects.filter(project=project)
+        calls = max(1, options.requests // 10)
+        full = per_call(lambda: IssueSerializer(issues.all(), many=True).data, calls)
+        excerpts = per_call(lambda: IssueListSerializer(issues.defer('description'), many=True).data, calls)
+        print(f'issue list page, full bodies (former) {full:9.2f} ms')
+        print(f'issue list page, excerpts             {excerpts:9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
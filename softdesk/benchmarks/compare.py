@@ -0,0 +1,97 @@
+"""
+Compare benchmark results with a baseline and flag the significant regressions.
+
+A benchmark regressed when its median time grew by more than ``--threshold`` and the
+two-sided Mann-Whitney U test of its samples against the baseline's gives a p-value
+under ``--alpha``: a slowdown within the noise of either run is not reported. The
+test needs at least 5 samples per run to reach p < 0.05. The command exits with
+status 1 when a benchmark regressed, for use in CI. Run from the ``softdesk`` directory:
+
+    python -m benchmarks.compare benchmarks/baselines/baseline.json results.json
+"""
+import argparse
+import json
+import math
+import sys
+
+
+def rank(values):
+    """Return the ranks of the values (1-based, ties sharing their mean rank) and the tie correction term."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks, ties, start = [0.0] * len(values), 0, 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for position in range(start, end + 1):
+            ranks[order[position]] = (start + end) / 2 + 1
+        count = end - start + 1
+        ties += count ** 3 - count
+        start = end + 1
+    return ranks, ties
+
+
+def mann_whitney(first, second):
+    """
+    Return the two-sided p-value of the Mann-Whitney U test that two samples come from
+    the same distribution, by the normal approximation with tie and continuity corrections.
+    """
+    n1, n2 = len(first), len(second)
+    n = n1 + n2
+    ranks, ties = rank(list(first) + list(second))
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = max(0.0, abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline, results, threshold, alpha):
+    """
+    Compare the benchmarks present in both runs.
+    Returns:
+        list: (name, baseline median, median, ratio, p-value, verdict) tuples; the verdict
+              is 'regression', 'improvement' or '' when the change is not significant.
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name], result
+        ratio = after['median'] / before['median']
+        p_value = mann_whitney(before['samples'], after['samples'])
+        verdict = ''
+        if p_value < alpha and ratio > threshold:
+            verdict = 'regression'
+        elif p_value < alpha and ratio < 1 / threshold:
+            verdict = 'improvement'
+        rows.append((name, before['median'], after['median'], ratio, p_value, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', type=argparse.FileType(), help="Results of the reference run.")
+    parser.add_argument('results', type=argparse.FileType(), help="Results of the run to check.")
+    parser.add_argument('--threshold', type=float, default=1.10, help="Ratio of the medians reported as a change.")
+    parser.add_argument('--alpha', type=float, default=0.05, help="Significance level of the test.")
+    options = parser.parse_args()
+    baseline, results = json.load(options.baseline), json.load(options.results)
+
+    if baseline['machine'] != results['machine']:
+        print("Warning: the runs come from different machines; their times are not comparable.", file=sys.stderr)
+    rows = compare(baseline['results'], results['results'], options.threshold, options.alpha)
+    for name, before, after, ratio, p_value, verdict in rows:
+        print(f"{name:<44} {before * 1e6:12.1f} µs -> {after * 1e6:12.1f} µs  x{ratio:5.2f}  p={p_value:.4f}  {verdict}")
+    for name in sorted(set(baseline['results']) ^ set(results['results'])):
+        print(f"{name:<44} only in the {'baseline' if name in baseline['results'] else 'results'}")
+
+    regressions = [row[0] for row in rows if row[5] == 'regression']
+    if regressions:
+        print(f"{len(regressions)} significant regression(s): {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
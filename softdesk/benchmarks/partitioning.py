@@ -0,0 +1,125 @@
+"""
+Latency of a small tenant's issue endpoints next to a large tenant.
+
+The small project is measured alone, then once a large project shares the issue and
+comment tables, then once the large project is moved to its own partition. Run from
+the ``softdesk`` directory:
+
+    python -m benchmarks.partitioning --issues 50000 --requests 300
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+def configure(directory):
+    """Point the settings to two fresh SQLite files: the default database and a partition."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'softdesk.settings')
+    import django
+    from django.conf import settings
+
+    settings.DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': Path(directory) / 'default.sqlite3'},
+        'partition': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': Path(directory) / 'partition.sqlite3'},
+    }
+    settings.DATABASE_ID_BLOCKS = {'partition': 1}
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.DEBUG = False
+    # Benchmarks send far more requests than a client may.
+    settings.THROTTLE_RATES = {}
+    settings.THROTTLE_ROUTE_RATES = {}
+    django.setup()
+
+    from django.core.management import call_command
+    for alias in settings.DATABASES:
+        call_command('migrate', database=alias, verbosity=0)
+
+
+def create_tenant(name, users, issues, comments_per_issue):
+    """Create a project with its contributors, issues and comments using bulk inserts."""
+    from projects.models import Comment, Contributor, CustomProject, Issue, comment_path
+    from users.models import CustomUser
+
+    members = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{name}-{index}', date_of_birth=date(1990, 1, 1), can_be_contacted=False,
+                   can_data_be_shared=False)
+        for index in range(users)
+    ])
+    project = CustomProject.objects.create(name=name, description=name, type='BACKEND', author=members[0])
+    contributors = Contributor.objects.bulk_create([
+        Contributor(user=user, project=project, role='OWNER' if user == members[0] else 'MEMBER') for user in members
+    ])
+    for start in range(0, issues, 1000):
+        batch = Issue.objects.bulk_create([
+            Issue(name=f'{name} issue {index}', description='benchmark', project=project,
+                  user=contributors[index % users], author=contributors[0])
+            for index in range(start, min(start + 1000, issues))
+        ])
+        comments = Comment.objects.bulk_create([
+            Comment(description='benchmark', issue=issue, author=members[index % users])
+            for issue in batch for index in range(comments_per_issue)
+        ])
+        for comment in comments:
+            comment.path = comment_path('', comment.pk)
+        Comment.objects.bulk_update(comments, ['path'])
+    return project, members[0]
+
+
+def measure(client, urls, requests):
+    """Return the latencies (ms) of ``requests`` GET requests spread over the URLs."""
+    latencies = []
+    for index in range(requests):
+        url = urls[index % len(urls)]
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{label:<32} p50 {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--issues', type=int, default=20000, help="Issues of the large tenant.")
+    parser.add_argument('--comments', type=int, default=3, help="Comments per issue of the large tenant.")
+    parser.add_argument('--requests', type=int, default=300, help="Requests per scenario.")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory)
+        from django.conf import settings
+        from rest_framework.test import APIClient
+
+        from projects.models import Issue
+        from projects.partitions import partition_project
+
+        small, user = create_tenant('small', users=3, issues=50, comments_per_issue=3)
+        client = APIClient()
+        client.force_authenticate(user)
+        issue_ids = list(Issue.objects.filter(project=small).values_list('pk', flat=True)[:10])
+        urls = [f'/projects/{small.pk}/issues/'] + [
+            f'/projects/{small.pk}/issues/{issue_id}/comments/' for issue_id in issue_ids
+        ]
+
+        measure(client, urls, options.requests)  # Warm up the connections and caches.
+        report('small tenant alone', measure(client, urls, options.requests))
+
+        large, _ = create_tenant('large', users=20, issues=options.issues, comments_per_issue=options.comments)
+        report('large tenant in shared tables', measure(client, urls, options.requests))
+
+        partition_project(large.pk, 'partition')
+        settings.ISSUE_PARTITIONS = {large.pk: 'partition'}
+        report('large tenant partitioned', measure(client, urls, options.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Cost of the permission checks of the issue and comment endpoints.
+
+The role-based engine (``projects.permissions.can``) answers from the membership
+bitmask and the foreign key IDs of the object, and must not query the database. It is
+compared with the former checks, which compared users reached through lazy foreign
+keys. Run from the ``softdesk`` directory:
+
+    python -m benchmarks.permissions --checks 100000
+"""
+import argparse
+import tempfile
+import time
+
+
+def per_call(function, checks):
+    """Return the mean duration (µs) of a call of the function."""
+    start = time.perf_counter()
+    for _ in range(checks):
+        function()
+    return (time.perf_counter() - start) / checks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=100000, help="Checks per scenario.")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        from benchmarks.partitioning import configure, create_tenant
+        configure(directory)
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from projects.models import Comment, Contributor, Issue
+        from projects.permissions import ROLE_PERMISSIONS, Membership, can
+
+        project, owner = create_tenant('tenant', users=3, issues=10, comments_per_issue=1)
+        member = Contributor.objects.filter(project=project).exclude(user=owner).select_related('user').first()
+        membership = Membership(member.pk, member.user_id, member.role, ROLE_PERMISSIONS[member.role])
+        issue_id = Issue.objects.filter(project=project).exclude(user=member).values_list('pk', flat=True).first()
+        comment = Comment.objects.filter(issue__project=project).first()
+
+        def former_issue_check():
+            # The issue is reloaded each time so its foreign keys are not cached yet.
+            issue = Issue.objects.get(pk=issue_id)
+            return member.user == issue.user.user or member.user == project.author
+
+        issue = Issue.objects.get(pk=issue_id)
+        scenarios = [
+            # (label, check, queries spent loading the checked object itself)
+            ('issue, former check', former_issue_check, 1),
+            ('issue, engine', lambda: can(membership, 'change_issue', issue), 0),
+            ('comment, engine', lambda: can(membership, 'delete_comment', comment), 0),
+            ('project action, engine', lambda: can(membership, 'manage_webhooks'), 0),
+        ]
+        for label, check, loads in scenarios:
+            with CaptureQueriesContext(connection) as queries:
+                check()
+            extra = len(queries) - loads
+            if check is not former_issue_check:
+                assert extra == 0, f'{label} made {extra} queries'
+            checks = options.checks if extra == 0 else max(1, options.checks // 100)
+            print(f'{label:<24} {per_call(check, checks):9.3f} µs/check   {extra} extra query(ies)')
+
+
+if __name__ == '__main__':
+    main()
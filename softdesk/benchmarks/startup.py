@@ -0,0 +1,104 @@
+"""
+Boot time, import time and per-request middleware overhead of the settings profiles.
+
+Each profile (``softdesk.settings``, the full one, and ``softdesk.settings_api``, the
+API-only one) is started in fresh interpreters: the WSGI or ASGI application is imported
+and the URLconf loaded, as a worker does before its first request. A request skipping
+the database (``GET /``, redirected to the token endpoint) then measures the cost of
+the middleware chain. ``python -X importtime`` gives the import time of the boot and
+its largest imports. Run from the ``softdesk`` directory:
+
+    python -m benchmarks.startup --runs 10 --requests 2000 --entry asgi
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROFILES = ('softdesk.settings', 'softdesk.settings_api')
+ROOT = Path(__file__).resolve().parent.parent
+
+# Code of the measured interpreter; prints its timings as JSON.
+BOOT = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+__import__('softdesk.' + sys.argv[2])
+booted = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+routed = time.perf_counter()
+
+from io import BytesIO
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+           'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http'}
+requests = int(sys.argv[3])
+request_start = time.perf_counter()
+for _ in range(requests):
+    handler({**environ, 'wsgi.input': BytesIO()}, lambda status, headers: None)
+done = time.perf_counter()
+print(json.dumps({
+    'boot': (booted - start) * 1000, 'urlconf': (routed - booted) * 1000,
+    'request': (done - request_start) / requests * 1e6, 'modules': len(sys.modules),
+    'apps': len(settings.INSTALLED_APPS), 'middleware': len(settings.MIDDLEWARE),
+}))
+'''
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def boot(profile, entry, requests):
+    """Start an interpreter on the profile and return its timings, with the process wall time (ms)."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', BOOT, profile, entry, str(requests)], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    timings = json.loads(output.splitlines()[-1])
+    timings['process'] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def import_times(profile, entry):
+    """Return the total import time (ms) of a boot and its imports as (cumulative ms, name), by top-level import."""
+    code = (f"import os; os.environ['DJANGO_SETTINGS_MODULE'] = {profile!r}; import softdesk.{entry}; "
+            "from django.urls import get_resolver; get_resolver().url_patterns")
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stderr
+    rows = [(int(own), int(cumulative), len(indent), name)
+            for own, cumulative, indent, name in IMPORT_LINE.findall(stderr)]
+    top_level = min(indent for _, _, indent, _ in rows)
+    total = sum(own for own, _, _, _ in rows) / 1000
+    return total, sorted(((cumulative / 1000, name) for _, cumulative, indent, name in rows if indent == top_level),
+                         reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Interpreters started per profile.")
+    parser.add_argument('--requests', type=int, default=1000, help="Requests per interpreter.")
+    parser.add_argument('--entry', choices=('wsgi', 'asgi'), default='wsgi', help="Application module imported.")
+    parser.add_argument('--top', type=int, default=8, help="Largest imports listed per profile.")
+    options = parser.parse_args()
+
+    for profile in PROFILES:
+        runs = [boot(profile, options.entry, options.requests) for _ in range(options.runs)]
+        first = runs[0]
+        print(f"{profile}: {first['apps']} apps, {first['middleware']} middleware, {first['modules']} modules")
+        for key, label, unit in (('process', 'process, start to exit', 'ms'), ('boot', 'import application', 'ms'),
+                                 ('urlconf', 'load URLconf', 'ms'), ('request', 'request through middleware', 'us')):
+            print(f"  {label:<28} median {statistics.median(run[key] for run in runs):9.2f} {unit}")
+
+        total, imports = import_times(profile, options.entry)
+        print(f"  {'imports (-X importtime)':<28} total  {total:9.2f} ms")
+        for cumulative, name in imports[:options.top]:
+            print(f"    {name:<40} {cumulative:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Regression benchmarks of the serializers, permission checks, user creation, JWT
+decoding and API endpoints, with results comparable to the stored baselines.
+
+Micro-benchmarks time one operation on data loaded beforehand. Macro-benchmarks send
+requests to each endpoint of a project of 1k, 100k or 1M issues (with as many
+comments), each size being created once in fresh SQLite files. As with asv, the
+calls of a benchmark are grouped into samples lasting at least ``--min-time``, and the
+time per call of every sample is recorded, so that ``benchmarks.compare`` can tell a
+regression from noise. Run from the ``softdesk`` directory:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --filter endpoint
+    python -m benchmarks.compare benchmarks/baselines/baseline.json results.json
+
+``--save`` replaces the baseline (``benchmarks/baselines/baseline.json``), to be
+committed with the change that moves it. Baselines only compare with results of the
+same machine and sizes.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+BASELINE = Path(__file__).resolve().parent / 'baselines' / 'baseline.json'
+PASSWORD = 'Str0ngPass!x'
+
+# Name -> (setup, whether it runs once per size). A setup returns the timed callable.
+BENCHMARKS = {}
+
+
+def benchmark(name, sized=False):
+    """Register a setup function under a benchmark name; sized setups receive the size of the project."""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, sized)
+        return setup
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def tenant(issues):
+    """Create, once per size, a project of 10 contributors and ``issues`` issues with a comment each."""
+    from benchmarks.partitioning import create_tenant
+    return create_tenant(f'tenant-{issues}', users=10, issues=issues, comments_per_issue=1)
+
+
+def micro_tenant():
+    """Return the project of the micro-benchmarks, its owner and 100 of its issues."""
+    from projects.models import Issue
+    project, owner = tenant(100)
+    return project, owner, list(Issue.objects.filter(project=project).order_by('pk')[:100])
+
+
+def api_request(user, path='/'):
+    """Return a DRF GET request of the user."""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    request = Request(APIRequestFactory().get(path))
+    request.user = user
+    return request
+
+
+@benchmark('serializers.IssueSerializer')
+def issue_serializer():
+    from projects.serializers import IssueSerializer
+    _, _, issues = micro_tenant()
+    return lambda: IssueSerializer(issues, many=True).data
+
+
+@benchmark('serializers.IssueListSerializer')
+def issue_list_serializer():
+    from projects.serializers import IssueListSerializer
+    _, _, issues = micro_tenant()
+    return lambda: IssueListSerializer(issues, many=True).data
+
+
+@benchmark('serializers.IssueSerializer.validate')
+def issue_serializer_validate():
+    from projects.models import Contributor
+    from projects.serializers import IssueSerializer
+    project, owner, _ = micro_tenant()
+    data = {'name': 'Issue', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW', 'type': 'BUG',
+            'user': Contributor.objects.get(project=project, user=owner).pk}
+    return lambda: IssueSerializer(data=data, context={'project': project}).is_valid(raise_exception=True)
+
+
+@benchmark('serializers.CommentSerializer')
+def comment_serializer():
+    from projects.models import Comment
+    from projects.serializers import CommentSerializer
+    project, _, _ = micro_tenant()
+    comments = list(Comment.objects.filter(issue__project=project).order_by('pk')[:100])
+    return lambda: CommentSerializer(comments, many=True).data
+
+
+@benchmark('serializers.ContributorSerializer')
+def contributor_serializer():
+    from projects.models import Contributor
+    from projects.serializers import ContributorSerializer
+    project, _, _ = micro_tenant()
+    contributors = list(Contributor.objects.filter(project=project)) * 10
+    return lambda: ContributorSerializer(contributors, many=True).data
+
+
+@benchmark('serializers.CustomProjectSerializer')
+def project_serializer():
+    from projects.serializers import CustomProjectSerializer
+    project, _, _ = micro_tenant()
+    projects = [project] * 100
+    return lambda: CustomProjectSerializer(projects, many=True).data
+
+
+@benchmark('permissions.get_membership')
+def permissions_get_membership():
+    from projects.permissions import get_membership
+    project, owner, _ = micro_tenant()
+    request = api_request(owner)
+
+    def check():
+        # A new request: the membership is loaded from the database.
+        request._request.membership_cache = {}
+        return get_membership(request, project.pk)
+    return check
+
+
+@benchmark('permissions.ProjectPermissions')
+def permissions_project():
+    from types import SimpleNamespace
+
+    from projects.permissions import ProjectPermissions, get_membership
+    project, owner, _ = micro_tenant()
+    request = api_request(owner)
+    get_membership(request, project.pk)
+    view = SimpleNamespace(kwargs={'project_id': project.pk})
+    permission = ProjectPermissions()
+    return lambda: permission.has_permission(request, view) and permission.has_object_permission(request, view, project)
+
+
+@benchmark('permissions.can')
+def permissions_can():
+    from projects.permissions import can, get_membership
+    project, owner, issues = micro_tenant()
+    membership = get_membership(api_request(owner), project.pk)
+    return lambda: can(membership, 'change_issue', issues[0])
+
+
+@benchmark('users.create_user')
+def users_create_user():
+    from users.models import CustomUser
+    numbers = itertools.count()
+    return lambda: CustomUser.objects.create_user(f'benchmark-{next(numbers)}', PASSWORD, date(1990, 1, 1),
+                                                  False, False)
+
+
+@benchmark('jwt.decode')
+def jwt_decode():
+    from rest_framework_simplejwt.tokens import AccessToken
+    _, owner, _ = micro_tenant()
+    token = str(AccessToken.for_user(owner))
+    return lambda: AccessToken(token)
+
+
+@benchmark('jwt.authenticate')
+def jwt_authenticate():
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+    _, owner, _ = micro_tenant()
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(owner)}')
+    authentication = JWTAuthentication()
+    return lambda: authentication.authenticate(request)
+
+
+# Endpoint benchmarks: label -> (URL name, URL arguments, query string).
+ENDPOINTS = {
+    'projects': ('project-list', (), ''),
+    'project': ('project-detail', ('project',), ''),
+    'contributors': ('project-contributors', ('project',), ''),
+    'issues': ('list_create_issues', ('project',), ''),
+    'issue': ('issue', ('project', 'issue'), ''),
+    'issue_history': ('issue-history', ('project', 'issue'), ''),
+    'issue_stats': ('issue-stats', ('project',), ''),
+    'comments': ('comment-list-create', ('project', 'issue'), ''),
+    'comment_threads': ('comment-list-create', ('project', 'issue'), '?threads=true'),
+    'sync': ('sync', (), ''),
+    'notifications': ('notifications', (), ''),
+}
+
+
+def endpoint_client(size):
+    """Return an API client authenticated as the owner of the project of the size, the project and its last issue."""
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from projects.models import Issue
+    project, owner = tenant(size)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(owner)}')
+    return client, project, Issue.objects.filter(project=project).latest('pk')
+
+
+def register_endpoint(label, route, arguments, query):
+    def setup(size):
+        from django.urls import reverse
+        client, project, issue = endpoint_client(size)
+        values = {'project': project.pk, 'issue': issue.pk}
+        url = reverse(route, args=[values[argument] for argument in arguments]) + query
+
+        def get():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return get
+    benchmark(f'endpoint.{label}', sized=True)(setup)
+
+
+for label, (route, arguments, query) in ENDPOINTS.items():
+    register_endpoint(label, route, arguments, query)
+
+
+@benchmark('endpoint.issue_create', sized=True)
+def endpoint_issue_create(size):
+    from django.urls import reverse
+
+    from projects.models import Contributor
+    client, project, issue = endpoint_client(size)
+    url = reverse('list_create_issues', args=[project.pk])
+    data = {'name': 'Issue', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW', 'type': 'BUG',
+            'user': Contributor.objects.filter(project=project).values_list('pk', flat=True).first()}
+
+    def post():
+        response = client.post(url, data, format='json')
+        assert response.status_code == 201, response.status_code
+    return post
+
+
+def time_samples(function, samples, min_time, max_time):
+    """
+    Return the time per call (s) of each sample of calls of the function.
+    The number of calls per sample is first raised until a sample lasts ``min_time``.
+    Sampling stops early once ``max_time`` is spent, with at least 5 samples.
+    Returns:
+        tuple: The calls per sample and the list of times per call.
+    """
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        return time.perf_counter() - start
+
+    number, elapsed = 1, run(1)
+    while elapsed < min_time:
+        number = max(number + 1, int(number * min(10, 1.2 * min_time / max(elapsed, 1e-9))))
+        elapsed = run(number)
+
+    times, start = [], time.perf_counter()
+    while len(times) < samples and (len(times) < 5 or time.perf_counter() - start < max_time):
+        times.append(run(number) / number)
+    return number, times
+
+
+def summarize(number, times):
+    """Return the result entry of a benchmark."""
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else times * 3
+    return {'unit': 's', 'number': number, 'median': statistics.median(times), 'iqr': quartiles[2] - quartiles[0],
+            'samples': times}
+
+
+def machine():
+    """Describe the machine and interpreter the results come from."""
+    return {'node': platform.node(), 'platform': platform.platform(), 'python': platform.python_version(),
+            'cpus': os.cpu_count()}
+
+
+def commit():
+    """Return the checked out commit, or None outside a git repository."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help="Issues of the endpoint projects.")
+    parser.add_argument('--filter', default='', help="Regular expression the benchmark names must match.")
+    parser.add_argument('--samples', type=int, default=10, help="Samples per benchmark.")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Minimum duration (s) of a sample.")
+    parser.add_argument('--max-time', type=float, default=10, help="Sampling time (s) after which to stop early.")
+    parser.add_argument('--output', type=Path, help="JSON file to write the results to.")
+    parser.add_argument('--save', action='store_true', help=f"Write the results to the baseline ({BASELINE.name}).")
+    options = parser.parse_args()
+
+    selected = [(name, setup, sized) for name, (setup, sized) in BENCHMARKS.items() if re.search(options.filter, name)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        from benchmarks.partitioning import configure
+        configure(directory)
+
+        for name, setup, sized in selected:
+            for size in (sorted(options.sizes) if sized else [None]):
+                key = name if size is None else f'{name}[{size}]'
+                function = setup(size) if sized else setup()
+                results[key] = summarize(*time_samples(function, options.samples, options.min_time, options.max_time))
+                print(f"{key:<44} {results[key]['median'] * 1e6:12.1f} µs  "
+                      f"(IQR {results[key]['iqr'] * 1e6:.1f} µs, {len(results[key]['samples'])}x{results[key]['number']})",
+                      flush=True)
+
+    document = {'commit': commit(), 'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'machine': machine(), 'sizes': sorted(options.sizes), 'results': results}
+    for path in [options.output] + ([BASELINE] if options.save else []):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(document, indent=1) + '\n')
+            print(f"Results written to {path}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,55 @@
 from django.contrib import admin
-from users.admin import UserAdmin
-from .models import Contributor, CustomProject, Issue
-from django.contrib import admin
-from .models import CustomProject, Contributor, Issue, Comment
+from users.admin import LargeTableAdmin
+from .models import Attachment, Contributor, CustomProject, Issue, Comment
+
+
+class CustomProjectAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'type', 'author', 'created_time', 'archived_time')
+    list_select_related = ('author',)
+    list_filter = ('type',)
+    raw_id_fields = ('author',)
+
+
+class ContributorAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'project', 'role', 'created_time')
+    list_select_related = ('user', 'project')
+    list_filter = ('role',)
+    raw_id_fields = ('user', 'project')
+
+
+class IssueAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'project', 'status', 'priority', 'type', 'user__user', 'created_time')
+    list_select_related = ('project', 'user__user')
+    list_filter = ('status', 'priority')
+    raw_id_fields = ('project', 'user', 'author')
+
+    def get_queryset(self, request):
+        # Changelists show the excerpt; the change form loads the description when it reads it.
+        return super().get_queryset(request).defer('description')
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'excerpt', 'issue', 'author', 'depth', 'created_time')
+    list_select_related = ('issue', 'author')
+    raw_id_fields = ('issue', 'author', 'parent')
+    readonly_fields = ('path', 'depth')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('description', 'issue__description')
+
+
+class AttachmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'content_type', 'size', 'issue', 'uploaded_by', 'created_time')
+    list_select_related = ('issue', 'uploaded_by')
+    raw_id_fields = ('issue', 'comment', 'uploaded_by')
+    readonly_fields = ('sha256', 'size')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('issue__description')
 
-class IssueAdmin(admin.ModelAdmin):
-    pass
 
-        
-admin.site.register(CustomProject, UserAdmin)
-admin.site.register(Contributor, UserAdmin)
+admin.site.register(CustomProject, CustomProjectAdmin)
+admin.site.register(Contributor, ContributorAdmin)
 admin.site.register(Issue, IssueAdmin)
-admin.site.register(Comment, UserAdmin)
\ No newline at end of file
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Attachment, AttachmentAdmin)
@@ -0,0 +1,172 @@
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from .storage import get_storage
+
+# A single byte range, the only form served; other Range headers get the whole file.
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class StoredFile(UploadedFile):
+    """An uploaded file already written to the attachment storage, known by its digest."""
+
+    def __init__(self, name, content_type, size, sha256):
+        super().__init__(file=None, name=name, content_type=content_type, size=size)
+        self.sha256 = sha256
+
+
+class StorageUploadHandler(FileUploadHandler):
+    """
+    Upload handler streaming the files of a multipart request into the attachment storage.
+    Chunks are hashed and written as they arrive, so no file is held in memory whatever
+    its size, and the content is stored once per digest. Files larger than
+    ``ATTACHMENT_MAX_SIZE`` stop the upload and set ``too_large``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = settings.ATTACHMENT_CHUNK_SIZE
+        self.upload = None
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.upload = get_storage().begin()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload.size + len(raw_data) > settings.ATTACHMENT_MAX_SIZE:
+            self.too_large = True
+            self.abort()
+            raise StopUpload(connection_reset=True)
+        self.upload.write(raw_data)
+
+    def file_complete(self, file_size):
+        upload, self.upload = self.upload, None
+        return StoredFile(self.file_name, self.content_type or 'application/octet-stream', upload.size,
+                          upload.finish())
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def abort(self):
+        if self.upload is not None:
+            self.upload.abort()
+            self.upload = None
+
+
+class DownloadContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation of the attachment views: a download asking for the media type of
+    the file (``Accept: image/png``) is not refused because the API renders JSON.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class RangeFile:
+    """
+    Read-only view of ``length`` bytes of a file from its current position.
+    It keeps the file descriptor of the file, so servers sending files with sendfile()
+    still do for partial responses: they start at the file position and stop at the
+    Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    Parse a Range header against the size of a file.
+
+    Returns:
+        tuple: The (first, last) bytes requested, inclusive, or None to send the whole file.
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    match = BYTE_RANGE.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last bytes of the file.
+        first, last = max(0, size - int(last)), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+def serve(request, attachment):
+    """
+    Answer a download of an attachment, honoring conditional and Range requests.
+    The digest of the content is its strong ETag; the upload time is its Last-Modified.
+    Local files are handed to FileResponse, which lets the server send them with
+    sendfile() when it supports ``wsgi.file_wrapper``.
+    Args:
+        request: The Django or DRF request.
+        attachment (Attachment): The downloaded attachment.
+    Returns:
+        HttpResponse: 200 with the file, 206 with the requested range, 304 or 412 for
+                      conditional requests, or 416 if the range cannot be satisfied.
+    """
+    request = getattr(request, '_request', request)
+    etag = f'"{attachment.sha256}"'
+    last_modified = int(attachment.created_time.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range is not None and if_range not in (etag, http_date(last_modified)):
+            range_header = None
+        try:
+            requested = byte_range(range_header, attachment.size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{attachment.size}'
+            return response
+
+        file = get_storage().open(attachment.sha256)
+        if requested is None:
+            response = FileResponse(file, content_type=attachment.content_type, as_attachment=True,
+                                    filename=attachment.name)
+        else:
+            first, last = requested
+            file.seek(first)
+            response = FileResponse(RangeFile(file, last - first + 1), status=206,
+                                    content_type=attachment.content_type, as_attachment=True,
+                                    filename=attachment.name)
+            response['Content-Length'] = last - first + 1
+            response['Content-Range'] = f'bytes {first}-{last}/{attachment.size}'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Uploaded content is never rendered by the browser as a page of the API origin.
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
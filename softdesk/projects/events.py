@@ -0,0 +1,114 @@
+import asyncio
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Marker returned to a subscriber that fell too far behind and lost events.
+RESET = object()
+
+
+class Subscription:
+    """
+    Bounded queue of the events of one project delivered to one stream.
+    The queue is bound to the event loop of the stream that created it and is fed
+    from any thread. When the consumer does not keep up and the queue is full, the
+    subscription is flagged as overflowed instead of buffering without limit; the
+    stream then tells its client to resynchronise through the sync feed.
+    Attributes:
+        project_id (int): The project whose events are delivered.
+        overflowed (bool): Whether events were dropped because the queue was full.
+    """
+
+    def __init__(self, project_id, max_size):
+        self.project_id = project_id
+        self.overflowed = False
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_size)
+
+    def push(self, event):
+        """Enqueue an event. Must run in the subscription's event loop."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def next_event(self, timeout):
+        """
+        Wait for the next event.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+        Returns:
+            dict, RESET or None: The next event, RESET if events were lost,
+                                 or None if nothing happened before the timeout.
+        """
+        if self.overflowed:
+            return RESET
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return RESET if self.overflowed else None
+
+
+class LocalBroker:
+    """
+    In-process publish/subscribe broker fanning project events out to streams.
+    Publishing is thread-safe: events raised by the model signals of a sync view are
+    handed over to the event loop of each subscribed stream. Only the subscribers of
+    the event's project are visited.
+    This broker only reaches the streams of the current process. Multi-worker
+    deployments plug a broker relaying ``publish`` through a shared bus (Redis,
+    Postgres LISTEN/NOTIFY...) and calling ``deliver`` on every worker when a message
+    arrives, through the ``EVENTS_BROKER`` setting. Tests use this one as a fake.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscribe(self, project_id):
+        """
+        Register a new stream for the events of a project.
+        Must be called from the event loop of the stream.
+
+        Args:
+            project_id (int): The project to follow.
+        Returns:
+            Subscription: The subscription to read events from.
+        """
+        subscription = Subscription(project_id, settings.EVENTS_QUEUE_SIZE)
+        self.subscriptions.setdefault(project_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self.subscriptions.get(subscription.project_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[subscription.project_id]
+
+    def publish(self, project_id, event):
+        """
+        Publish an event to every stream following the project.
+
+        Args:
+            project_id (int): The project the event belongs to.
+            event (dict): The JSON-serializable event.
+        """
+        self.deliver(project_id, event)
+
+    def deliver(self, project_id, event):
+        for subscription in list(self.subscriptions.get(project_id, ())):
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # The stream's event loop is already closed.
+                self.unsubscribe(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Return the process-wide broker configured by the ``EVENTS_BROKER`` setting."""
+    return import_string(settings.EVENTS_BROKER)()
@@ -0,0 +1,82 @@
+import re
+import zlib
+
+from django.db import models
+
+# zlib level of the stored bodies: Markdown shrinks about as much at 6 as at 9, faster.
+COMPRESSION_LEVEL = 6
+
+# Markdown syntax dropped from excerpts: images and links keep their text, block markers
+# (headings, quotes, list bullets), emphasis, code and HTML tags go.
+MARKDOWN = [
+    (re.compile(r'!?\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+', re.MULTILINE), ''),
+    (re.compile(r'\*\*|__|\*|`+|~~'), ''),
+    (re.compile(r'<[^>]+>'), ''),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def excerpt(text, length):
+    """
+    Return the beginning of a Markdown text as plain text of at most ``length`` characters.
+    Longer texts are cut at a word boundary and end with an ellipsis.
+    """
+    for pattern, replacement in MARKDOWN:
+        text = pattern.sub(replacement, text)
+    text = text.strip()
+    if len(text) <= length:
+        return text
+    return text[:length - 1].rsplit(' ', 1)[0] + '…'
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text of unbounded length, stored zlib-compressed in a binary column.
+    Values are read and written as str; only the database sees the compressed bytes,
+    so the column cannot be filtered or searched on. List views defer it and send the
+    excerpt kept next to it (see ExcerptField).
+    """
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return None
+        return connection.Database.Binary(zlib.compress(value.encode(), COMPRESSION_LEVEL))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return zlib.decompress(bytes(value)).decode()
+
+
+class ExcerptField(models.CharField):
+    """
+    Plain-text excerpt of another text field of the model, refreshed whenever the row is saved.
+    """
+
+    def __init__(self, *args, source='description', **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 200)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        if self.editable:
+            kwargs['editable'] = True
+        else:
+            kwargs.pop('editable', None)
+        if kwargs.get('default') == '':
+            del kwargs['default']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = excerpt(getattr(model_instance, self.source), self.max_length)
+        setattr(model_instance, self.attname, value)
+        return value
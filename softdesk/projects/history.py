@@ -0,0 +1,85 @@
+import json
+
+from .models import Issue, IssueChange
+
+# Tracked fields of an issue: attribute name, one-letter code in the encoded diff,
+# and choices whose values are stored as their index.
+TRACKED_FIELDS = [
+    ('name', 'n', None),
+    ('description', 'd', None),
+    ('status', 's', Issue.STATUS_CHOICES),
+    ('priority', 'p', Issue.PRIORITY_CHOICES),
+    ('type', 't', Issue.TYPE_CHOICES),
+    ('user_id', 'u', None),
+]
+
+
+def snapshot(issue):
+    """
+    Capture the tracked values of an already loaded issue, before it is modified.
+
+    Args:
+        issue (Issue): The issue about to be updated.
+    Returns:
+        dict: The tracked attribute values.
+    """
+    return {attname: getattr(issue, attname) for attname, _, _ in TRACKED_FIELDS}
+
+
+def encode(diff):
+    """
+    Encode a {attribute: (old, new)} diff as compact JSON.
+    Field names become one-letter codes and choice values become their index, e.g.
+    a status change from TO_DO to IN_PROGRESS is stored as ``{"s":[0,1]}``.
+    """
+    encoded = {}
+    for attname, code, choices in TRACKED_FIELDS:
+        if attname in diff:
+            old, new = diff[attname]
+            if choices:
+                values = [value for value, _ in choices]
+                old, new = values.index(old), values.index(new)
+            encoded[code] = [old, new]
+    return json.dumps(encoded, separators=(',', ':'))
+
+
+def decode(data):
+    """
+    Decode an encoded diff into a {field: [old, new]} dict with API field names.
+    """
+    encoded = json.loads(data)
+    diff = {}
+    for attname, code, choices in TRACKED_FIELDS:
+        if code in encoded:
+            old, new = encoded[code]
+            if choices:
+                old, new = choices[old][0], choices[new][0]
+            diff[attname.removesuffix('_id')] = [old, new]
+    return diff
+
+
+def record(issue, before, actor):
+    """
+    Append the changes of an issue to its history with a single insert.
+    Nothing is written when no tracked field changed.
+    Args:
+        issue (Issue): The issue, after it was saved.
+        before (dict): The snapshot taken before the update.
+        actor (CustomUser): The user who made the change.
+    Returns:
+        IssueChange or None: The recorded change.
+    """
+    diff = {}
+    for attname, value in before.items():
+        new = getattr(issue, attname)
+        if new != value:
+            diff[attname] = (value, new)
+    if not diff:
+        return None
+    return IssueChange.objects.create(
+        issue=issue,
+        project_id=issue.project_id,
+        actor=actor,
+        diff=encode(diff),
+        status=issue.status if 'status' in diff else None,
+    )
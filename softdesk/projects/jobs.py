@@ -0,0 +1,331 @@
+import csv
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.db import models, transaction
+from django.utils import timezone
+
+from users import imports
+from users.models import CustomUser
+from . import outbox, partitions, workload
+from .models import ArchivedRow, Change, Comment, Contributor, CustomProject, Issue, Job, ProjectShard
+from .routers import partition_for, project_of, use_project
+from .signals import SYNCED_MODELS, publish_change, record_change, record_changes
+
+# Order in which the rows of models referencing themselves are deleted, so a row always
+# goes before the rows it references: a reply's path extends the path of its parent.
+DELETION_ORDER = {Comment: '-path'}
+
+
+def cascade_plan(model):
+    """
+    List the rows to delete, model by model, before a row of ``model`` can be deleted.
+    The plan follows every CASCADE relation pointing to the model, recursively, so
+    models added later are purged without changes here. Models come children first:
+    a model is only purged once every model referencing it has been. Relations of a
+    model to itself are left to the ordering of its rows (see ``deletion_order``).
+    Args:
+        model: The model of the purged row.
+    Returns:
+        list: (model, lookups) pairs ending with the purged model itself; filtering
+              the model on any of its lookups ``=<pk>`` selects rows to delete.
+    """
+    lookups = {}
+
+    def collect(current, lookup, path):
+        lookups.setdefault(current, []).append(lookup)
+        for relation in current._meta.related_objects:
+            if relation.on_delete is models.CASCADE and relation.related_model not in path + (current,):
+                collect(relation.related_model, f'{relation.field.name}__{lookup}', path + (current,))
+
+    ordered = []
+
+    def place(current, path):
+        if current in ordered:
+            return
+        for relation in current._meta.related_objects:
+            child = relation.related_model
+            if relation.on_delete is models.CASCADE and child in lookups and child not in path + (current,):
+                place(child, path + (current,))
+        ordered.append(current)
+
+    collect(model, 'pk', ())
+    place(model, ())
+    return [(current, lookups[current]) for current in ordered]
+
+
+def deletion_order(model):
+    """Return the ordering deleting the rows of a model children first (by ID when they have no parent row)."""
+    return DELETION_ORDER.get(model, 'pk')
+
+
+def archive_plan():
+    """
+    List the models moved to the archive tier when a project is archived, children first.
+    These are the issues and every model depending on them (comments, history...);
+    the project itself, its contributors and webhooks stay in place.
+    Returns:
+        list: (model, lookups) pairs relative to the project, as in ``cascade_plan``.
+    """
+    issue_models = {model for model, _ in cascade_plan(Issue)}
+    return [(model, lookups) for model, lookups in cascade_plan(CustomProject) if model in issue_models]
+
+
+def start(action, instance, user):
+    """
+    Create a job and enqueue it in the outbox, in the transaction of the caller.
+
+    Args:
+        action (str): 'PURGE', 'ARCHIVE' or 'RESTORE'.
+        instance: The CustomProject or Issue processed by the job.
+        user (CustomUser): The user requesting the job.
+    Returns:
+        Job: The job, to report progress.
+    """
+    job = Job.objects.create(action=action, target=instance._meta.label_lower, object_id=instance.pk, requested_by=user)
+    outbox.enqueue('job', {"job": job.pk, "project": project_of(instance)}, f'job:{job.pk}')
+    return job
+
+
+def start_import(upload, format, user):
+    """
+    Keep an uploaded user export and enqueue the job importing it.
+    The file is written under ``USER_IMPORT_ROOT`` in the transaction creating the job,
+    so a failed write leaves no job behind.
+
+    Args:
+        upload (UploadedFile): The CSV or NDJSON export.
+        format (str): 'csv' or 'ndjson'.
+        user (CustomUser): The staff user requesting the import.
+    Returns:
+        Job: The job, to report progress and the rejected rows.
+    """
+    with transaction.atomic():
+        job = Job.objects.create(action='IMPORT', target=CustomUser._meta.label_lower, requested_by=user)
+        imports.save_upload(upload, job.pk, format)
+        outbox.enqueue('job', {"job": job.pk}, f'job:{job.pk}')
+    return job
+
+
+def journal_members(project, operation):
+    """
+    Journal a change of every contributor of a project with one insert.
+    The tombstones of the contributor rows tell sync clients they lost access to a
+    deleted or archived project (the feed only follows the projects a user still
+    contributes to); the creations tell them it is back after a restore.
+    """
+    record_changes(list(Contributor.objects.filter(project_id=project.pk).only('pk', 'user_id', 'project_id')),
+                   operation)
+
+
+def soft_delete(instance, user):
+    """
+    Hide a project or an issue immediately and schedule the purge of its data.
+    The row is flagged, tombstones are written to the change journal for sync clients
+    (for a project, one per contributor as well) and the purge job is enqueued in the
+    outbox, all in one short transaction.
+    Args:
+        instance: The CustomProject or Issue to delete.
+        user (CustomUser): The user requesting the deletion.
+    Returns:
+        Job: The job tracking the purge.
+    """
+    with partitions.atomic():
+        type(instance).all_objects.filter(pk=instance.pk).update(deleted_time=timezone.now())
+        if isinstance(instance, Issue):
+            workload.issue_removed(instance)
+        else:
+            journal_members(instance, 'DELETE')
+        publish_change(record_change(instance, 'DELETE'))
+        return start('PURGE', instance, user)
+
+
+def archive(project, user):
+    """
+    Hide a project immediately and schedule the move of its issues to the archive tier.
+    Sync clients receive a tombstone for the project and for each of its contributors,
+    written with the flag and the job in one transaction spanning the project's shard.
+    Returns:
+        Job: The job tracking the move.
+    """
+    with partitions.atomic():
+        CustomProject.all_objects.filter(pk=project.pk).update(archived_time=timezone.now())
+        journal_members(project, 'DELETE')
+        publish_change(record_change(project, 'DELETE'))
+        return start('ARCHIVE', project, user)
+
+
+def restore(project, user):
+    """
+    Schedule the move of an archived project's issues back to the hot tables.
+    The project becomes visible again once every row is restored, and its contributors
+    are journaled as created so sync clients fetch it again.
+    Returns:
+        Job: The job tracking the move.
+    """
+    return start('RESTORE', project, user)
+
+
+def batches(queryset):
+    """
+    Yield the rows of a queryset in bounded batches, pausing between them.
+    The outbox lease of the job is renewed after each batch, so a job running longer
+    than ``OUTBOX_LEASE`` is not claimed by a second worker; if it was claimed anyway
+    (the worker stalled past its lease), ``outbox.LeaseLost`` stops this run.
+    """
+    while True:
+        rows = list(queryset[:settings.JOB_BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        outbox.renew_lease()
+        time.sleep(settings.JOB_PAUSE)
+
+
+def set_step(job, model):
+    job.step = model._meta.label_lower
+    job.save(update_fields=['step'])
+
+
+def add_progress(job, count):
+    Job.objects.filter(pk=job.pk).update(processed_rows=models.F('processed_rows') + count)
+
+
+def purge(job, model):
+    """
+    Delete the rows of a soft-deleted project or issue, children first.
+    Each batch is a raw DELETE by primary key committed on its own, so the write lock
+    is never held for long and concurrent writers keep going. No signals are sent for
+    the purged rows: the tombstones written by ``soft_delete`` stand for them.
+    """
+    for step_model, lookups in cascade_plan(model):
+        set_step(job, step_model)
+        for lookup in lookups:
+            queryset = (step_model._base_manager.filter(**{lookup: job.object_id})
+                        .order_by(deletion_order(step_model)).values_list('pk', flat=True))
+            for ids in batches(queryset):
+                add_progress(job, step_model._base_manager.filter(pk__in=ids)._raw_delete(queryset.db))
+    if model is CustomProject:
+        set_step(job, ArchivedRow)
+        queryset = ArchivedRow.objects.filter(project_id=job.object_id).values_list('pk', flat=True)
+        for ids in batches(queryset):
+            add_progress(job, ArchivedRow.objects.filter(pk__in=ids)._raw_delete(queryset.db))
+        alias = partition_for(job.object_id)
+        if alias is not None:
+            # Drop the mirrors of the project and its contributors left in its partition.
+            CustomProject._base_manager.using(alias).filter(pk=job.object_id).delete()
+        ProjectShard.objects.filter(pk=job.object_id).delete()
+
+
+def move_to_archive(job, model):
+    """
+    Copy the issues, comments and history of a project to the archive tier, then delete them.
+    The copy ignores rows already archived, so a replayed batch is harmless.
+    """
+    for step_model, lookups in archive_plan():
+        set_step(job, step_model)
+        for lookup in lookups:
+            queryset = step_model._base_manager.filter(**{lookup: job.object_id}).order_by(deletion_order(step_model))
+            for rows in batches(queryset):
+                now = timezone.now()
+                for row in rows:
+                    if hasattr(row, 'archived_time'):
+                        row.archived_time = now
+                ArchivedRow.objects.bulk_create([
+                    ArchivedRow(project_id=job.object_id, model=entry['model'], object_id=entry['pk'], data=entry['fields'])
+                    for entry in serializers.serialize('python', rows)
+                ], ignore_conflicts=True)
+                add_progress(job, step_model._base_manager.filter(pk__in=[row.pk for row in rows])._raw_delete(queryset.db))
+
+
+def restore_from_archive(job, model):
+    """
+    Insert the archived rows of a project back into their tables, parents first.
+    Rows are inserted as archived (timestamps included) and announced to sync clients
+    through the change journal. Rows already restored by an interrupted run are skipped.
+    """
+    for step_model, _ in reversed(archive_plan()):
+        set_step(job, step_model)
+        label = step_model._meta.label_lower
+        queryset = ArchivedRow.objects.filter(project_id=job.object_id, model=label).order_by('object_id')
+        for records in batches(queryset):
+            existing = set(step_model._base_manager.filter(pk__in=[record.object_id for record in records])
+                           .values_list('pk', flat=True))
+            objects = [
+                deserialized.object for deserialized in serializers.deserialize('python', [
+                    {"model": label, "pk": record.object_id, "fields": record.data}
+                    for record in records if record.object_id not in existing
+                ])
+            ]
+            for instance in objects:
+                if hasattr(instance, 'archived_time'):
+                    instance.archived_time = None
+            with partitions.atomic():
+                if objects:
+                    # raw=True keeps the stored auto_now/auto_now_add timestamps.
+                    step_model._base_manager._insert(objects, fields=step_model._meta.local_concrete_fields, raw=True)
+                if step_model in SYNCED_MODELS:
+                    Change.objects.bulk_create([
+                        Change(project_id=job.object_id, model=SYNCED_MODELS[step_model], object_id=instance.pk,
+                               operation='CREATE')
+                        for instance in objects
+                    ])
+            ArchivedRow.objects.filter(pk__in=[record.pk for record in records])._raw_delete(queryset.db)
+            add_progress(job, len(records))
+
+    project = CustomProject.all_objects.get(pk=job.object_id)
+    with partitions.atomic():
+        CustomProject.all_objects.filter(pk=project.pk).update(archived_time=None)
+        journal_members(project, 'CREATE')
+        publish_change(record_change(project, 'UPDATE'))
+
+
+def import_upload(job, model):
+    """
+    Create the users of the export uploaded for an import job.
+    Passwords are hashed by the pool of ``USER_IMPORT_WORKERS`` processes; every inserted
+    chunk adds its rows to the progress and renews the outbox lease. The report (users
+    created and rejected rows, or why the file could not be read) is stored on the job
+    before the upload is deleted, so a run replayed after that has nothing left to do.
+    """
+    path = imports.find_upload(job.pk)
+    if path is None:
+        return
+    set_step(job, model)
+    report = {'created': 0, 'errors': []}
+
+    def on_chunk(created, errors):
+        report['created'] += created
+        report['errors'].extend(errors)
+        add_progress(job, created + len(errors))
+        outbox.renew_lease()
+
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            imports.import_users(imports.read_rows(stream, imports.guess_format(path.name)), on_chunk=on_chunk)
+    except (UnicodeDecodeError, csv.Error) as error:
+        report['error'] = f"Unreadable file: {error}"
+    Job.objects.filter(pk=job.pk).update(report=report)
+    path.unlink()
+
+
+@outbox.register('job')
+def run_job(payload, idempotency_key):
+    """
+    Outbox handler running a purge, archive, restore or import job in bounded batches.
+    Every step can be replayed, so a job interrupted by a crash or a lease expiry
+    resumes where it stopped when the outbox retries it.
+    """
+    job = Job.objects.get(pk=payload['job'])
+    if job.status == 'DONE':
+        return
+    job.status = 'RUNNING'
+    job.save(update_fields=['status'])
+
+    actions = {'PURGE': purge, 'ARCHIVE': move_to_archive, 'RESTORE': restore_from_archive, 'IMPORT': import_upload}
+    with use_project(payload.get('project')):
+        actions[job.action](job, apps.get_model(job.target))
+
+    Job.objects.filter(pk=job.pk).update(status='DONE', step='', finished_time=timezone.now())
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from projects import jobs, shards
+from projects.models import Change, CustomProject
+
+
+class Command(BaseCommand):
+    help = "Archive the projects without any change for a given number of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inactive-days', type=int, default=365,
+                            help="Archive projects whose last change is older than this.")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the projects to archive.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['inactive_days'])
+        # The journal is on the default database, the projects on every shard.
+        projects = [project for rows in shards.fan_out(
+            lambda alias: list(CustomProject.objects.using(alias).select_related('author'))
+        ) for project in rows]
+        last_changes = dict(
+            Change.objects.filter(project_id__in=[project.pk for project in projects]).values('project_id')
+            .annotate(last_change_time=Max('created_time')).values_list('project_id', 'last_change_time')
+        )
+        count = 0
+        for project in projects:
+            project.last_change_time = last_changes.get(project.pk)
+            if project.last_change_time is None or project.last_change_time >= cutoff:
+                continue
+            if not options['dry_run']:
+                jobs.archive(project, project.author)
+            self.stdout.write(f"Project {project.pk} ({project.name}): last change {project.last_change_time:%Y-%m-%d}.")
+            count += 1
+        self.stdout.write(f"{'Would archive' if options['dry_run'] else 'Archiving'} {count} project(s).")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects import webhooks
+
+
+class Command(BaseCommand):
+    help = "Deliver the pending project changes to the registered webhooks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new changes.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = webhooks.deliver()
+            if delivered or failed:
+                self.stdout.write(f"Delivered {delivered} batch(es), {failed} failure(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from projects import outbox
+
+
+class Command(BaseCommand):
+    help = "Process the pending outbox messages (notifications, webhooks...) in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of messages claimed at once.")
+        parser.add_argument('--concurrency', type=int, default=settings.OUTBOX_CONCURRENCY,
+                            help="Maximum number of handlers running at the same time.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new messages.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            succeeded, failed = outbox.drain(options['batch_size'], options['concurrency'])
+            if succeeded or failed:
+                self.stdout.write(f"Processed {succeeded} message(s), {failed} failure(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import shards
+from projects.models import ProjectShard
+
+
+class Command(BaseCommand):
+    help = "Move a project to another shard while it keeps being served."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_id', type=int)
+        parser.add_argument('--to', required=True, dest='target', help="Alias of the destination shard.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows copied or deleted per query.")
+
+    def handle(self, *args, **options):
+        try:
+            shards.move_project(options['project_id'], options['target'], options['batch_size'], stdout=self.stdout)
+        except ProjectShard.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} is not in the shard map.")
+        except ValueError as error:
+            raise CommandError(str(error))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import partitions
+from projects.routers import partition_for
+from projects.models import CustomProject
+
+
+class Command(BaseCommand):
+    help = "Move the issues, comments and history of a large project to its own database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_id', type=int)
+        parser.add_argument('--database', required=True, help="Alias of the partition database.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows copied or deleted per query.")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in settings.DATABASES or alias == 'default':
+            raise CommandError(f"'{alias}' is not a partition database declared in DATABASES.")
+        if partition_for(options['project_id']) is not None:
+            raise CommandError(f"Project {options['project_id']} is already partitioned.")
+        try:
+            partitions.partition_project(options['project_id'], alias, options['batch_size'], stdout=self.stdout)
+        except CustomProject.DoesNotExist:
+            raise CommandError(f"Project {options['project_id']} does not exist.")
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(f"Add {options['project_id']}: '{alias}' to ISSUE_PARTITIONS before resuming writes.")
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import shards
+
+
+class Command(BaseCommand):
+    help = "Create the tables of a new shard or partition database, reserve its ID block and mirror the users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('database', help="Alias of the shard or partition database.")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in settings.DATABASES or alias == 'default':
+            raise CommandError(f"'{alias}' is not a shard or partition database declared in DATABASES.")
+        try:
+            shards.prepare_database(alias, stdout=self.stdout)
+        except ValueError as error:
+            raise CommandError(str(error))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects import shards
+from projects.models import ArchivedRow, Attachment
+from projects.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = "Delete the attachment contents no attachment references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only count the contents to delete.")
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        cutoff = timezone.now() - timedelta(seconds=settings.ATTACHMENT_PRUNE_GRACE)
+        # Contents stored since the cutoff may belong to an upload whose row is not written yet.
+        candidates = [digest for digest in storage.digests() if storage.stored_time(digest) < cutoff]
+
+        # Attachments live on every shard and partition; archived ones keep their content too.
+        aliases = sorted(set(settings.SHARDS) | set(settings.ISSUE_PARTITIONS.values()))
+        referenced = {digest for rows in shards.fan_out(
+            lambda alias: list(Attachment.objects.using(alias).values_list('sha256', flat=True).distinct()), aliases
+        ) for digest in rows}
+        referenced.update(row['sha256'] for row in ArchivedRow.objects.filter(model='projects.attachment')
+                          .values_list('data', flat=True))
+
+        unreferenced = [digest for digest in candidates if digest not in referenced]
+        if not options['dry_run']:
+            for digest in unreferenced:
+                storage.delete(digest)
+        self.stdout.write(f"{'Would delete' if options['dry_run'] else 'Deleted'} {len(unreferenced)} content(s).")
@@ -1,9 +1,98 @@
-from django.db import models
+from contextlib import ExitStack
+
+from django.db import IntegrityError, models, transaction
 from django.core.exceptions import ValidationError
-from projects.models import Contributor
 from users.models import CustomUser
 
-class CustomProjectManager(models.Manager):
+
+# Condition matching the active rows, shared by the default managers and the
+# partial indexes restricted to those rows.
+ACTIVE = models.Q(deleted_time__isnull=True, archived_time__isnull=True)
+
+
+class ActiveManager(models.Manager):
+    """
+    Default manager hiding the soft-deleted and archived rows.
+    Rows are soft-deleted by setting ``deleted_time`` and purged later in batches by a
+    background job (see ``projects.jobs``); archived rows have ``archived_time`` set.
+    Active queries match the partial indexes declared on ``ACTIVE``, which stay small as
+    history grows. The ``all_objects`` manager of the model still returns every row.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ACTIVE)
+
+
+class ProjectNameTaken(IntegrityError):
+    """Raised when projects are created with names already used by other projects."""
+
+    def __init__(self, names):
+        super().__init__(f"Project name(s) already taken: {', '.join(sorted(names))}.")
+        self.names = sorted(names)
+
+
+class CustomProjectManager(ActiveManager):
+    """
+    Default manager of the projects, hiding the soft-deleted and archived ones, with
+    the project creation service.
+    """
+
+    def taken_names(self, names):
+        """
+        Return the names among the given ones already used by a project of any shard.
+        The names of every shard are kept in the shard map, on the default database.
+        Soft-deleted and archived projects keep their name until purged, so they count.
+        """
+        from projects.models import ProjectShard
+
+        return set(ProjectShard.objects.filter(name__in=names).values_list('name', flat=True))
+
+    def create_projects(self, projects, author):
+        """
+        Create projects with their author enrolled as their first contributor and owner.
+        Everything happens in one transaction spanning the default database and the
+        shards receiving the projects: one query checks the names, one allocates the
+        IDs, then each shard gets one insert of projects and one of contributors, and
+        the journal one insert. The names are allocated with the IDs, in the shard map
+        on the default database, so two concurrent creations of the same name are
+        settled by its unique constraint even when they target different shards; the
+        loser's transaction is rolled back as a whole.
+        Args:
+            projects (list): Dicts of validated ``name``, ``description`` and ``type`` values.
+            author (CustomUser): The user creating the projects.
+        Returns:
+            list: The created projects, in the order given.
+        Raises:
+            ProjectNameTaken: If a name is already used by another project.
+            IntegrityError: If a concurrent creation took a name meanwhile.
+        """
+        from projects.models import Contributor, ProjectShard
+        from projects.signals import publish_change, record_changes
+
+        with transaction.atomic():
+            taken = self.taken_names([project['name'] for project in projects])
+            if taken:
+                raise ProjectNameTaken(taken)
+            entries = ProjectShard.allocate_many([project['name'] for project in projects])
+            created = [self.model(pk=entry.pk, author=author, **project) for entry, project in zip(entries, projects)]
+            by_database = {}
+            for entry, project in zip(entries, created):
+                by_database.setdefault(entry.database, []).append(project)
+
+            contributors = []
+            with ExitStack() as stack:
+                for alias in sorted(by_database):
+                    stack.enter_context(transaction.atomic(using=alias))
+                for alias, shard_projects in by_database.items():
+                    self.model.all_objects.using(alias).bulk_create(shard_projects)
+                    contributors += Contributor.objects.using(alias).bulk_create(
+                        [Contributor(user=author, project=project, role='OWNER') for project in shard_projects]
+                    )
+                record_changes(created, 'CREATE')
+                for change in record_changes(contributors, 'CREATE'):
+                    publish_change(change)
+        return created
+
     def create_project(self, name, description, type, author):
         """
         Create a new project with the specified details and automatically add the author as a contributor.
@@ -17,15 +106,12 @@ class CustomProjectManager(models.Manager):
             Project: The newly created project instance.
         Raises:
             ValidationError: If the author parameter is not an instance of CustomUser.
+            ProjectNameTaken: If the name is already used by another project.
+            IntegrityError: If a concurrent creation took the name meanwhile.
         Note:
-            This method automatically creates a Contributor record linking the author
-            to the project and sets the author as a contributor in the project.
+            The project and its Contributor record are created in one transaction
+            (see ``create_projects``).
         """
-        
         if not isinstance(author, CustomUser):
             raise ValidationError("Author must be an instance of CustomUser.")
-        
-        project = self.create(name=name, description=description, type=type, author=author, contributors=author)
-        Contributor.objects.create(user=author, project=project)
-        
-        return project
+        return self.create_projects([{"name": name, "description": description, "type": type}], author)[0]
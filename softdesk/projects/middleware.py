@@ -0,0 +1,25 @@
+from .routers import current_project, project_from_view
+
+
+class ProjectRoutingMiddleware:
+    """
+    Expose the project targeted by the URL to the database routers.
+    The ``project_id`` (or ``pk`` for the project routes) URL kwarg is stored in the
+    ``current_project`` context variable for the duration of the request, so the
+    queries of the view reach the database holding the project's data.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_project.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_project.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        project_id = project_from_view(view_func, view_kwargs)
+        current_project.set(int(project_id) if project_id is not None else None)
+        return None
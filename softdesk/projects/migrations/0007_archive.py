@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:19
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rename_purge_messages(apps, schema_editor):
+    # Purge jobs are now run by the generic 'job' outbox handler.
+    OutboxMessage = apps.get_model('projects', 'OutboxMessage')
+    for message in OutboxMessage.objects.filter(topic='purge'):
+        message.topic = 'job'
+        message.idempotency_key = f"job:{message.payload['job']}"
+        message.save(update_fields=['topic', 'idempotency_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_soft_delete_purge'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_id', models.BigIntegerField()),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RenameModel(
+            old_name='PurgeJob',
+            new_name='Job',
+        ),
+        migrations.RenameField(
+            model_name='job',
+            old_name='deleted_rows',
+            new_name='processed_rows',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='action',
+            field=models.CharField(choices=[('PURGE', 'Purge'), ('ARCHIVE', 'Archive'), ('RESTORE', 'Restore')], default='PURGE', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='requested_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(rename_purge_messages, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='comment',
+            name='archived_time',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='deleted_time',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='customproject',
+            name='archived_time',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='archived_time',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['issue'], name='comment_active_issue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customproject',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['author'], name='project_active_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['project'], name='issue_active_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrow',
+            index=models.Index(fields=['project_id', 'model', 'object_id'], name='archivedrow_project_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedrow',
+            unique_together={('model', 'object_id')},
+        ),
+    ]
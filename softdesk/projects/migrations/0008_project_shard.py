@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:30
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+
+def map_existing_projects(apps, schema_editor):
+    # Projects created so far live on the default database; their IDs are reserved in the map.
+    if schema_editor.connection.alias != 'default':
+        return
+    CustomProject = apps.get_model('projects', 'CustomProject')
+    ProjectShard = apps.get_model('projects', 'ProjectShard')
+    ProjectShard.objects.bulk_create(
+        [ProjectShard(pk=pk, database='default') for pk in CustomProject.objects.values_list('pk', flat=True)]
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [ProjectShard]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('database', models.CharField(max_length=100)),
+                ('moving', models.BooleanField(default=False)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(map_existing_projects, migrations.RunPython.noop),
+    ]
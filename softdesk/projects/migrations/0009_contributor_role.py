@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:38
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def make_authors_owners(apps, schema_editor):
+    # Authors had every right on their project; the other contributors become members.
+    Contributor = apps.get_model('projects', 'Contributor')
+    Contributor.objects.using(schema_editor.connection.alias).filter(user=F('project__author')).update(role='OWNER')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_project_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contributor',
+            name='role',
+            field=models.CharField(choices=[('OWNER', 'Owner'), ('MAINTAINER', 'Maintainer'), ('MEMBER', 'Member'), ('VIEWER', 'Viewer')], default='MEMBER', max_length=20),
+        ),
+        migrations.RunPython(make_authors_owners, migrations.RunPython.noop),
+    ]
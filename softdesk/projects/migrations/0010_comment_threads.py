@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, LPad
+
+
+def set_paths(apps, schema_editor):
+    # Existing comments are all top-level: their path is their own zero-padded ID.
+    Comment = apps.get_model('projects', 'Comment')
+    Comment.objects.using(schema_editor.connection.alias).update(path=LPad(Cast('id', CharField()), 20, Value('0')))
+
+
+def set_archived_paths(apps, schema_editor):
+    # Archived comments get theirs too, so they are restored into their threads.
+    ArchivedRow = apps.get_model('projects', 'ArchivedRow')
+    for row in ArchivedRow.objects.using(schema_editor.connection.alias).filter(model='projects.comment').iterator():
+        row.data.update(path=f'{row.object_id:020d}', depth=0, parent=None)
+        row.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_contributor_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_active_issue_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='projects.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RunPython(set_paths, migrations.RunPython.noop),
+        migrations.RunPython(set_archived_paths, migrations.RunPython.noop, hints={'model_name': 'archivedrow'}),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['issue', 'path'], name='comment_active_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['issue', 'depth', 'path'], name='comment_active_top_idx'),
+        ),
+    ]
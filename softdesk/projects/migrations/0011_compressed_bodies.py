@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:02
+
+from django.db import migrations
+
+import projects.fields
+
+BATCH_SIZE = 500
+BODY_MODELS = ['Issue', 'Comment']
+
+
+def compress_bodies(apps, schema_editor):
+    # Copy each description to its compressed column, with its excerpt, in batches.
+    alias = schema_editor.connection.alias
+    for name in BODY_MODELS:
+        model = apps.get_model('projects', name)
+        rows = []
+        for row in model.objects.using(alias).only('pk', 'description').iterator(chunk_size=BATCH_SIZE):
+            row.body = row.description
+            row.excerpt = projects.fields.excerpt(row.description, 200)
+            rows.append(row)
+            if len(rows) == BATCH_SIZE:
+                model.objects.using(alias).bulk_update(rows, ['body', 'excerpt'])
+                rows = []
+        model.objects.using(alias).bulk_update(rows, ['body', 'excerpt'])
+
+
+def add_archived_excerpts(apps, schema_editor):
+    # Archived rows keep their description; restored rows need their excerpt too.
+    ArchivedRow = apps.get_model('projects', 'ArchivedRow')
+    rows = ArchivedRow.objects.using(schema_editor.connection.alias).filter(
+        model__in=[f'projects.{name.lower()}' for name in BODY_MODELS])
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.data['excerpt'] = projects.fields.excerpt(row.data.get('description', ''), 200)
+        row.save(update_fields=['data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='excerpt',
+            field=projects.fields.ExcerptField(max_length=200, source='description'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt',
+            field=projects.fields.ExcerptField(max_length=200, source='description'),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='body',
+            field=projects.fields.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='body',
+            field=projects.fields.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(compress_bodies, migrations.RunPython.noop),
+        migrations.RunPython(add_archived_excerpts, migrations.RunPython.noop, hints={'model_name': 'archivedrow'}),
+        migrations.RemoveField(
+            model_name='issue',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='description',
+        ),
+        migrations.RenameField(
+            model_name='issue',
+            old_name='body',
+            new_name='description',
+        ),
+        migrations.RenameField(
+            model_name='comment',
+            old_name='body',
+            new_name='description',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_attachments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contributor',
+            index=models.Index(fields=['role', 'id'], name='contributor_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['status', 'id'], name='issue_active_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(condition=models.Q(('archived_time__isnull', True), ('deleted_time__isnull', True)), fields=['priority', 'id'], name='issue_active_priority_idx'),
+        ),
+    ]
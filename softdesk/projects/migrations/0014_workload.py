@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_open_issues(apps, schema_editor):
+    # Each database counts the issues it stores, next to their contributors or the mirrors of them.
+    Issue = apps.get_model('projects', 'Issue')
+    Workload = apps.get_model('projects', 'Workload')
+    alias = schema_editor.connection.alias
+    workloads = {}
+    groups = (Issue.objects.using(alias).filter(deleted_time__isnull=True, archived_time__isnull=True)
+              .exclude(status='FINISHED').values('project_id', 'user_id', 'priority').annotate(count=Count('id'))
+              .order_by())
+    for group in groups:
+        workload = workloads.setdefault(group['user_id'], Workload(contributor_id=group['user_id'],
+                                                                   project_id=group['project_id']))
+        workload.open_issues += group['count']
+        workload.weight += group['count'] * settings.ISSUE_PRIORITY_WEIGHTS.get(group['priority'], 0)
+    Workload.objects.using(alias).bulk_create(workloads.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_issues', models.PositiveIntegerField(default=0)),
+                ('weight', models.PositiveIntegerField(default=0)),
+                ('contributor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='workload', to='projects.contributor')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workloads', to='projects.customproject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'weight', 'contributor'], name='workload_project_weight_idx')],
+            },
+        ),
+        migrations.RunPython(count_open_issues, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+from django.db import connections, migrations, models
+
+
+def copy_project_names(apps, schema_editor):
+    # The map entries of the existing projects get their names, read from the shard of each project.
+    if schema_editor.connection.alias != 'default':
+        return
+    CustomProject = apps.get_model('projects', 'CustomProject')
+    ProjectShard = apps.get_model('projects', 'ProjectShard')
+    entries = list(ProjectShard.objects.all())
+    names = {}
+    for alias in {entry.database for entry in entries}:
+        if alias in connections:
+            names.update(CustomProject.objects.using(alias).values_list('pk', 'name'))
+    for entry in entries:
+        entry.name = names.get(entry.pk)
+    ProjectShard.objects.bulk_update(entries, ['name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_notification_user_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectshard',
+            name='name',
+            field=models.CharField(max_length=150, null=True, unique=True),
+        ),
+        migrations.RunPython(copy_project_names, migrations.RunPython.noop),
+    ]
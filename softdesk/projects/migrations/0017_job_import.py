@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0016_projectshard_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='report',
+            field=models.JSONField(default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='action',
+            field=models.CharField(choices=[('PURGE', 'Purge'), ('ARCHIVE', 'Archive'), ('RESTORE', 'Restore'), ('IMPORT', 'Import')], default='PURGE', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='object_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -1,8 +1,15 @@
 
+import random
+
+from django.conf import settings
 from django.db.models import SET_NULL
 from uuid import uuid4
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from users.models import CustomUser
+from projects.fields import CompressedTextField, ExcerptField
+from projects.manager import ACTIVE, ActiveManager, CustomProjectManager
 
 class CustomProject(models.Model):
     """
@@ -17,6 +24,10 @@ class CustomProject(models.Model):
         description (CharField): Project description, max 150 characters
         type (CharField): Project type from TYPE_CHOICES, max 150 characters
         author (ForeignKey): Reference to CustomUser who created the project
+        deleted_time (DateTimeField): Timestamp of the soft deletion, null while the project is live.
+            Soft-deleted projects are hidden by the default manager until purged.
+        archived_time (DateTimeField): Timestamp of the archiving, null while the project is active.
+            Archived projects are hidden by the default manager and their issues live in the archive tier.
     Methods:
         __str__(): Returns the project name as string representation
     Meta:
@@ -35,14 +46,36 @@ class CustomProject(models.Model):
     description = models.CharField(max_length=150)
     type = models.CharField(max_length=150, choices=TYPE_CHOICES)
     author = models.ForeignKey(CustomUser, related_name='authored_projects', on_delete=models.CASCADE)
+    deleted_time = models.DateTimeField(null=True, default=None)
+    archived_time = models.DateTimeField(null=True, default=None)
 
+    objects = CustomProjectManager()
+    all_objects = models.Manager()
     
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Save the project, allocating its ID from the shard map when it is new.
+        A new project is inserted on the shard it was assigned to, whatever database
+        the caller picked before its ID was known. The shard map entry holds the name
+        too, so a name taken on another shard fails with an IntegrityError; callers
+        renaming a project wrap the save in a transaction spanning the default database
+        (``partitions.atomic``).
+        """
+        if self.pk is None:
+            entry = ProjectShard.allocate(self.name)
+            self.pk = entry.pk
+            kwargs.update(using=entry.database, force_insert=True)
+        elif kwargs.get('update_fields') is None or 'name' in kwargs['update_fields']:
+            ProjectShard.objects.filter(pk=self.pk).exclude(name=self.name).update(name=self.name)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'project'
         verbose_name_plural = 'projects'
+        indexes = [models.Index(fields=['author'], condition=ACTIVE, name='project_active_author_idx')]
 
 
 class Contributor(models.Model):
@@ -55,16 +88,27 @@ class Contributor(models.Model):
         project (ForeignKey): Reference to the CustomProject that the user is contributing to.
         created_time (DateTimeField): Timestamp when the contributor was added to the project.
                                      Automatically set when the record is created.
+        role (CharField): Role of the user in the project, from ROLE_CHOICES. Each role
+            grants a set of permissions (see ``projects.permissions.ROLE_PERMISSIONS``).
     Meta:
         unique_together: Ensures that a user can only be added once to a specific project,
                         preventing duplicate contributor entries for the same user-project pair.
     """
+    ROLE_CHOICES = [
+        ('OWNER', 'Owner'),
+        ('MAINTAINER', 'Maintainer'),
+        ('MEMBER', 'Member'),
+        ('VIEWER', 'Viewer'),
+    ]
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     project = models.ForeignKey(CustomProject, on_delete=models.CASCADE)
     created_time = models.DateTimeField(auto_now_add=True)
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='MEMBER')
     
     class Meta:
         unique_together = ('user', 'project')
+        # Contributors of a role, newest first, for the admin filter.
+        indexes = [models.Index(fields=['role', 'id'], name='contributor_role_idx')]
         
 
 class Issue(models.Model):
@@ -80,8 +124,9 @@ class Issue(models.Model):
             Automatically set on creation.
         modified_time (DateTimeField): Timestamp when the issue was last modified.
             Automatically updated on save.
-        description (CharField): Detailed description of the issue with a maximum
-            length of 150 characters.
+        description (CompressedTextField): Detailed description of the issue, in Markdown
+            and of any length. Stored compressed; list views defer it.
+        excerpt (ExcerptField): Plain-text beginning of the description, sent by list views.
         status (CharField): Current status of the issue. Choices are 'TO_DO',
             'IN_PROGRESS', or 'FINISHED'. Defaults to 'TO_DO'.
         priority (CharField): Priority level of the issue. Choices are 'LOW',
@@ -93,6 +138,9 @@ class Issue(models.Model):
             Related to CustomProject model with CASCADE deletion.
         author (ForeignKey): The contributor who created this issue.
             Related to Contributor model with CASCADE deletion. Can be null.
+        deleted_time (DateTimeField): Timestamp of the soft deletion, null while the issue is live.
+            Soft-deleted issues are hidden by the default manager until purged.
+        archived_time (DateTimeField): Timestamp of the archiving, null while the issue is active.
     Meta:
         verbose_name: 'issue'
         verbose_name_plural: 'issues'
@@ -121,17 +169,32 @@ class Issue(models.Model):
     name = models.CharField(max_length=150, default='Default Name')
     created_time = models.DateTimeField(auto_now_add=True)
     modified_time = models.DateTimeField(auto_now=True)
-    description = models.CharField(max_length=150)
+    description = CompressedTextField()
+    excerpt = ExcerptField()
     status = models.CharField(max_length=150, choices=STATUS_CHOICES, default='TO_DO')
     priority = models.CharField(max_length=150, choices=PRIORITY_CHOICES, default='LOW')
     type = models.CharField(max_length=150, choices=TYPE_CHOICES)
     user = models.ForeignKey(Contributor, related_name='issue_given_to_user', on_delete=models.CASCADE)
     project = models.ForeignKey(CustomProject, related_name='issues', on_delete=models.CASCADE)
     author = models.ForeignKey(Contributor, related_name='created_issues', on_delete=models.CASCADE, null=True, default=None)
+    deleted_time = models.DateTimeField(null=True, default=None)
+    archived_time = models.DateTimeField(null=True, default=None)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'issue'
         verbose_name_plural = 'issues'
+        indexes = [
+            models.Index(fields=['project'], condition=ACTIVE, name='issue_active_project_idx'),
+            # Issues of a status or a priority, newest first, for the admin filters.
+            models.Index(fields=['status', 'id'], condition=ACTIVE, name='issue_active_status_idx'),
+            models.Index(fields=['priority', 'id'], condition=ACTIVE, name='issue_active_priority_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
 
 
 class Comment(models.Model):
@@ -147,11 +210,22 @@ class Comment(models.Model):
             Automatically set on creation.
         modified_time (DateTimeField): Timestamp when the comment was last modified.
             Automatically updated on save.
-        description (CharField): The content of the comment (max 150 characters).
+        description (CompressedTextField): The content of the comment, in Markdown and
+            of any length. Stored compressed; list views defer it.
+        excerpt (ExcerptField): Plain-text beginning of the content, sent by list views.
         issue (ForeignKey): The issue this comment belongs to.
             Related name: 'issue_commented'
         uuid (UUIDField): Unique identifier for the comment.
             Automatically generated and not editable.
+        deleted_time (DateTimeField): Timestamp of the soft deletion, null while the comment is live.
+        archived_time (DateTimeField): Timestamp of the archiving, null while the comment is active.
+        parent (ForeignKey): The comment this one replies to, null for a top-level comment.
+            Related name: 'replies'
+        path (CharField): Materialized path of the comment in its thread: the IDs of its
+            ancestors and its own, each zero-padded to ``PATH_SEGMENT`` digits. Ordering by
+            path lists a thread depth-first, and a subtree is every comment whose path
+            starts with the path of its root. Set right after the insert, once the ID is known.
+        depth (PositiveSmallIntegerField): Number of ancestors, 0 for a top-level comment.
     Meta:
         verbose_name: 'comment'
         verbose_name_plural: 'comments'
@@ -159,11 +233,394 @@ class Comment(models.Model):
     author = models.ForeignKey(CustomUser, related_name='created_comments', on_delete=models.CASCADE)
     created_time = models.DateTimeField(auto_now_add=True)
     modified_time = models.DateTimeField(auto_now=True)
-    description = models.CharField(max_length=150)
+    description = CompressedTextField()
+    excerpt = ExcerptField()
     issue = models.ForeignKey(Issue, related_name='issue_commented', on_delete=models.CASCADE)
     uuid = models.UUIDField(default=uuid4, editable=False)
-    
+    deleted_time = models.DateTimeField(null=True, default=None)
+    archived_time = models.DateTimeField(null=True, default=None)
+    parent = models.ForeignKey('self', related_name='replies', null=True, blank=True, on_delete=models.CASCADE)
+    path = models.CharField(max_length=255, default='')
+    depth = models.PositiveSmallIntegerField(default=0)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    # Digits of each ID in the materialized path; 20 digits hold any 64-bit ID.
+    PATH_SEGMENT = 20
+
     class Meta:
         verbose_name = 'comment'
         verbose_name_plural = 'comments'
-        
+        indexes = [
+            # Threads of an issue in path order, and the subtree of a comment by path prefix.
+            models.Index(fields=['issue', 'path'], condition=ACTIVE, name='comment_active_thread_idx'),
+            # Top-level comments of an issue in path order, for the thread pages.
+            models.Index(fields=['issue', 'depth', 'path'], condition=ACTIVE, name='comment_active_top_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save the comment, then set its path once its ID is known."""
+        creating = self._state.adding and not self.path
+        if creating and self.parent_id:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if creating:
+            self.path = comment_path(self.parent.path if self.parent_id else '', self.pk)
+            Comment.all_objects.using(self._state.db).filter(pk=self.pk).update(path=self.path)
+
+
+def comment_path(parent_path, comment_id):
+    """Return the materialized path of a comment from the path of its parent ('' for none) and its ID."""
+    return f'{parent_path}{comment_id:0{Comment.PATH_SEGMENT}d}'
+
+
+
+class Attachment(models.Model):
+    """
+    A file attached to an issue or to one of its comments, such as a log or a screenshot.
+    The content is stored once per SHA-256 digest by the attachment storage (see
+    ``projects.storage``); the row only references it, so identical uploads share it.
+    Attributes:
+        uuid (UUIDField): Public identifier of the attachment.
+        issue (ForeignKey): The issue the file is attached to, or the issue of the comment.
+            Related name: 'attachments'
+        comment (ForeignKey): The comment the file is attached to, null for issue attachments.
+            Related name: 'attachments'
+        uploaded_by (ForeignKey): The user who uploaded the file.
+        name (CharField): Original file name.
+        content_type (CharField): Media type declared by the uploader.
+        size (BigIntegerField): Size of the content in bytes.
+        sha256 (CharField): Hex digest of the content, its address in the storage.
+        created_time (DateTimeField): Timestamp of the upload.
+    """
+    uuid = models.UUIDField(default=uuid4, editable=False)
+    issue = models.ForeignKey(Issue, related_name='attachments', on_delete=models.CASCADE)
+    comment = models.ForeignKey(Comment, related_name='attachments', null=True, blank=True, on_delete=models.CASCADE)
+    uploaded_by = models.ForeignKey(CustomUser, related_name='attachments', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, db_index=True)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'attachment'
+        verbose_name_plural = 'attachments'
+        indexes = [models.Index(fields=['issue', 'comment'], name='attachment_target_idx')]
+
+
+class Change(models.Model):
+    """
+    Append-only journal of the changes made to project data, used by the sync feed.
+    A row is recorded from the model signals for every create, update and delete of a
+    CustomProject, Contributor, Issue or Comment. Deletes are kept as tombstones, so
+    rows erased by cascades still reach the clients.
+    Attributes:
+        id (BigAutoField): Monotonic change sequence number.
+        project_id (BigIntegerField): ID of the project the changed row belongs to.
+            Not a foreign key, so tombstones outlive the project.
+        model (CharField): Name of the changed model ('project', 'contributor', 'issue', 'comment').
+        object_id (BigIntegerField): Primary key of the changed row.
+        user_id (BigIntegerField): For contributor rows, ID of the member, so a user
+            losing access to a project still receives the tombstone of their membership.
+        operation (CharField): 'CREATE', 'UPDATE' or 'DELETE'.
+        created_time (DateTimeField): Timestamp when the change was recorded.
+    Meta:
+        indexes: (project_id, id) and (user_id, id) back the "changes since" queries.
+    """
+    OPERATION_CHOICES = [
+        ('CREATE', 'Create'),
+        ('UPDATE', 'Update'),
+        ('DELETE', 'Delete')
+    ]
+
+    project_id = models.BigIntegerField()
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True)
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'id'], name='change_project_seq_idx'),
+            models.Index(fields=['user_id', 'id'], name='change_user_seq_idx'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """
+    Side effect to perform after a model change, written in the same transaction.
+    Messages are drained by the ``drain_outbox`` management command, which dispatches
+    each of them to the handler registered for its topic and retries failures with
+    exponential backoff.
+    Attributes:
+        topic (CharField): Name of the handler to run (e.g. 'notification').
+        payload (JSONField): Arguments of the handler.
+        idempotency_key (CharField): Unique key; enqueuing the same key twice is a no-op.
+        status (CharField): 'PENDING', 'PROCESSING', 'DONE' or 'FAILED'.
+        attempts (PositiveIntegerField): Number of failed attempts (expired leases included) so far.
+        available_time (DateTimeField): When the message can be (re)claimed by a worker.
+        claim_token (UUIDField): Token of the worker batch that claimed the message.
+        last_error (TextField): Error raised by the last failed attempt.
+        created_time (DateTimeField): Timestamp when the message was enqueued.
+        processed_time (DateTimeField): Timestamp when the message was handled.
+    Meta:
+        indexes: (status, available_time) backs the claim query of the workers.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField()
+    idempotency_key = models.CharField(max_length=150, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    available_time = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, default=None)
+    last_error = models.TextField(blank=True)
+    created_time = models.DateTimeField(auto_now_add=True)
+    processed_time = models.DateTimeField(null=True, default=None)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_time'], name='outbox_claim_idx')]
+
+
+class Notification(models.Model):
+    """
+    Notification delivered to a user about activity in one of their projects.
+    Attributes:
+        user (ForeignKey): The notified user.
+        verb (CharField): What happened ('issue_assigned', 'issue_created', 'comment_created').
+        payload (JSONField): Identifiers of the project, issue and comment concerned.
+        idempotency_key (CharField): Key of the outbox message that produced the notification.
+        created_time (DateTimeField): Timestamp when the notification was created.
+    Meta:
+        unique_together: A retried outbox message never notifies the same user twice.
+        indexes: (user, -id) backs the pages of a user's notifications, most recent first.
+    """
+    user = models.ForeignKey(CustomUser, related_name='notifications', on_delete=models.CASCADE)
+    verb = models.CharField(max_length=50)
+    payload = models.JSONField()
+    idempotency_key = models.CharField(max_length=150)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'idempotency_key')
+        indexes = [models.Index(fields=['user', '-id'], name='notification_user_id_idx')]
+
+
+class Webhook(models.Model):
+    """
+    Subscription of an external endpoint to the changes of a project.
+    The delivery worker (``deliver_webhooks``) tails the ``Change`` journal from the
+    webhook's cursor and posts the issue, comment and contributor changes in signed
+    batches.
+    Attributes:
+        project (ForeignKey): The project whose changes are delivered.
+        url (URLField): The endpoint receiving the POST requests.
+        secret (CharField): Key of the HMAC-SHA256 signature of every payload.
+        is_active (BooleanField): Whether deliveries are enabled.
+        last_seq (BigIntegerField): Sequence number of the last delivered change.
+        failures (PositiveIntegerField): Consecutive failed attempts for the pending batch.
+        next_attempt_time (DateTimeField): When the next delivery may be attempted.
+        created_time (DateTimeField): Timestamp when the webhook was created.
+    """
+    project = models.ForeignKey(CustomProject, related_name='webhooks', on_delete=models.CASCADE)
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64)
+    is_active = models.BooleanField(default=True)
+    last_seq = models.BigIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    next_attempt_time = models.DateTimeField(default=timezone.now)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+
+class WebhookDeadLetter(models.Model):
+    """
+    Batch of changes that could not be delivered to a webhook after every retry.
+    Attributes:
+        webhook (ForeignKey): The webhook the batch was meant for.
+        payload (JSONField): The undelivered payload.
+        attempts (PositiveIntegerField): Number of delivery attempts made.
+        last_error (TextField): Error of the last attempt.
+        created_time (DateTimeField): Timestamp when the batch was given up.
+    """
+    webhook = models.ForeignKey(Webhook, related_name='dead_letters', on_delete=models.CASCADE)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+
+class IssueChange(models.Model):
+    """
+    Append-only log of the field-level changes made to an issue.
+    The diff is stored in the compact encoding of ``projects.history``; the new status,
+    when it changed, is also kept in its own column so timeline aggregates (cycle time,
+    throughput) are answered from an index.
+    Attributes:
+        issue (ForeignKey): The changed issue.
+        project (ForeignKey): The project of the issue, denormalized for aggregates.
+        actor (ForeignKey): The user who made the change, if still existing.
+        diff (TextField): Encoded {field: [old, new]} mapping.
+        status (CharField): New status if the change modified it, else null.
+        created_time (DateTimeField): Timestamp of the change.
+    Meta:
+        indexes: (issue, id) backs the keyset-paginated timeline of an issue,
+                 (project, status, created_time) the aggregates of a project.
+    """
+    issue = models.ForeignKey(Issue, related_name='changes', on_delete=models.CASCADE)
+    project = models.ForeignKey(CustomProject, related_name='issue_changes', on_delete=models.CASCADE)
+    actor = models.ForeignKey(CustomUser, related_name='issue_changes', on_delete=models.SET_NULL, null=True)
+    diff = models.TextField()
+    status = models.CharField(max_length=150, choices=Issue.STATUS_CHOICES, null=True, default=None)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['issue', 'id'], name='issuechange_timeline_idx'),
+            models.Index(fields=['project', 'status', 'created_time'], name='issuechange_status_idx'),
+        ]
+
+
+
+class Workload(models.Model):
+    """
+    Open-issue counters of a contributor, kept with the issues of its project (in its
+    partition when it has one) and updated by ``projects.workload`` in the transaction
+    of every issue creation, update and deletion, so the least loaded contributor of a
+    project is found from an index instead of a scan of the issues.
+    Attributes:
+        contributor (OneToOneField): The contributor counted.
+        project (ForeignKey): The project of the contributor.
+        open_issues (PositiveIntegerField): Active, unfinished issues assigned to the contributor.
+        weight (PositiveIntegerField): Sum of the priority weights (``ISSUE_PRIORITY_WEIGHTS``)
+            of those issues.
+    Meta:
+        indexes: (project, weight, contributor) lists the contributors of a project from
+                 the least loaded.
+    """
+    contributor = models.OneToOneField(Contributor, related_name='workload', on_delete=models.CASCADE)
+    project = models.ForeignKey(CustomProject, related_name='workloads', on_delete=models.CASCADE)
+    open_issues = models.PositiveIntegerField(default=0)
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['project', 'weight', 'contributor'], name='workload_project_weight_idx')]
+
+class Job(models.Model):
+    """
+    Background job moving or removing all the data of a project or an issue, or importing users.
+    Jobs run from the outbox worker and process rows in bounded batches, recording their
+    progress so clients can poll it:
+        - PURGE: delete a soft-deleted project or issue and everything depending on it
+        - ARCHIVE: move the issues, comments and history of a project to the archive tier
+        - RESTORE: move them back from the archive tier
+        - IMPORT: create the users of an uploaded export
+    Attributes:
+        action (CharField): 'PURGE', 'ARCHIVE', 'RESTORE' or 'IMPORT'.
+        target (CharField): Label of the processed model ('projects.customproject', 'projects.issue'
+            or 'users.customuser').
+        object_id (BigIntegerField): Primary key of the processed row, None for an import.
+        requested_by (ForeignKey): The user who started the job.
+        status (CharField): 'PENDING', 'RUNNING' or 'DONE'.
+        step (CharField): Label of the model currently being processed.
+        processed_rows (PositiveBigIntegerField): Number of rows processed so far.
+        created_time (DateTimeField): Timestamp when the job was requested.
+        finished_time (DateTimeField): Timestamp when the job completed.
+        report (JSONField): Outcome of an import once done: the number of users ``created`` and
+            the rejected rows under ``errors``.
+    """
+    ACTION_CHOICES = [
+        ('PURGE', 'Purge'),
+        ('ARCHIVE', 'Archive'),
+        ('RESTORE', 'Restore'),
+        ('IMPORT', 'Import')
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done')
+    ]
+
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='PURGE')
+    target = models.CharField(max_length=100)
+    object_id = models.BigIntegerField(null=True)
+    requested_by = models.ForeignKey(CustomUser, related_name='jobs', on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    step = models.CharField(max_length=100, blank=True)
+    processed_rows = models.PositiveBigIntegerField(default=0)
+    created_time = models.DateTimeField(auto_now_add=True)
+    finished_time = models.DateTimeField(null=True, default=None)
+    report = models.JSONField(null=True, default=None)
+
+
+class ArchivedRow(models.Model):
+    """
+    Row of a cold project moved out of the hot tables by an ARCHIVE job.
+    The archive tier keeps the issues, comments and history of archived projects out of
+    the tables and indexes used by active queries. It can live in a separate database
+    (see ``ARCHIVE_DATABASE``); a RESTORE job moves the rows back unchanged.
+    Attributes:
+        project_id (BigIntegerField): ID of the archived project.
+        model (CharField): Label of the model of the row (e.g. 'projects.issue').
+        object_id (BigIntegerField): Primary key of the row.
+        data (JSONField): Serialized field values of the row.
+        created_time (DateTimeField): Timestamp when the row was archived.
+    Meta:
+        unique_together: A row is archived once, even if an interrupted job is replayed.
+    """
+    project_id = models.BigIntegerField()
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('model', 'object_id')
+        indexes = [models.Index(fields=['project_id', 'model', 'object_id'], name='archivedrow_project_idx')]
+
+
+class ProjectShard(models.Model):
+    """
+    Shard map entry assigning a project to the database holding its data.
+    Entries live on the default database, next to the users and the change journal;
+    their IDs are the project IDs, so project IDs are unique across shards, and their
+    names the project names, so names are unique across shards as well.
+    Attributes:
+        id (BigAutoField): ID of the project.
+        name (CharField): Name of the project, unique on the default database.
+        database (CharField): Alias of the shard holding the project, one of ``SHARDS``.
+        moving (BooleanField): Whether the project is being moved to another shard;
+            writes to its data are refused meanwhile.
+        created_time (DateTimeField): Timestamp when the ID was allocated.
+    """
+    name = models.CharField(max_length=150, unique=True, null=True)
+    database = models.CharField(max_length=100)
+    moving = models.BooleanField(default=False)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def allocate(cls, name):
+        """
+        Allocate the ID of a new project on a shard picked at random among ``SHARDS``.
+        Raises:
+            IntegrityError: If a project of any shard already has the name.
+        """
+        return cls.objects.create(name=name, database=random.choice(settings.SHARDS))
+
+    @classmethod
+    def allocate_many(cls, names):
+        """
+        Allocate the IDs of several new projects with one insert, each on a random shard.
+        Raises:
+            IntegrityError: If a project of any shard already has one of the names.
+        """
+        return cls.objects.bulk_create([cls(name=name, database=random.choice(settings.SHARDS)) for name in names])
+
@@ -0,0 +1,240 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+
+from .models import Comment, Contributor, Issue, Notification, OutboxMessage
+from .routers import use_project
+
+logger = logging.getLogger(__name__)
+
+# Handlers run by the outbox workers, by topic.
+HANDLERS = {}
+
+# Message whose handler is running in the current thread, for renew_lease.
+current_message = ContextVar('current_message', default=None)
+
+
+class LeaseLost(Exception):
+    """The lease of the message being processed expired and another worker claimed it."""
+
+
+def register(topic):
+    """
+    Register the decorated function as the handler of an outbox topic.
+    Handlers receive the message payload and idempotency key. They may run more than
+    once for the same message (after a crash or a lease expiry), so they must be
+    idempotent; the key is meant to deduplicate their own writes.
+    """
+    def decorator(handler):
+        HANDLERS[topic] = handler
+        return handler
+    return decorator
+
+
+def enqueue(topic, payload, idempotency_key):
+    """
+    Write an outbox message, in the transaction of the caller.
+    Enqueuing a key that already exists is silently ignored.
+    Args:
+        topic (str): Name of the registered handler.
+        payload (dict): JSON-serializable arguments of the handler.
+        idempotency_key (str): Unique key of the side effect.
+    """
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(topic=topic, payload=payload, idempotency_key=idempotency_key)],
+        ignore_conflicts=True,
+    )
+
+
+def claim(batch_size):
+    """
+    Claim a batch of messages ready to be processed.
+    Pending messages and messages whose processing lease expired (their worker died)
+    are claimed with one conditional UPDATE, so concurrent workers never share a message.
+    An expired lease counts as a failed attempt: a message crashing or hanging its
+    worker is marked as FAILED after ``OUTBOX_MAX_ATTEMPTS`` of them instead of being
+    retried forever.
+    Args:
+        batch_size (int): Maximum number of messages to claim.
+    Returns:
+        list: The claimed OutboxMessage instances.
+    """
+    now = timezone.now()
+    ready = OutboxMessage.objects.filter(status__in=['PENDING', 'PROCESSING'], available_time__lte=now)
+    ids = list(ready.order_by('available_time', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    ready.filter(id__in=ids, status='PROCESSING', attempts__gte=settings.OUTBOX_MAX_ATTEMPTS - 1).update(
+        status='FAILED', attempts=F('attempts') + 1, claim_token=None, last_error='Processing lease expired.',
+    )
+    token = uuid4()
+    lease = now + timedelta(seconds=settings.OUTBOX_LEASE)
+    ready.filter(id__in=ids).update(
+        status='PROCESSING', claim_token=token, available_time=lease,
+        attempts=Case(
+            When(status='PROCESSING', then=F('attempts') + 1), default=F('attempts'), output_field=PositiveIntegerField(),
+        ),
+    )
+    return list(OutboxMessage.objects.filter(claim_token=token, status='PROCESSING'))
+
+
+def renew_lease():
+    """
+    Extend the lease of the message being processed by another ``OUTBOX_LEASE`` seconds.
+    Handlers running longer than a lease call it between units of work, so no other
+    worker reclaims their message while they are still running. Outside a handler
+    it does nothing.
+    Raises:
+        LeaseLost: If the lease already expired and the message was claimed again
+                   (or its outcome recorded): the handler must stop.
+    """
+    message = current_message.get()
+    if message is None:
+        return
+    renewed = OutboxMessage.objects.filter(pk=message.pk, claim_token=message.claim_token, status='PROCESSING').update(
+        available_time=timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE)
+    )
+    if not renewed:
+        raise LeaseLost(message.pk)
+
+
+def process(message):
+    """
+    Run the handler of a claimed message and record the outcome.
+    A failure is retried after an exponential backoff until ``OUTBOX_MAX_ATTEMPTS``
+    attempts were made, then the message is marked as FAILED. A handler stopped by
+    ``LeaseLost`` records nothing: the worker that claimed the message again does.
+    Returns:
+        bool: True if the handler succeeded.
+    """
+    token = current_message.set(message)
+    try:
+        handler = HANDLERS[message.topic]
+        handler(message.payload, message.idempotency_key)
+    except LeaseLost:
+        # The worker now holding the message records its outcome.
+        logger.warning("Outbox message %s (%s) lease lost, stopping.", message.pk, message.topic)
+        return False
+    except Exception as error:
+        attempts = message.attempts + 1
+        delay = min(settings.OUTBOX_BACKOFF * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+        logger.warning("Outbox message %s (%s) failed, attempt %s: %r", message.pk, message.topic, attempts, error)
+        OutboxMessage.objects.filter(pk=message.pk, claim_token=message.claim_token).update(
+            status='FAILED' if attempts >= settings.OUTBOX_MAX_ATTEMPTS else 'PENDING',
+            attempts=attempts,
+            available_time=timezone.now() + timedelta(seconds=delay),
+            last_error=repr(error),
+        )
+        return False
+    finally:
+        current_message.reset(token)
+    OutboxMessage.objects.filter(pk=message.pk, claim_token=message.claim_token).update(
+        status='DONE', processed_time=timezone.now(), last_error=''
+    )
+    return True
+
+
+def process_in_thread(message):
+    try:
+        return process(message)
+    finally:
+        close_old_connections()
+
+
+def drain(batch_size=100, concurrency=4):
+    """
+    Claim and process batches of messages until none is ready.
+
+    Args:
+        batch_size (int): Number of messages claimed at once.
+        concurrency (int): Maximum number of handlers running at the same time.
+    Returns:
+        tuple: (succeeded, failed) message counts.
+    """
+    succeeded = failed = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    try:
+        while True:
+            batch = claim(batch_size)
+            if not batch:
+                return succeeded, failed
+            # With a concurrency of 1, handlers run inline on the caller's connection.
+            results = executor.map(process_in_thread, batch) if executor else map(process, batch)
+            for ok in results:
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def notify(verb, project_id, payload, idempotency_key, actor_id, extra_recipients=()):
+    """
+    Notify the contactable contributors of a project, except the user who acted.
+
+    Args:
+        verb (str): What happened.
+        project_id (int): The project whose contributors are notified.
+        payload (dict): Identifiers stored on every notification.
+        idempotency_key (str): Key of the outbox message.
+        actor_id (int): The user who triggered the notification.
+        extra_recipients (iterable): (user_id, verb) pairs overriding the verb for some users.
+    """
+    verbs = dict.fromkeys(
+        Contributor.objects.filter(project_id=project_id, user__can_be_contacted=True)
+        .exclude(user_id=actor_id).values_list('user_id', flat=True),
+        verb,
+    )
+    for user_id, user_verb in extra_recipients:
+        if user_id in verbs:
+            verbs[user_id] = user_verb
+    Notification.objects.bulk_create(
+        [Notification(user_id=user_id, verb=user_verb, payload=payload, idempotency_key=idempotency_key)
+         for user_id, user_verb in verbs.items()],
+        ignore_conflicts=True,
+    )
+
+
+@register('notification')
+def send_notification(payload, idempotency_key):
+    """
+    Handler notifying the contributors of a project about a new issue or comment.
+    The assignee of a new issue receives an 'issue_assigned' notification instead.
+    Nothing is sent if the issue or comment was deleted in the meantime.
+    """
+    with use_project(payload.get('project')):
+        if payload['event'] == 'issue_created':
+            issue = Issue.objects.filter(pk=payload['issue']).select_related('user').first()
+            if issue is None:
+                return
+            notify('issue_created', issue.project_id, {"project": issue.project_id, "issue": issue.pk},
+                   idempotency_key, payload['actor'], extra_recipients=[(issue.user.user_id, 'issue_assigned')])
+        elif payload['event'] == 'comment_created':
+            comment = Comment.objects.filter(pk=payload['comment']).select_related('issue').first()
+            if comment is None:
+                return
+            notify('comment_created', comment.issue.project_id,
+                   {"project": comment.issue.project_id, "issue": comment.issue_id, "comment": str(comment.uuid)},
+                   idempotency_key, payload['actor'])
+
+
+def issue_created(issue, actor):
+    """Enqueue the side effects of an issue creation."""
+    enqueue('notification', {"event": "issue_created", "issue": issue.pk, "project": issue.project_id, "actor": actor.pk},
+            f'issue_created:{issue.pk}:notification')
+
+
+def comment_created(comment, actor):
+    """Enqueue the side effects of a comment creation."""
+    enqueue('notification', {"event": "comment_created", "comment": comment.pk, "project": comment.issue.project_id,
+                             "actor": actor.pk},
+            f'comment_created:{comment.pk}:notification')
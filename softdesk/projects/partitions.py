@@ -0,0 +1,185 @@
+from contextlib import ExitStack, contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from users.models import CustomUser
+from .models import Contributor, CustomProject, Workload
+from .routers import (PARTITIONED_MODELS, SHARDED_MODELS, current_project, home_of, is_mirror, partition_for,
+                      project_of, shard_for)
+
+
+def project_databases(project_id):
+    """Return the databases holding the data of a project: the default one, its shard and its partition."""
+    aliases = [DEFAULT_DB_ALIAS]
+    if project_id is not None:
+        for alias in (shard_for(project_id), partition_for(project_id)):
+            if alias is not None and alias not in aliases:
+                aliases.append(alias)
+    return aliases
+
+
+@contextmanager
+def atomic():
+    """
+    Open a transaction on the default database and on the shard and partition of the
+    current project.
+    They commit or roll back together unless a commit itself fails, which keeps the
+    outbox and journal rows consistent with the project rows written next to them.
+    """
+    with ExitStack() as stack:
+        for alias in project_databases(current_project.get()):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def mirror_targets(instance):
+    """Return the databases holding a copy of a mirrored instance."""
+    if isinstance(instance, CustomUser):
+        return (set(settings.SHARDS) | set(settings.ISSUE_PARTITIONS.values())) - {DEFAULT_DB_ALIAS}
+    alias = partition_for(project_of(instance))
+    return {alias} - {home_of(instance), None}
+
+
+def copy_instance(instance, alias):
+    """Insert or update the copy of an instance in another database, keeping its field values."""
+    model = type(instance)
+    mirror = model(**{field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields})
+    # raw=True keeps the auto_now timestamps and skips the journal and mirror receivers.
+    mirror.save_base(using=alias, raw=True)
+
+
+def mirror_save(sender, instance, raw=False, **kwargs):
+    if raw or is_mirror(instance):
+        return
+    for alias in mirror_targets(instance):
+        copy_instance(instance, alias)
+
+
+def mirror_delete(sender, instance, **kwargs):
+    if is_mirror(instance):
+        return
+    for alias in mirror_targets(instance):
+        # The partition cascades the deletion to its own issues and comments.
+        sender._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+def mirror_created(instances):
+    """
+    Copy rows inserted in bulk, which send no signals, to the databases mirroring them,
+    with one insert per model and database.
+    """
+    batches = {}
+    for instance in instances:
+        if not is_mirror(instance):
+            for alias in mirror_targets(instance):
+                batches.setdefault((type(instance), alias), []).append(instance)
+    for (model, alias), rows in batches.items():
+        # raw=True keeps the auto_now timestamps.
+        model._base_manager.using(alias)._insert(rows, fields=model._meta.local_concrete_fields, raw=True)
+
+
+for mirrored_model in (CustomUser, CustomProject, Contributor):
+    post_save.connect(mirror_save, sender=mirrored_model, dispatch_uid=f'mirror_save_{mirrored_model.__name__}')
+    post_delete.connect(mirror_delete, sender=mirrored_model, dispatch_uid=f'mirror_delete_{mirrored_model.__name__}')
+
+
+def reserve_id_block(alias):
+    """
+    Move the ID sequences of the project tables of a database to its ID block.
+    Rows created in a shard or partition then never share an ID with rows of another
+    database, so the change journal and the sync feed can keep identifying rows by
+    model and ID alone. Project IDs come from the shard map and need no block.
+    Args:
+        alias (str): The shard or partition database, listed in ``DATABASE_ID_BLOCKS``.
+    Raises:
+        ValueError: If the database has no ID block or its backend is not supported.
+    """
+    block = settings.DATABASE_ID_BLOCKS.get(alias)
+    if not block:
+        raise ValueError(f"No ID block is configured for the '{alias}' database.")
+    start = block * settings.DATABASE_ID_BLOCK_SIZE
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for label in sorted((SHARDED_MODELS | PARTITIONED_MODELS) - {'projects.customproject'}):
+            table = apps.get_model(label)._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [start, table])
+                if cursor.rowcount == 0:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)})))",
+                    [table, start],
+                )
+            else:
+                raise ValueError(f"Partitions are not supported on {connection.vendor}.")
+
+
+def copy_rows(model, queryset, alias, batch_size):
+    """
+    Copy the rows of a queryset to another database in batches, skipping rows already there.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    copied = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not rows:
+            return copied
+        last_pk = rows[-1].pk
+        existing = set(model._base_manager.using(alias).filter(pk__in=[row.pk for row in rows])
+                       .values_list('pk', flat=True))
+        rows = [row for row in rows if row.pk not in existing]
+        if rows:
+            # raw=True keeps the stored auto_now/auto_now_add timestamps.
+            model._base_manager.using(alias)._insert(rows, fields=model._meta.local_concrete_fields, raw=True)
+            copied += len(rows)
+
+
+def partition_project(project_id, alias, batch_size=500, stdout=None):
+    """
+    Move the issues, comments, history and workload counters of a project from its shard to a partition.
+    The users, the project and its contributors are mirrored first, then the
+    partitioned rows are copied parents first and deleted from the shard children
+    first. Writes to the project must be stopped while it runs, and
+    ``ISSUE_PARTITIONS`` updated before they resume.
+    Args:
+        project_id (int): The project to move.
+        alias (str): The partition database.
+        batch_size (int): Rows copied or deleted per query.
+        stdout: Optional stream receiving progress lines.
+    """
+    from .jobs import archive_plan, deletion_order
+
+    reserve_id_block(alias)
+    shard = shard_for(project_id)
+    project = CustomProject.all_objects.using(shard).get(pk=project_id)
+
+    plan = [(CustomUser, [CustomUser._base_manager.using(DEFAULT_DB_ALIAS).all()]),
+            (CustomProject, [CustomProject._base_manager.using(shard).filter(pk=project.pk)]),
+            (Contributor, [Contributor._base_manager.using(shard).filter(project_id=project.pk)])]
+    for model, lookups in reversed(archive_plan()):
+        plan.append((model, [model._base_manager.using(shard).filter(**{lookup: project.pk})
+                             for lookup in lookups]))
+    # Workload counters follow the issues they count; they are not archived with them.
+    plan.append((Workload, [Workload._base_manager.using(shard).filter(project_id=project.pk)]))
+
+    for model, querysets in plan:
+        copied = sum(copy_rows(model, queryset, alias, batch_size) for queryset in querysets)
+        if stdout is not None:
+            stdout.write(f"{model._meta.label_lower}: {copied} row(s) copied to {alias}.")
+
+    for model, lookups in [(Workload, ['project'])] + archive_plan():
+        for lookup in lookups:
+            queryset = model._base_manager.using(shard).filter(**{lookup: project.pk}).order_by(deletion_order(model))
+            while True:
+                ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                model._base_manager.filter(pk__in=ids)._raw_delete(shard)
+
@@ -1,9 +1,154 @@
+from enum import IntFlag, auto
+from typing import NamedTuple
+
 from rest_framework import permissions
 
-from projects.models import Contributor, CustomProject
+from projects.models import Comment, Contributor, Issue
+
+
+class Perm(IntFlag):
+    """
+    Permissions a role grants in a project, combined into one bitmask per role.
+    DELETE_PROJECT covers archiving and restoring the project as well.
+    """
+    VIEW = auto()
+    CHANGE_PROJECT = auto()
+    DELETE_PROJECT = auto()
+    MANAGE_WEBHOOKS = auto()
+    MANAGE_CONTRIBUTORS = auto()
+    MANAGE_ROLES = auto()
+    CREATE_ISSUE = auto()
+    CHANGE_OWN_ISSUE = auto()
+    CHANGE_ANY_ISSUE = auto()
+    DELETE_OWN_ISSUE = auto()
+    DELETE_ANY_ISSUE = auto()
+    COMMENT = auto()
+    CHANGE_OWN_COMMENT = auto()
+    DELETE_OWN_COMMENT = auto()
+    DELETE_ANY_COMMENT = auto()
+
+
+# Permission bitmask of each contributor role, computed once at import.
+ROLE_PERMISSIONS = {
+    'VIEWER': Perm.VIEW,
+}
+ROLE_PERMISSIONS['MEMBER'] = (ROLE_PERMISSIONS['VIEWER'] | Perm.CREATE_ISSUE | Perm.CHANGE_OWN_ISSUE
+                              | Perm.DELETE_OWN_ISSUE | Perm.COMMENT | Perm.CHANGE_OWN_COMMENT
+                              | Perm.DELETE_OWN_COMMENT)
+ROLE_PERMISSIONS['MAINTAINER'] = (ROLE_PERMISSIONS['MEMBER'] | Perm.MANAGE_CONTRIBUTORS | Perm.CHANGE_ANY_ISSUE
+                                  | Perm.DELETE_ANY_ISSUE | Perm.DELETE_ANY_COMMENT)
+ROLE_PERMISSIONS['OWNER'] = ~Perm(0)
+# Checks run on plain ints: IntFlag arithmetic is several times slower.
+ROLE_PERMISSIONS = {role: int(mask) for role, mask in ROLE_PERMISSIONS.items()}
+
+# Contributor roles, and those maintainers may give when adding contributors; the
+# others need MANAGE_ROLES.
+ROLES = tuple(role for role, _ in Contributor.ROLE_CHOICES)
+BASIC_ROLES = ('MEMBER', 'VIEWER')
+
+# Actions answered by can(): the permission allowing them on any object, and the one
+# allowing them on the member's own issues and comments (None when not applicable).
+ACTIONS = {
+    'view': (Perm.VIEW, None),
+    'change_project': (Perm.CHANGE_PROJECT, None),
+    'delete_project': (Perm.DELETE_PROJECT, None),
+    'manage_webhooks': (Perm.MANAGE_WEBHOOKS, None),
+    'manage_contributors': (Perm.MANAGE_CONTRIBUTORS, None),
+    'manage_roles': (Perm.MANAGE_ROLES, None),
+    'create_issue': (Perm.CREATE_ISSUE, None),
+    'change_issue': (Perm.CHANGE_ANY_ISSUE, Perm.CHANGE_OWN_ISSUE),
+    'delete_issue': (Perm.DELETE_ANY_ISSUE, Perm.DELETE_OWN_ISSUE),
+    'create_comment': (Perm.COMMENT, None),
+    'change_comment': (0, Perm.CHANGE_OWN_COMMENT),
+    'delete_comment': (Perm.DELETE_ANY_COMMENT, Perm.DELETE_OWN_COMMENT),
+}
+ACTIONS = {action: (int(any_permission), int(own_permission or 0))
+           for action, (any_permission, own_permission) in ACTIONS.items()}
+
+
+class Membership(NamedTuple):
+    """
+    The membership of a user in a project, with the permission bitmask of its role and
+    whether the project is active (neither deleted nor archived).
+    """
+    contributor_id: int
+    user_id: int
+    role: str
+    permissions: int
+    project_active: bool = True
+
+
+def get_membership(request, project_id):
+    """
+    Return the membership of the authenticated user in the given project.
+    The contributor row and the state of its project are loaded with one query and
+    memoized in the ``membership_cache`` dict attached to the underlying HttpRequest,
+    so every permission check of a request (permission classes, then the view itself)
+    is answered from it, and views reading the project's issues need no query of the
+    project. The batch endpoint shares one cache between all of its sub-requests.
+    Args:
+        request: The DRF or Django request carrying the authenticated user.
+        project_id (int): The ID of the project.
+    Returns:
+        Membership: The membership, or None if the user is not a contributor
+                    (including when the project does not exist).
+    """
+    http_request = getattr(request, '_request', request)
+    cache = getattr(http_request, 'membership_cache', None)
+    if cache is None:
+        cache = http_request.membership_cache = {}
+
+    key = (request.user.pk, int(project_id))
+    if key not in cache:
+        row = (Contributor.objects.filter(project_id=project_id, user=request.user)
+               .values_list('pk', 'role', 'project__deleted_time', 'project__archived_time').first())
+        cache[key] = (Membership(row[0], request.user.pk, row[1], ROLE_PERMISSIONS[row[1]],
+                                 row[2] is None and row[3] is None) if row else None)
+    return cache[key]
+
+
+def is_contributor(request, project_id):
+    """Check whether the authenticated user is a contributor of the given project."""
+    return get_membership(request, project_id) is not None
+
+
+def is_own(membership, obj):
+    """Whether an issue or comment belongs to a member, judged from its loaded foreign key IDs."""
+    if isinstance(obj, Issue):
+        return membership.contributor_id in (obj.author_id, obj.user_id)
+    if isinstance(obj, Comment):
+        return obj.author_id == membership.user_id
+    return False
+
+
+def can(membership, action, obj=None):
+    """
+    Answer whether a member may perform an action, on an object if one is given.
+    The answer comes from the permission bitmask of the membership and the foreign
+    key IDs of the object; no query is made.
+    Args:
+        membership (Membership): The membership returned by get_membership, or None.
+        action (str): One of the ACTIONS.
+        obj (Issue or Comment, optional): The object acted upon, for the actions
+            allowed on the member's own objects.
+    Returns:
+        bool: True if the action is allowed.
+    """
+    if membership is None:
+        return False
+    any_permission, own_permission = ACTIONS[action]
+    if any_permission and membership.permissions & any_permission:
+        return True
+    return bool(own_permission and obj is not None and membership.permissions & own_permission
+                and is_own(membership, obj))
+
+
+# Action checked by ProjectPermissions.has_object_permission for each method.
+PROJECT_ACTIONS = {'PUT': 'change_project', 'PATCH': 'change_project', 'DELETE': 'delete_project'}
+
 
 class ProjectPermissions(permissions.BasePermission):
-    
+
     def has_permission(self, request, view):
         """
         Check if the user has permission to perform the requested action on a project.
@@ -22,23 +167,20 @@ class ProjectPermissions(permissions.BasePermission):
             - Returns True if no project_id is found in the URL parameters
         """
         if request.method == 'POST':
-            return True  
-        
+            return True
+
         project_id = view.kwargs.get('pk') or view.kwargs.get('project_id')
         if project_id:
-            try:
-                project = CustomProject.objects.get(pk=project_id)
-                return Contributor.objects.filter(project=project, user=request.user).exists()
-            except CustomProject.DoesNotExist:
-                return False
+            return is_contributor(request, project_id)
         return True
-        
+
     def has_object_permission(self, request, view, obj):
         """
         Check if the user has permission to perform the requested action on the project object.
 
         For safe methods (GET, HEAD, OPTIONS), users need to be contributors of the project.
-        For unsafe methods (POST, PUT, PATCH, DELETE), only the project author has permission.
+        Updates need the CHANGE_PROJECT permission and deletions DELETE_PROJECT, which
+        only owners have.
 
         Args:
             request: The HTTP request object containing user and method information
@@ -48,13 +190,12 @@ class ProjectPermissions(permissions.BasePermission):
         Returns:
             bool: True if the user has permission, False otherwise
         """
-        if request.method in permissions.SAFE_METHODS:
-            return Contributor.objects.filter(project=obj, user=request.user).exists()
-        return obj.author == request.user
-    
+        action = 'view' if request.method in permissions.SAFE_METHODS else PROJECT_ACTIONS.get(request.method)
+        return action is not None and can(get_membership(request, obj.pk), action)
+
 class CommentPermissions(permissions.BasePermission):
-    
-    
+
+
     def has_permission(self, request, view):
         """
         Check if the current user has permission to access the project.
@@ -66,31 +207,28 @@ class CommentPermissions(permissions.BasePermission):
             view (ViewSet): The view instance containing URL parameters including 'project_id'.
         Returns:
             bool: True if the user is a contributor to the project, False otherwise.
-        Raises:
-            CustomProject.DoesNotExist: If no project exists with the given project_id.
         """
-    
+
         project_id = view.kwargs.get('project_id')
-        project = CustomProject.objects.get(pk=project_id)
-        return Contributor.objects.filter(project=project, user=request.user).exists()
-        
-        
+        return is_contributor(request, project_id)
+
+
     def has_object_permission(self, request, view, obj):
         """
         Check if the user has permission to perform the requested action on the object.
         Args:
             request: The HTTP request object containing user information and method type.
             view: The view that is handling the request.
-            obj: The object instance that the permission check is being performed on.
+            obj: The comment instance that the permission check is being performed on.
         Returns:
             bool: True if the user has permission to perform the action, False otherwise.
                   - Returns True for safe methods (GET, HEAD, OPTIONS) for all users
-                  - Returns True for unsafe methods (POST, PUT, PATCH, DELETE) only if 
-                    the requesting user is the author of the object
+                  - Returns True for updates only if the requesting user is the author of the comment
+                  - Returns True for deletions if the user is the author or may moderate comments
         """
-        
+
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return obj.author == request.user
-    
\ No newline at end of file
+        action = 'delete_comment' if request.method == 'DELETE' else 'change_comment'
+        return can(get_membership(request, view.kwargs.get('project_id')), action, obj)
@@ -0,0 +1,200 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Project the current request or job works on, set from the URL kwargs by the
+# ProjectRoutingMiddleware (and by the batch endpoint and the outbox handlers).
+current_project = ContextVar('current_project', default=None)
+
+# Models stored on the shard of their project (see SHARDS and ProjectShard).
+SHARDED_MODELS = {'projects.customproject', 'projects.contributor', 'projects.webhook', 'projects.webhookdeadletter'}
+
+# Models stored in the partition of their project when it has one (see ISSUE_PARTITIONS),
+# on its shard otherwise.
+PARTITIONED_MODELS = {'projects.issue', 'projects.comment', 'projects.issuechange', 'projects.attachment',
+                      'projects.workload'}
+
+# Models copied to the other databases, so the foreign keys of their rows resolve there:
+# users to every shard and partition, projects and contributors to their partition.
+MIRRORED_MODELS = {'users.customuser', 'projects.customproject', 'projects.contributor'}
+
+# Cached shard map entries: project ID -> (database, moving, expiry).
+_placements = {}
+
+
+class ProjectMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The project is being moved to another database, retry in a few seconds."
+    default_code = 'project_moving'
+
+
+@contextmanager
+def use_project(project_id):
+    """Route the queries of the enclosed block as if serving the given project."""
+    token = current_project.set(int(project_id) if project_id is not None else None)
+    try:
+        yield
+    finally:
+        current_project.reset(token)
+
+
+def project_from_view(view_func, view_kwargs):
+    """
+    Return the project ID found in the URL kwargs of a view, or None.
+    Views name it ``project_id`` unless they declare another ``project_url_kwarg``.
+    """
+    kwarg = getattr(getattr(view_func, 'view_class', None), 'project_url_kwarg', 'project_id')
+    return view_kwargs.get(kwarg)
+
+
+def placement(project_id):
+    """
+    Return the shard map entry of a project as a (database, moving) tuple.
+    Entries are cached for ``SHARD_MAP_TTL`` seconds; with a single shard the map is
+    not read at all. Projects missing from the map live on the default database.
+    """
+    if len(settings.SHARDS) == 1:
+        return settings.SHARDS[0], False
+    cached = _placements.get(project_id)
+    if cached is not None and cached[2] > time.monotonic():
+        return cached[:2]
+    from .models import ProjectShard
+
+    entry = ProjectShard.objects.filter(pk=project_id).values_list('database', 'moving').first()
+    database, moving = entry or (DEFAULT_DB_ALIAS, False)
+    _placements[project_id] = (database, moving, time.monotonic() + settings.SHARD_MAP_TTL)
+    return database, moving
+
+
+def forget_placement(project_id):
+    """Drop the cached shard map entry of a project in this process."""
+    _placements.pop(project_id, None)
+
+
+def shard_for(project_id):
+    """Return the database alias of the shard holding a project."""
+    return placement(int(project_id))[0]
+
+
+def partition_for(project_id):
+    """Return the database alias of a project's partition, or None if it is not partitioned."""
+    if project_id is None:
+        return None
+    return settings.ISSUE_PARTITIONS.get(int(project_id))
+
+
+def database_for(label, project_id):
+    """
+    Return the database holding the rows of a model for a project.
+
+    Args:
+        label (str): Lowercase label of a sharded or partitioned model.
+        project_id (int): The project, or None if unknown.
+    Returns:
+        str: The database alias, or None when the project is unknown.
+    """
+    if project_id is None:
+        return None
+    if label in PARTITIONED_MODELS:
+        alias = partition_for(project_id)
+        if alias is not None:
+            return alias
+    return shard_for(project_id)
+
+
+def project_of(instance):
+    """Return the ID of the project an instance belongs to, if it is known without a query."""
+    label = instance._meta.label_lower
+    if label == 'projects.customproject':
+        return instance.pk
+    if label == 'projects.webhookdeadletter':
+        webhook = instance._meta.get_field('webhook')
+        return instance.webhook.project_id if webhook.is_cached(instance) else None
+    return getattr(instance, 'project_id', None)
+
+
+def home_of(instance):
+    """Return the database holding the original of a mirrored or sharded instance."""
+    if instance._meta.label_lower == 'users.customuser':
+        return DEFAULT_DB_ALIAS
+    return database_for(instance._meta.label_lower, project_of(instance)) or DEFAULT_DB_ALIAS
+
+
+def is_mirror(instance):
+    """Whether an instance is the copy of a mirrored row held by another database."""
+    return (instance._meta.label_lower in MIRRORED_MODELS
+            and instance._state.db is not None and instance._state.db != home_of(instance))
+
+
+class ProjectRouter:
+    """
+    Database router sending the data of each project to its shard, and the issues,
+    comments and history of partitioned projects to their partition.
+    One database is a scaling ceiling: projects are spread over the ``SHARDS``
+    databases by the ``ProjectShard`` map, and a handful of large tenants can get a
+    database of their own (``ISSUE_PARTITIONS``) for their issues. Users, the change
+    journal and the other global tables stay on the default database.
+    The database is chosen from the instance being saved or followed when it is known,
+    otherwise from ``current_project``. Writes to a project being moved to another
+    shard raise ProjectMoving.
+    """
+    project_models = SHARDED_MODELS | PARTITIONED_MODELS
+
+    def db_for_read(self, model, **hints):
+        label = model._meta.label_lower
+        if label not in self.project_models:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._meta.label_lower in self.project_models and instance._state.db:
+                return instance._state.db
+            project_id = project_of(instance)
+            if project_id is not None:
+                return database_for(label, project_id)
+        return database_for(label, current_project.get())
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in self.project_models:
+            instance = hints.get('instance')
+            project_id = project_of(instance) if instance is not None else None
+            project_id = project_id if project_id is not None else current_project.get()
+            if project_id is not None and placement(int(project_id))[1]:
+                raise ProjectMoving()
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Project rows point to the mirrors of their users, project and contributors.
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels & self.project_models and labels <= self.project_models | MIRRORED_MODELS:
+            return True
+        return None
+
+
+class ArchiveRouter:
+    """
+    Database router sending the archive tier to the ``ARCHIVE_DATABASE`` alias.
+    Archived rows are only read and written by the archive and restore jobs, so they can
+    live on a cheaper database than the hot tables. When that alias is a dedicated
+    database, nothing else is migrated there.
+    """
+    archive_label = 'projects.archivedrow'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower == self.archive_label:
+            return settings.ARCHIVE_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if f'{app_label}.{model_name}' == self.archive_label:
+            return db == settings.ARCHIVE_DATABASE
+        if db == settings.ARCHIVE_DATABASE != 'default':
+            return False
+        return None
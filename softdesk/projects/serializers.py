@@ -1,23 +1,44 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import CustomProject, Contributor, Issue, Comment
+from .models import Attachment, CustomProject, Contributor, Issue, Comment, Job, Notification, Webhook
+from .routers import database_for
 
 class ContributorSerializer(serializers.ModelSerializer):
     """
     Serializer for the Contributor model.
 
     This serializer handles the serialization and deserialization of Contributor
-    instances, including the id, user, project, and created_time fields.
+    instances, including the id, user, project, created_time and role fields.
 
     Fields:
         id: The unique identifier of the contributor
         user: The user who is a contributor to the project
         project: The project to which the user is contributing
         created_time: The timestamp when the contributor was added to the project
+        role: The role of the user in the project
     """
     class Meta:
         model = Contributor
-        fields = ['id', 'user', 'project', 'created_time']
+        fields = ['id', 'user', 'project', 'created_time', 'role']
+
+
+class WorkloadSerializer(serializers.ModelSerializer):
+    """
+    Serializer of the contributors of a project with their workload.
+    Fields:
+        id: The unique identifier of the contributor
+        user: The user who is a contributor to the project
+        role: The role of the user in the project
+        open_issues: Number of unfinished issues assigned to the contributor
+        weight: Sum of the priority weights of these issues (``ISSUE_PRIORITY_WEIGHTS``)
+    """
+    open_issues = serializers.IntegerField(read_only=True)
+    weight = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Contributor
+        fields = ['id', 'user', 'role', 'open_issues', 'weight']
 
 
 class CustomProjectSerializer(serializers.ModelSerializer):
@@ -45,6 +66,9 @@ class CustomProjectSerializer(serializers.ModelSerializer):
         model = CustomProject
         fields = ['id', 'name', 'description', 'type', 'author']
         read_only_fields = ["id", "author", 'created_time', 'modified_time']
+        # Name uniqueness is enforced on write by CustomProjectManager and the unique
+        # constraint, which also catches concurrent creations.
+        extra_kwargs = {'name': {'validators': []}}
         
         
 class IssueSerializer(serializers.ModelSerializer):
@@ -62,7 +86,8 @@ class IssueSerializer(serializers.ModelSerializer):
         - status: Current status of the issue
         - priority: Priority level of the issue
         - type: Type/category of the issue
-        - user: User who created the issue (read-only)
+        - user: Contributor assigned to the issue
+        - auto_assign: Assign the new issue to the least loaded contributor (write-only)
         - project: Project the issue belongs to (read-only)
         - created_time: Timestamp when issue was created (read-only)
         - modified_time: Timestamp when issue was last modified (read-only)
@@ -71,10 +96,40 @@ class IssueSerializer(serializers.ModelSerializer):
         Fields that cannot be modified through API requests to maintain data integrity
         and proper assignment of ownership and timestamps.
     """
+    # On creation, assign the issue to the least loaded contributor instead of ``user``.
+    auto_assign = serializers.BooleanField(write_only=True, required=False, default=False)
+
     class Meta:
         model = Issue
-        fields = ['id', 'name', 'description', 'status', 'priority', 'type', 'user', 'project']
+        fields = ['id', 'name', 'description', 'status', 'priority', 'type', 'user', 'project', 'auto_assign']
         read_only_fields = ["id", "project", 'created_time', 'modified_time']
+        extra_kwargs = {'user': {'required': False}}
+
+    def validate(self, attrs):
+        """
+        Require an assignee, unless the issue is being created with ``auto_assign``.
+        Raises:
+            serializers.ValidationError: If the user field is missing.
+        """
+        if self.instance is not None:
+            attrs.pop('auto_assign', None)
+        if 'user' not in attrs and not attrs.get('auto_assign') and not self.partial:
+            raise serializers.ValidationError({'user': [self.fields['user'].error_messages['required']]})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data.pop('auto_assign', None)
+        return super().create(validated_data)
+
+
+class IssueListSerializer(IssueSerializer):
+    """
+    Serializer for the issues of list responses.
+    The plain-text ``excerpt`` stands for the description, which list views do not
+    load (see ``Issue.description``); the detail view returns the full text.
+    """
+    class Meta(IssueSerializer.Meta):
+        fields = ['id', 'name', 'excerpt', 'status', 'priority', 'type', 'user', 'project']
         
         
 class CommentSerializer(serializers.ModelSerializer):
@@ -93,12 +148,165 @@ class CommentSerializer(serializers.ModelSerializer):
         - description: Content of the comment (editable)
         - issue: Associated issue for the comment (read-only)
         - uuid: Unique identifier UUID for the comment (read-only)
+        - parent: ID of the comment replied to, null for a top-level comment (set on creation only)
+        - depth: Number of ancestors of the comment in its thread (read-only)
 
     Read-only fields are automatically set by the system and cannot be modified
     through API requests.
     """
     class Meta:
         model = Comment
-        fields = ['id','author', 'created_time', 'modified_time', 'description', 'issue', 'uuid']
-        read_only_fields = ["id", "author", 'created_time', 'modified_time', "uuid", "issue"]
+        fields = ['id','author', 'created_time', 'modified_time', 'description', 'issue', 'uuid', 'parent', 'depth']
+        read_only_fields = ["id", "author", 'created_time', 'modified_time', "uuid", "issue", 'depth']
+
+    def validate_parent(self, parent):
+        """
+        Check that a reply answers a live comment of the same issue, within the nesting limit.
+        Raises:
+            serializers.ValidationError: If the comment is moved, or the parent belongs to
+                                         another issue or is nested too deep.
+        """
+        if self.instance is not None:
+            if parent != self.instance.parent:
+                raise serializers.ValidationError("A comment cannot be moved to another thread.")
+            return parent
+        if parent is None:
+            return parent
+        issue = self.context.get('issue')
+        if issue is not None and parent.issue_id != issue.pk:
+            raise serializers.ValidationError("The parent comment belongs to another issue.")
+        if parent.depth >= settings.COMMENT_MAX_DEPTH:
+            raise serializers.ValidationError(
+                f"Replies cannot be nested more than {settings.COMMENT_MAX_DEPTH} levels deep.")
+        return parent
+
+
+class CommentListSerializer(CommentSerializer):
+    """
+    Serializer for the comments of list responses and thread pages, sending the
+    plain-text ``excerpt`` instead of the description, which they do not load.
+    """
+    class Meta(CommentSerializer.Meta):
+        fields = ['id', 'author', 'created_time', 'modified_time', 'excerpt', 'issue', 'uuid', 'parent', 'depth']
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the files attached to issues and comments. Every field is read-only:
+    attachments are created from an upload and never modified.
+    """
+    class Meta:
+        model = Attachment
+        fields = ['uuid', 'name', 'content_type', 'size', 'sha256', 'issue', 'comment', 'uploaded_by', 'created_time']
+        read_only_fields = fields
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """
+    Serializer for Notification model.
+
+    Fields:
+        - id: Unique identifier for the notification (read-only)
+        - verb: What happened (issue_assigned, issue_created, comment_created)
+        - payload: Identifiers of the project, issue and comment concerned
+        - created_time: Timestamp when the notification was created
+    """
+    class Meta:
+        model = Notification
+        fields = ['id', 'verb', 'payload', 'created_time']
+        read_only_fields = ['id', 'verb', 'payload', 'created_time']
+
+
+
+class WebhookSerializer(serializers.ModelSerializer):
+    """
+    Serializer for Webhook model.
+
+    Fields:
+        - id: Unique identifier for the webhook (read-only)
+        - url: Endpoint receiving the change batches
+        - is_active: Whether deliveries are enabled
+        - secret: Key used to sign the payloads, generated on creation (read-only)
+        - project: Project whose changes are delivered (read-only)
+        - last_seq: Sequence number of the last delivered change (read-only)
+        - failures: Consecutive failed attempts of the pending batch (read-only)
+    """
+    class Meta:
+        model = Webhook
+        fields = ['id', 'url', 'is_active', 'secret', 'project', 'last_seq', 'failures', 'created_time']
+        read_only_fields = ['id', 'secret', 'project', 'last_seq', 'failures', 'created_time']
+
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for Job model.
+
+    Fields:
+        - id: Unique identifier for the job
+        - action: PURGE, ARCHIVE, RESTORE or IMPORT
+        - target: Label of the processed model
+        - object_id: Primary key of the processed row (null for an import)
+        - status: PENDING, RUNNING or DONE
+        - step: Label of the model being processed
+        - processed_rows: Number of rows processed so far
+        - created_time: Timestamp of the request
+        - finished_time: Timestamp when the job completed
+        - report: Users created and rows rejected by a finished import
+    """
+    class Meta:
+        model = Job
+        fields = ['id', 'action', 'target', 'object_id', 'status', 'step', 'processed_rows', 'created_time',
+                  'finished_time', 'report']
+        read_only_fields = fields
+
+
+# Serializer of each model name found in the Change journal.
+CHANGE_SERIALIZERS = {
+    'project': CustomProjectSerializer,
+    'contributor': ContributorSerializer,
+    'issue': IssueSerializer,
+    'comment': CommentSerializer,
+}
+
+
+def serialize_changes(changes):
+    """
+    Serialize journal changes along with the current state of the changed rows.
+    Several changes of the same row are collapsed into the latest one, and the rows
+    still existing are loaded with one query per model and database (shard or partition).
+    Args:
+        changes (list): Change instances ordered by sequence number.
+    Returns:
+        list: One dict per changed row, ordered by sequence number, with the ``data``
+              of the row (None if it was deleted).
+    """
+    latest = {}
+    for change in changes:
+        latest.pop((change.model, change.object_id), None)
+        latest[(change.model, change.object_id)] = change
+
+    instances = {}
+    for name, serializer_class in CHANGE_SERIALIZERS.items():
+        model = serializer_class.Meta.model
+        ids_by_database = {}
+        for (model_name, object_id), change in latest.items():
+            if model_name == name and change.operation != 'DELETE':
+                alias = database_for(model._meta.label_lower, change.project_id)
+                ids_by_database.setdefault(alias, []).append(object_id)
+        instances[name] = {}
+        for alias, ids in ids_by_database.items():
+            instances[name].update(model.objects.using(alias).in_bulk(ids))
 
+    results = []
+    for (name, object_id), change in latest.items():
+        instance = instances.get(name, {}).get(object_id)
+        results.append({
+            "seq": change.id,
+            "model": name,
+            "id": object_id,
+            "project": change.project_id,
+            "operation": change.operation,
+            "data": CHANGE_SERIALIZERS[name](instance).data if instance is not None else None,
+        })
+    return results
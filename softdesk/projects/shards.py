@@ -0,0 +1,213 @@
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.models import Max
+
+from softdesk.budgets import counted
+from users.models import CustomUser
+from .models import Change, CustomProject, ProjectShard
+from .partitions import copy_instance, copy_rows, reserve_id_block
+from .routers import PARTITIONED_MODELS, SHARDED_MODELS, forget_placement, partition_for
+from .signals import SYNCED_MODELS
+
+
+def run_in_thread(function, alias):
+    try:
+        return function(alias)
+    finally:
+        close_old_connections()
+
+
+def fan_out(function, aliases=None):
+    """
+    Call a function once per shard, concurrently, and return the results in shard order.
+    Each call runs on its own thread and database connection, its queries counted in the
+    query budget of the calling request. With a single shard the function runs inline,
+    on the caller's connection and transaction.
+    Args:
+        function (callable): Receives a database alias.
+        aliases (list, optional): The databases to query. Defaults to ``SHARDS``.
+    Returns:
+        list: The result of each call.
+    """
+    aliases = list(aliases if aliases is not None else settings.SHARDS)
+    if len(aliases) == 1:
+        return [function(aliases[0])]
+    function = counted(function)
+    with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+        return list(executor.map(lambda alias: run_in_thread(function, alias), aliases))
+
+
+def merge_pages(queryset, after=None, limit=None):
+    """
+    Return one keyset page of a queryset of sharded rows, merged across shards by primary key.
+    Every shard returns at most ``limit`` rows after the ``after`` key, so the merged
+    page is exact while no shard is read past what the page needs.
+    Args:
+        queryset (QuerySet): The rows to list, on any database.
+        after (int, optional): Primary key of the last row of the previous page.
+        limit (int, optional): Page size; every row when omitted.
+    Returns:
+        list: The rows ordered by primary key.
+    """
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    queryset = queryset.order_by('pk')
+    if limit is not None:
+        queryset = queryset[:limit]
+    pages = fan_out(lambda alias: list(queryset.using(alias)))
+    return list(islice(heapq.merge(*pages, key=lambda row: row.pk), limit))
+
+
+def prepare_database(alias, stdout=None):
+    """
+    Get a new shard or partition database ready: create its tables, move its ID
+    sequences to its ID block and mirror the users.
+    """
+    call_command('migrate', database=alias, verbosity=0)
+    reserve_id_block(alias)
+    copied = copy_rows(CustomUser, CustomUser._base_manager.using(DEFAULT_DB_ALIAS).all(), alias, 500)
+    if stdout is not None:
+        stdout.write(f"{alias}: migrated, {copied} user(s) mirrored.")
+
+
+def check_id_blocks(source, target):
+    """
+    Refuse moves that would break the ID blocks of the target database.
+    Moved rows keep their IDs. SQLite never allocates an ID below the largest one of a
+    table, so the target must have a higher ID block than the source there.
+    Raises:
+        ValueError: If the target's ID sequences would run into the source's block.
+    """
+    blocks = {DEFAULT_DB_ALIAS: 0, **settings.DATABASE_ID_BLOCKS}
+    if connections[target].vendor == 'sqlite' and blocks.get(target, 0) < blocks.get(source, 0):
+        raise ValueError(f"On SQLite, rows can only move to a database with a higher ID block than '{source}'.")
+
+
+def moved_plan(project_id):
+    """
+    List the models moved with a project, children first.
+    The issues, comments and history of a partitioned project stay in their partition.
+    Returns:
+        list: (model, lookups) pairs relative to the project, as in ``cascade_plan``.
+    """
+    from .jobs import cascade_plan
+
+    labels = SHARDED_MODELS if partition_for(project_id) is not None else SHARDED_MODELS | PARTITIONED_MODELS
+    return [(model, lookups) for model, lookups in cascade_plan(CustomProject) if model._meta.label_lower in labels]
+
+
+def project_ids(model, lookups, project_id, alias):
+    ids = set()
+    for lookup in lookups:
+        ids.update(model._base_manager.using(alias).filter(**{lookup: project_id}).values_list('pk', flat=True))
+    return ids
+
+
+def catch_up(project_id, source, target, since):
+    """
+    Apply to the target the writes made on the source since the copy started.
+    Rows missing from the source are deleted from the target, children first; rows
+    journaled as created or updated since ``since`` and the rows of the other models
+    (webhooks, history) are then upserted, parents first.
+    """
+    plan = moved_plan(project_id)
+    for model, lookups in plan:
+        missing = project_ids(model, lookups, project_id, target) - project_ids(model, lookups, project_id, source)
+        if missing:
+            model._base_manager.filter(pk__in=missing)._raw_delete(target)
+
+    journaled = {name: model for model, name in SYNCED_MODELS.items()}
+    changed = {}
+    for name, object_id in (Change.objects.filter(project_id=project_id, id__gt=since, operation__in=['CREATE', 'UPDATE'])
+                            .values_list('model', 'object_id')):
+        changed.setdefault(journaled[name], set()).add(object_id)
+
+    for model, lookups in reversed(plan):
+        if model in changed:
+            rows = model._base_manager.using(source).filter(pk__in=changed[model])
+        else:
+            rows = model._base_manager.using(source).filter(pk__in=project_ids(model, lookups, project_id, source))
+        # By ID, so replies are copied after the comments they answer.
+        for row in rows.order_by('pk'):
+            copy_instance(row, target)
+
+
+def delete_rows(plan, project_id, alias, batch_size):
+    """Delete the rows of a project from a database in batches, children first."""
+    from .jobs import deletion_order
+
+    for model, lookups in plan:
+        for lookup in lookups:
+            queryset = model._base_manager.using(alias).filter(**{lookup: project_id}).order_by(deletion_order(model))
+            while True:
+                ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                model._base_manager.filter(pk__in=ids)._raw_delete(alias)
+
+
+def move_project(project_id, target, batch_size=500, stdout=None):
+    """
+    Move a project and its data to another shard while it keeps being served.
+    The rows are copied while writes go on, then writes to the project are refused
+    for the time it takes to copy what changed meanwhile, the shard map is switched
+    and the rows left on the old shard are deleted. Each step waits ``SHARD_MAP_TTL``
+    seconds, so every process sees the new state of the shard map before the next.
+    Args:
+        project_id (int): The project to move.
+        target (str): The destination shard, one of ``SHARDS``.
+        batch_size (int): Rows copied or deleted per query.
+        stdout: Optional stream receiving progress lines.
+    Raises:
+        ProjectShard.DoesNotExist: If the project is not in the shard map.
+        ValueError: If the move is not possible.
+    """
+    entry = ProjectShard.objects.get(pk=project_id)
+    source = entry.database
+    if target not in settings.SHARDS:
+        raise ValueError(f"'{target}' is not listed in SHARDS.")
+    if target == source:
+        raise ValueError(f"Project {project_id} is already on '{target}'.")
+    if CustomProject.all_objects.using(source).filter(pk=project_id, deleted_time__isnull=False).exists():
+        raise ValueError(f"Project {project_id} is being deleted.")
+    check_id_blocks(source, target)
+    if target != DEFAULT_DB_ALIAS:
+        reserve_id_block(target)
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    since = Change.objects.aggregate(seq=Max('id'))['seq'] or 0
+    copy_rows(CustomUser, CustomUser._base_manager.using(DEFAULT_DB_ALIAS).all(), target, batch_size)
+    plan = moved_plan(project_id)
+    # Leftovers of an interrupted move would not be refreshed by the copy.
+    delete_rows(plan, project_id, target, batch_size)
+    for model, lookups in reversed(plan):
+        copied = sum(copy_rows(model, model._base_manager.using(source).filter(**{lookup: project_id}), target,
+                               batch_size) for lookup in lookups)
+        log(f"{model._meta.label_lower}: {copied} row(s) copied to {target}.")
+
+    ProjectShard.objects.filter(pk=project_id).update(moving=True)
+    forget_placement(project_id)
+    time.sleep(settings.SHARD_MAP_TTL)
+    try:
+        catch_up(project_id, source, target, since)
+    except Exception:
+        # Writes resume on the old shard; the copies are dropped by the next attempt.
+        ProjectShard.objects.filter(pk=project_id).update(moving=False)
+        forget_placement(project_id)
+        raise
+    ProjectShard.objects.filter(pk=project_id).update(moving=False, database=target)
+    forget_placement(project_id)
+    log(f"Project {project_id} is now served by {target}.")
+    time.sleep(settings.SHARD_MAP_TTL)
+
+    delete_rows(plan, project_id, source, batch_size)
+    log(f"Project {project_id} removed from {source}.")
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Subquery
+from django.db.models.signals import post_delete, post_save
+
+from .events import get_broker
+from .models import Change, Comment, Contributor, CustomProject, Issue
+from .routers import current_project, is_mirror
+
+# Name under which each synced model appears in the change journal.
+SYNCED_MODELS = {
+    CustomProject: 'project',
+    Contributor: 'contributor',
+    Issue: 'issue',
+    Comment: 'comment',
+}
+
+# Models whose changes are pushed to the event streams of their project.
+STREAMED_MODELS = (Contributor, Issue, Comment)
+
+
+def get_project_id(instance):
+    """
+    Return the ID of the project a synced instance belongs to.
+    For comments, the project is read through the issue when it is already loaded,
+    or taken from the project being served. Otherwise, on the default database, a
+    subquery is returned so the lookup happens inside the journal insert instead of
+    costing an extra query (comments deleted by a cascade come without their issue);
+    comments of another shard or partition are looked up there.
+    Args:
+        instance: A CustomProject, Contributor, Issue or Comment instance.
+    Returns:
+        int or Subquery: The project ID, or a subquery resolving to it.
+    """
+    if isinstance(instance, CustomProject):
+        return instance.pk
+    if isinstance(instance, Comment):
+        if Comment.issue.is_cached(instance):
+            return instance.issue.project_id
+        if current_project.get() is not None:
+            return current_project.get()
+        if instance._state.db not in (None, DEFAULT_DB_ALIAS):
+            return Issue._base_manager.using(instance._state.db).filter(pk=instance.issue_id).values_list(
+                'project_id', flat=True).first()
+        return Subquery(Issue.objects.filter(pk=instance.issue_id).values('project_id')[:1])
+    return instance.project_id
+
+
+def record_change(instance, operation):
+    """
+    Append a change of a synced instance to the journal.
+
+    Args:
+        instance: The created, updated or deleted instance.
+        operation (str): 'CREATE', 'UPDATE' or 'DELETE'.
+    Returns:
+        Change: The recorded change.
+    """
+    return Change.objects.create(
+        project_id=get_project_id(instance),
+        model=SYNCED_MODELS[type(instance)],
+        object_id=instance.pk,
+        user_id=instance.user_id if isinstance(instance, Contributor) else None,
+        operation=operation,
+    )
+
+
+def record_changes(instances, operation):
+    """
+    Append the changes of several synced instances to the journal with one insert.
+    Used by the bulk endpoints, whose inserts and deletions send no signals.
+    Args:
+        instances (list): The created, updated or deleted instances.
+        operation (str): 'CREATE', 'UPDATE' or 'DELETE'.
+    Returns:
+        list: The recorded changes.
+    """
+    return Change.objects.bulk_create([
+        Change(
+            project_id=get_project_id(instance),
+            model=SYNCED_MODELS[type(instance)],
+            object_id=instance.pk,
+            user_id=instance.user_id if isinstance(instance, Contributor) else None,
+            operation=operation,
+        )
+        for instance in instances
+    ])
+
+
+def publish_change(change):
+    """
+    Publish a recorded change to the project's event streams once the transaction commits.
+    Events only carry identifiers; the sequence number lets clients resume through the
+    sync feed.
+    """
+    if not isinstance(change.project_id, int):
+        change.refresh_from_db(fields=['project_id'])
+    event = {
+        "seq": change.id,
+        "model": change.model,
+        "id": change.object_id,
+        "project": change.project_id,
+        "user": change.user_id,
+        "operation": change.operation,
+    }
+    transaction.on_commit(lambda: get_broker().publish(event["project"], event))
+
+
+def journal_save(sender, instance, created, raw=False, **kwargs):
+    if not raw and not is_mirror(instance):
+        change = record_change(instance, 'CREATE' if created else 'UPDATE')
+        if sender in STREAMED_MODELS:
+            publish_change(change)
+
+
+def journal_delete(sender, instance, origin=None, **kwargs):
+    if is_mirror(instance):
+        # Only the original row is journaled; its copies in the partitions are not.
+        return
+    change = record_change(instance, 'DELETE')
+    # Rows removed by a cascade are implied by the event of the deleted parent.
+    if sender in STREAMED_MODELS and (origin is None or origin is instance):
+        publish_change(change)
+
+
+def workload_delete(sender, instance, **kwargs):
+    # Active issues deleted with their contributor or author leave their assignee's workload;
+    # soft-deleted ones already left it.
+    if instance.deleted_time is None and instance.archived_time is None:
+        from projects import workload
+        workload.issue_removed(instance)
+
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Apply the ``SQLITE_PRAGMAS`` setting to each new SQLite connection.
+    They run on the DB-API connection, below the execute wrappers: opening a connection
+    does not count in the query budget of the request it serves.
+    """
+    if connection.vendor == 'sqlite':
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+for synced_model in SYNCED_MODELS:
+    post_save.connect(journal_save, sender=synced_model, dispatch_uid=f'journal_save_{synced_model.__name__}')
+    post_delete.connect(journal_delete, sender=synced_model, dispatch_uid=f'journal_delete_{synced_model.__name__}')
+post_delete.connect(workload_delete, sender=Issue, dispatch_uid='workload_delete')
+connection_created.connect(set_sqlite_pragmas, dispatch_uid='set_sqlite_pragmas')
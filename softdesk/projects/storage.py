@@ -0,0 +1,147 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Upload:
+    """
+    A file being written to an attachment storage, hashed as its chunks arrive.
+    Storages return one from ``begin``; ``finish`` stores the content under its
+    SHA-256 digest, ``abort`` drops it.
+    """
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk):
+        self.hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        """
+        Store the written content, unless the storage already holds it.
+        Returns:
+            str: The SHA-256 hex digest of the content.
+        """
+        raise NotImplementedError
+
+    def abort(self):
+        raise NotImplementedError
+
+
+class AttachmentStorage:
+    """
+    Content-addressed storage of the attachment files, configured by ``ATTACHMENT_STORAGE``.
+    Contents are written once per SHA-256 digest, so identical files share their storage,
+    and are never modified. Object storage backends implement the same methods; they
+    return None from ``local_path`` and a seekable stream from ``open``.
+    """
+
+    def begin(self):
+        """Start writing a new file and return the Upload receiving its chunks."""
+        raise NotImplementedError
+
+    def open(self, digest):
+        """Return a binary file object reading the content with the given digest."""
+        raise NotImplementedError
+
+    def local_path(self, digest):
+        """Return the path of the content on the local disk, or None if it is stored remotely."""
+        return None
+
+    def digests(self):
+        """Iterate over the digests of every stored content."""
+        raise NotImplementedError
+
+    def stored_time(self, digest):
+        """Return when the content was last stored, as an aware datetime; uploading it again refreshes it."""
+        raise NotImplementedError
+
+    def delete(self, digest):
+        raise NotImplementedError
+
+
+class FileUpload(Upload):
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.file = tempfile.NamedTemporaryFile(dir=storage.temp_dir, delete=False)
+
+    def write(self, chunk):
+        super().write(chunk)
+        self.file.write(chunk)
+
+    def finish(self):
+        self.file.close()
+        digest = self.hash.hexdigest()
+        path = self.storage.path(digest)
+        if path.exists():
+            os.remove(self.file.name)
+            # Reused content is as recent as the upload, so pruning spares it until its row exists.
+            os.utime(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Atomic: concurrent uploads of the same content leave one complete file.
+            os.replace(self.file.name, path)
+        return digest
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+class FileSystemStorage(AttachmentStorage):
+    """
+    Attachment storage on the local disk, under ``ATTACHMENT_ROOT``.
+    A content lives at ``<root>/<2 first hex digits>/<digest>``; uploads are written to
+    ``<root>/tmp`` first and moved in place once their digest is known.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.ATTACHMENT_ROOT)
+        self.temp_dir = self.root / 'tmp'
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest):
+        return self.root / digest[:2] / digest
+
+    def begin(self):
+        return FileUpload(self)
+
+    def open(self, digest):
+        return open(self.path(digest), 'rb')
+
+    def local_path(self, digest):
+        return str(self.path(digest))
+
+    def digests(self):
+        for directory in self.root.iterdir():
+            if directory.is_dir() and directory != self.temp_dir:
+                for path in directory.iterdir():
+                    yield path.name
+
+    def stored_time(self, digest):
+        return datetime.fromtimestamp(os.stat(self.path(digest)).st_mtime, timezone.utc)
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    """Return the process-wide attachment storage configured by the ``ATTACHMENT_STORAGE`` setting."""
+    return import_string(settings.ATTACHMENT_STORAGE)()
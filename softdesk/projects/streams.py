@@ -0,0 +1,171 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+
+from .events import RESET, get_broker
+from .models import Contributor
+from .routers import shard_for
+
+WEBSOCKET_PATH = re.compile(r'^/ws/projects/(?P<project_id>\d+)/events/$')
+
+
+@sync_to_async
+def get_stream_user(raw_token, project_id):
+    """
+    Authenticate a stream from its JWT and check that the user contributes to the project.
+    Browsers cannot set headers on EventSource and WebSocket connections, so the token
+    may come from the ``token`` query parameter as well as the Authorization header.
+    Args:
+        raw_token (str): The access token, or None.
+        project_id (int): The project whose events are requested.
+    Returns:
+        tuple: (user, status) where user is None and status is 401 or 403 on failure.
+    """
+    if not raw_token:
+        return None, 401
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None, 401
+    if not Contributor.objects.using(shard_for(project_id)).filter(project_id=project_id, user=user).exists():
+        return None, 403
+    return user, 200
+
+
+def is_terminal(event, user):
+    """Whether an event ends the streams of a user: the deletion of the project or of their own membership."""
+    if not event or event is RESET or event['operation'] != 'DELETE':
+        return False
+    return event['model'] == 'project' or (event['model'] == 'contributor' and event['user'] == user.pk)
+
+
+async def iter_events(user, project_id):
+    """
+    Yield the events of a project as they are published, until the stream ends.
+    None is yielded whenever ``EVENTS_HEARTBEAT`` seconds pass without an event, so
+    the transport can keep the idle connection alive. The iteration stops after the
+    RESET marker when the subscriber fell behind, once the user's own membership of
+    the project is deleted, or after the tombstone of the project itself: deleted or
+    archived, it publishes nothing more, and the rows purged or archived with it in
+    the background are implied by it.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(project_id)
+    try:
+        while True:
+            event = await subscription.next_event(settings.EVENTS_HEARTBEAT)
+            yield event
+            if event is RESET:
+                return
+            if is_terminal(event, user):
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def sse_stream(user, project_id):
+    yield 'retry: 5000\n\n'
+    async for event in iter_events(user, project_id):
+        if event is None:
+            yield ': heartbeat\n\n'
+        elif event is RESET:
+            yield 'event: reset\ndata: {}\n\n'
+        else:
+            yield f'id: {event["seq"]}\nevent: {event["model"]}\ndata: {json.dumps(event)}\n\n'
+
+
+async def project_events(request, project_id):
+    """
+    Stream the issue, comment and contributor changes of a project as server-sent events.
+    Each event carries the change sequence number as its id and only identifies the
+    changed row; clients fetch the data they need, or catch up with
+    ``/sync/?since=...`` after a ``reset`` event. A comment line is sent as heartbeat.
+    The stream ends after the ``project`` tombstone, sent when the project is deleted
+    or archived, and after the tombstone of the user's own membership.
+    Only served by the ASGI application: a WSGI worker would hold a thread per client.
+    Args:
+        request: The HTTP request object.
+        project_id (int): ID of the project to follow.
+    Returns:
+        StreamingHttpResponse: The ``text/event-stream`` response, or a JSON error with
+                              status 401, 403 or 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event streams are only served by the ASGI application."}, status=501)
+
+    header = request.headers.get('Authorization', '')
+    raw_token = header[7:] if header.startswith('Bearer ') else request.GET.get('token')
+    user, status_code = await get_stream_user(raw_token, project_id)
+    if user is None:
+        return JsonResponse({"error": "Authentication failed." if status_code == 401 else "Forbidden."}, status=status_code)
+
+    response = StreamingHttpResponse(sse_stream(user, project_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI application streaming the same project events over WebSocket.
+    Clients connect to ``/ws/projects/<project_id>/events/?token=<access token>`` and
+    receive one JSON text message per event, ``{"type": "heartbeat"}`` when idle and
+    ``{"type": "reset"}`` before the server closes a connection that fell behind. The
+    connection is closed (code 1000) after the tombstone of the project or of the
+    user's membership.
+    """
+    match = WEBSOCKET_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    project_id = int(match['project_id'])
+    raw_token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    user, status_code = await get_stream_user(raw_token, project_id)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4000 + status_code})
+        return
+    await send({'type': 'websocket.accept'})
+
+    events = iter_events(user, project_id)
+    next_event = asyncio.ensure_future(anext(events))
+    next_message = asyncio.ensure_future(receive())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event, next_message}, return_when=asyncio.FIRST_COMPLETED)
+            if next_message in done:
+                if next_message.result()['type'] == 'websocket.disconnect':
+                    return
+                next_message = asyncio.ensure_future(receive())
+            if next_event in done:
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    await send({'type': 'websocket.close', 'code': 1000})
+                    return
+                if event is None:
+                    payload = {"type": "heartbeat"}
+                elif event is RESET:
+                    payload = {"type": "reset"}
+                else:
+                    payload = {"type": "change", **event}
+                await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+                next_event = asyncio.ensure_future(anext(events))
+    finally:
+        next_event.cancel()
+        next_message.cancel()
+        await asyncio.gather(next_event, next_message, return_exceptions=True)
+        await events.aclose()
@@ -1,3 +1,1820 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import UUID
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, close_old_connections, connection
+from django.test import SimpleTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from projects import outbox, partitions, shards, webhooks, workload
+from projects.events import RESET, get_broker
+from projects.fields import excerpt
+from projects.models import (ArchivedRow, Attachment, Change, Comment, Contributor, CustomProject, Issue, IssueChange, Job,
+                             OutboxMessage, ProjectShard, Webhook, WebhookDeadLetter, Workload)
+from projects.permissions import Membership, ROLE_PERMISSIONS, can, get_membership
+from projects.routers import ProjectMoving, ProjectRouter, database_for, forget_placement, placement, use_project
+from projects.storage import get_storage
+from projects.streams import iter_events, websocket_application
+from projects.views import ProjectIssueAPIView
+from softdesk import asgi
+from softdesk.budgets import QueryCounter, current_counter, get_query_budget
+from softdesk.testing import BudgetedAPITestCase, BudgetedAPITransactionTestCase, create_user
+from softdesk.warmup import sample_urls, warm_up
+
+
+class ProjectQueryBudgetTests(BudgetedAPITestCase):
+    """The project endpoints stay within their query budget whatever the size of the project."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.project, user=cls.owner)
+        cls.issue = cls.create_issue()
+
+    @classmethod
+    def create_issue(cls, name='Issue'):
+        return Issue.objects.create(name=name, description='Description', type='BUG', user=cls.contributor,
+                                    author=cls.contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def grow(self, size):
+        """Add ``size`` contributors, issues and comments to the project."""
+        start = Contributor.objects.count()
+        for number in range(start, start + size):
+            Contributor.objects.create(user=create_user(f'member{number}'), project=self.project, role='MEMBER')
+            self.create_issue(f'Issue {number}')
+            Comment.objects.create(description='Comment', issue=self.issue, author=self.owner)
+
+    def issue_data(self, **fields):
+        return {'name': 'Issue', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW', 'type': 'BUG',
+                'user': self.contributor.pk, **fields}
+
+    def test_reads_within_budget_at_any_size(self):
+        project_id, issue_id = self.project.pk, self.issue.pk
+        urls = [
+            reverse('project-list'),
+            reverse('project-detail', args=[project_id]),
+            reverse('project-contributors', args=[project_id]),
+            reverse('list_create_issues', args=[project_id]),
+            reverse('issue', args=[project_id, issue_id]),
+            reverse('issue-history', args=[project_id, issue_id]),
+            reverse('issue-stats', args=[project_id]),
+            reverse('comment-list-create', args=[project_id, issue_id]),
+            reverse('comment-list-create', args=[project_id, issue_id]) + '?threads=true',
+            reverse('issue-attachments', args=[project_id, issue_id]),
+            reverse('project-webhooks', args=[project_id]),
+            reverse('sync'),
+            reverse('notifications'),
+        ]
+        for size in (1, 20):
+            self.grow(size)
+            for url in urls:
+                with self.subTest(url=url, size=size):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertWithinQueryBudget(response)
+
+    def test_writes_within_budget(self):
+        response = self.client.post(reverse('project-list'), {'name': 'Other', 'description': 'Other',
+                                                              'type': 'BACKEND'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+
+        response = self.client.put(reverse('project-detail', args=[self.project.pk]),
+                                   {'name': 'Renamed', 'description': 'Issue tracker', 'type': 'BACKEND'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+        response = self.client.post(reverse('list_create_issues', args=[self.project.pk]), self.issue_data(),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        issue_url = reverse('issue', args=[self.project.pk, response.data['id']])
+
+        response = self.client.put(issue_url, self.issue_data(status='IN_PROGRESS'), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+        response = self.client.post(reverse('comment-list-create', args=[self.project.pk, self.issue.pk]),
+                                    {'description': 'Comment'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+
+        response = self.client.delete(issue_url)
+        self.assertEqual(response.status_code, 202)
+        self.assertWithinQueryBudget(response)
+
+    def test_exceeded_budget_is_logged_with_stacks(self):
+        with mock.patch.object(ProjectIssueAPIView.get, 'query_budget', 1), \
+                self.assertLogs('softdesk.budgets', 'WARNING') as logs:
+            response = self.client.get(reverse('list_create_issues', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.query_counter.exceeded)
+        self.assertIn('Query budget exceeded', logs.output[0])
+        self.assertIn('projects/views.py', logs.output[0])
+
+    def test_issues_of_archived_project_not_found(self):
+        issue_url = reverse('issue', args=[self.project.pk, self.issue.pk])
+        calls = [
+            ('get', reverse('list_create_issues', args=[self.project.pk]), None),
+            ('get', issue_url, None),
+            ('put', issue_url, self.issue_data(name='Renamed')),
+            ('delete', issue_url, None),
+            ('get', reverse('issue-history', args=[self.project.pk, self.issue.pk]), None),
+            ('get', reverse('issue-attachments', args=[self.project.pk, self.issue.pk]), None),
+            ('get', reverse('comment-list-create', args=[self.project.pk, self.issue.pk]) + '?threads=true', None),
+        ]
+        # Deleted projects stay hidden until their purge job is done, archived ones until restored.
+        for field in ('deleted_time', 'archived_time'):
+            CustomProject.all_objects.filter(pk=self.project.pk).update(**{field: timezone.now()})
+            for method, url, data in calls:
+                with self.subTest(field=field, method=method, url=url):
+                    response = getattr(self.client, method)(url, data, format='json')
+                    self.assertEqual(response.status_code, 404)
+            CustomProject.all_objects.filter(pk=self.project.pk).update(**{field: None})
+        issue = Issue.objects.get(pk=self.issue.pk)
+        self.assertEqual((issue.name, issue.deleted_time), ('Issue', None))
+
+    def test_issues_of_other_project_forbidden(self):
+        self.authenticate(create_user('outsider'))
+        response = self.client.get(reverse('list_create_issues', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class BatchTests(BudgetedAPITestCase):
+    """Batches run their sub-requests through the middleware as the batch user, in one transaction by default."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.project, user=cls.owner)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def batch(self, data):
+        return self.client.post(reverse('batch'), data, format='json')
+
+    def issue_request(self, **fields):
+        return {'id': 'create', 'method': 'POST', 'path': reverse('list_create_issues', args=[self.project.pk]),
+                'body': {'name': 'Issue', 'description': 'Description', 'type': 'BUG', 'user': self.contributor.pk,
+                         **fields}}
+
+    def test_sub_requests_answered_in_order(self):
+        response = self.batch({'requests': [
+            self.issue_request(),
+            {'id': 'list', 'path': reverse('list_create_issues', args=[self.project.pk])},
+            {'id': 'missing', 'path': '/nowhere/'},
+        ], 'atomic': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(result['id'], result['status']) for result in response.data],
+                         [('create', 201), ('list', 200), ('missing', 404)])
+        self.assertEqual([issue['name'] for issue in response.data[1]['body']], ['Issue'])
+
+    def test_failure_rolls_back_atomic_batch(self):
+        response = self.batch({'requests': [self.issue_request(), self.issue_request(type='UNKNOWN'),
+                                            self.issue_request()]})
+        self.assertEqual([result['status'] for result in response.data], [201, 400, 424])
+        self.assertFalse(Issue.objects.filter(project=self.project).exists())
+
+    def test_sub_requests_go_through_middleware(self):
+        path = reverse('list_create_issues', args=[self.project.pk])
+        with mock.patch.object(ProjectIssueAPIView.get, 'query_budget', 1), \
+                self.assertLogs('softdesk.budgets', 'WARNING') as logs:
+            response = self.batch({'requests': [{'path': path}]})
+        self.assertEqual(response.data[0]['status'], 200)
+        self.assertIn(f'GET {path}', logs.output[0])
+
+    def test_sub_requests_need_authenticated_batch(self):
+        self.client.credentials()
+        response = self.batch({'requests': [{'path': reverse('project-list')}]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_malformed_batch_rejected(self):
+        for data in ([{'path': '/projects/'}], {'requests': [{'path': '/projects/', 'method': 1}]},
+                     {'requests': []}, {'requests': [{'method': 'GET'}]}):
+            with self.subTest(data=data):
+                self.assertEqual(self.batch(data).status_code, 400)
+
+
+class ParallelBatchTests(BudgetedAPITransactionTestCase):
+    """Read-only batches can run their sub-requests on several threads, and worker threads count in query budgets."""
+
+    def test_parallel_reads(self):
+        owner = create_user('owner')
+        project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', owner)
+        self.authenticate(owner)
+        paths = [reverse('project-detail', args=[project.pk]), reverse('project-contributors', args=[project.pk])]
+        # The connections opened by the threads do not count their session settings.
+        with self.assertNoLogs('softdesk.budgets', 'WARNING'):
+            response = self.client.post(reverse('batch'), {'requests': [{'path': path} for path in paths],
+                                                           'parallel': True}, format='json')
+        self.assertEqual([result['status'] for result in response.data], [200, 200])
+        self.assertEqual(response.data[0]['body']['name'], 'Softdesk')
+        self.assertEqual(response.data[1]['body'][0]['user'], owner.pk)
+
+
+    def test_fan_out_counted(self):
+        owner = create_user('owner')
+        CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', owner)
+        counter = QueryCounter(1)
+        counter.start()
+        try:
+            self.assertIs(current_counter.get(), counter)
+            counts = shards.fan_out(lambda alias: CustomProject.objects.using(alias).count(), ['default', 'default'])
+        finally:
+            counter.stop()
+        self.assertEqual(counts, [1, 1])
+        self.assertEqual((counter.count, len(counter.offenders)), (2, 1))
+        self.assertIsNone(current_counter.get())
+        # Handlers reading every shard get a budget growing with them.
+        view = resolve(reverse('project-list')).func
+        self.assertEqual(get_query_budget(view, 'GET'), 3)
+        with override_settings(SHARDS=['default', 'east', 'west']):
+            self.assertEqual(get_query_budget(view, 'GET'), 5)
+
+
+class SyncTests(BudgetedAPITestCase):
+    """The sync feed pages through the journal with its tokens and announces deletions with tombstones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.member = create_user('member')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.project, user=cls.owner)
+        Contributor.objects.create(user=cls.member, project=cls.project, role='MEMBER')
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=cls.contributor,
+                                         author=cls.contributor, project=cls.project)
+        cls.comment = Comment.objects.create(description='Comment', issue=cls.issue, author=cls.owner)
+
+    def sync(self, since=None, limit=None):
+        params = {key: value for key, value in (('since', since), ('limit', limit)) if value is not None}
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        return response.data
+
+    def sync_all(self, since=None):
+        """Read the feed page by page from ``since``, and return its changes and the last token."""
+        changes = []
+        while True:
+            page = self.sync(since, limit=2)
+            changes.extend(page['changes'])
+            since = page['next']
+            if not page['has_more']:
+                return changes, since
+
+    def test_token_round_trip(self):
+        self.authenticate(self.owner)
+        changes, token = self.sync_all()
+        self.assertEqual([(change['model'], change['operation']) for change in changes], [
+            ('project', 'CREATE'), ('contributor', 'CREATE'), ('contributor', 'CREATE'), ('issue', 'CREATE'),
+            ('comment', 'CREATE'),
+        ])
+        self.assertEqual([change['seq'] for change in changes], sorted(change['seq'] for change in changes))
+        self.assertEqual(changes[3]['data']['name'], 'Issue')
+
+        page = self.sync(token)
+        self.assertEqual((page['changes'], page['next'], page['has_more']), ([], token, False))
+
+        self.issue.name = 'Renamed'
+        self.issue.save()
+        self.issue.name = 'Renamed again'
+        self.issue.save()
+        page = self.sync(token)
+        # Both updates collapse into the latest state of the row.
+        self.assertEqual([(change['model'], change['id'], change['operation']) for change in page['changes']],
+                         [('issue', self.issue.pk, 'UPDATE')])
+        self.assertEqual(page['changes'][0]['data']['name'], 'Renamed again')
+
+    def test_deleted_comment_tombstone(self):
+        self.authenticate(self.owner)
+        _, token = self.sync_all()
+        response = self.client.delete(reverse('comment-detail', args=[self.project.pk, self.issue.pk,
+                                                                      self.comment.uuid]))
+        self.assertEqual(response.status_code, 204)
+        page = self.sync(token)
+        self.assertEqual([(change['model'], change['id'], change['operation'], change['data'])
+                          for change in page['changes']], [('comment', self.comment.pk, 'DELETE', None)])
+
+    def test_removed_contributor_gets_own_tombstone(self):
+        self.authenticate(self.member)
+        _, token = self.sync_all()
+        self.authenticate(self.owner)
+        response = self.client.delete(reverse('project-contributor', args=[self.project.pk, self.member.pk]))
+        self.assertEqual(response.status_code, 204)
+        Issue.objects.create(name='Later', description='Description', type='BUG', user=self.contributor,
+                             author=self.contributor, project=self.project)
+
+        self.authenticate(self.member)
+        changes, _ = self.sync_all(token)
+        self.assertEqual([(change['model'], change['operation'], change['data']) for change in changes],
+                         [('contributor', 'DELETE', None)])
+
+    def test_invalid_token_rejected(self):
+        self.authenticate(self.owner)
+        for since in ('garbage', 'djI6MQ==', 'djE6eA=='):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get(reverse('sync'), {'since': since}).status_code, 400)
+
+
+class EventLoopThread:
+    """An event loop running on its own thread, like the loop of an ASGI worker serving streams."""
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def run(self, coroutine, timeout=5):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+@override_settings(EVENTS_BROKER='projects.events.LocalBroker', EVENTS_HEARTBEAT=0.05, EVENTS_QUEUE_SIZE=2)
+class EventStreamTests(BudgetedAPITestCase):
+    """Project changes reach the streams of the project through the local broker, until the project goes away."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.project, user=cls.owner)
+
+    def setUp(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        self.authenticate(self.owner)
+        self.loop = self.enterContext(EventLoopThread())
+
+    def follow(self):
+        """Start following the project's events; return a function collecting them until the stream ends."""
+        events = iter_events(self.owner, self.project.pk)
+        first = self.loop.run(asyncio.wait_for(anext(events), 1))
+        self.assertIsNone(first)  # Heartbeat: the stream is subscribed.
+
+        def collect():
+            async def read():
+                return [event async for event in events if event is not None]
+            return self.loop.run(read())
+        return collect
+
+    def test_changes_published_until_project_deleted(self):
+        collect = self.follow()
+        with self.captureOnCommitCallbacks(execute=True):
+            issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=self.contributor,
+                                         author=self.contributor, project=self.project)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('project-detail', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 202)
+        events = collect()
+        self.assertEqual([(event['model'], event['id'], event['operation']) for event in events],
+                         [('issue', issue.pk, 'CREATE'), ('project', self.project.pk, 'DELETE')])
+        self.assertEqual(get_broker().subscriptions, {})
+
+    def test_archived_project_ends_streams(self):
+        collect = self.follow()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('project-archive', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([(event['model'], event['operation']) for event in collect()], [('project', 'DELETE')])
+
+    def test_slow_subscriber_reset(self):
+        collect = self.follow()
+        for seq in range(3):
+            get_broker().publish(self.project.pk, {'seq': seq, 'model': 'issue', 'id': seq, 'project': self.project.pk,
+                                                   'user': None, 'operation': 'UPDATE'})
+        self.assertEqual(collect(), [RESET])
+
+    def test_websocket_closed_after_project_tombstone(self):
+        messages = asyncio.Queue()
+        sent = []
+
+        async def receive():
+            return await messages.get()
+
+        async def send(message):
+            sent.append(message)
+
+        async def connect():
+            await messages.put({'type': 'websocket.connect'})
+            await websocket_application({'type': 'websocket', 'path': f'/ws/projects/{self.project.pk}/events/',
+                                         'query_string': b'token=x'}, receive, send)
+
+        # The token check reads the database from another thread, outside the test transaction.
+        with mock.patch('projects.streams.get_stream_user', mock.AsyncMock(return_value=(self.owner, 200))):
+            connection = asyncio.run_coroutine_threadsafe(connect(), self.loop.loop)
+            while not get_broker().subscriptions:
+                time.sleep(0.01)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(reverse('project-detail', args=[self.project.pk]))
+            connection.result(5)
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        payloads = [json.loads(message['text']) for message in sent if message['type'] == 'websocket.send']
+        self.assertEqual([payload['type'] for payload in payloads if payload['type'] != 'heartbeat'], ['change'])
+        self.assertEqual(sent[-1], {'type': 'websocket.close', 'code': 1000})
+
+    def test_websocket_refused_to_outsiders(self):
+        sent = []
+
+        async def connect():
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+            await websocket_application({'type': 'websocket', 'path': f'/ws/projects/{self.project.pk}/events/',
+                                         'query_string': b'token=x'}, receive, send)
+
+        with mock.patch('projects.streams.get_stream_user', mock.AsyncMock(return_value=(None, 403))):
+            self.loop.run(connect())
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4403}])
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_BACKOFF=5, OUTBOX_LEASE=300)
+class OutboxTests(BudgetedAPITestCase):
+    """Outbox messages are retried with backoff until they succeed or run out of attempts."""
+
+    def setUp(self):
+        self.calls = []
+        handlers = mock.patch.dict(outbox.HANDLERS, {'test': self.handler})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        self.failures = 0
+
+    def handler(self, payload, idempotency_key):
+        self.calls.append(idempotency_key)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('Unavailable')
+
+    def make_ready(self, message):
+        OutboxMessage.objects.filter(pk=message.pk).update(available_time=timezone.now())
+
+    def test_failure_retried_with_backoff(self):
+        outbox.enqueue('test', {}, 'key')
+        outbox.enqueue('test', {}, 'key')  # Enqueuing the same key again is a no-op.
+        self.failures = 1
+        self.assertEqual(outbox.drain(concurrency=1), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts, message.last_error),
+                         ('PENDING', 1, "RuntimeError('Unavailable')"))
+        self.assertGreater(message.available_time, timezone.now())
+        self.assertEqual(outbox.drain(concurrency=1), (0, 0))  # Not ready before its backoff.
+
+        self.make_ready(message)
+        self.assertEqual(outbox.drain(concurrency=1), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.last_error), ('DONE', ''))
+        self.assertEqual(self.calls, ['key', 'key'])
+
+    def test_failed_after_max_attempts(self):
+        outbox.enqueue('test', {}, 'key')
+        self.failures = 10
+        for _ in range(3):
+            outbox.drain(concurrency=1)
+            self.make_ready(OutboxMessage.objects.get())
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('FAILED', 3))
+        self.assertEqual(outbox.drain(concurrency=1), (0, 0))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_expired_lease_counts_as_attempt(self):
+        outbox.enqueue('test', {}, 'key')
+        # Workers claiming the message, then dying before recording any outcome.
+        for attempts in range(3):
+            claimed = outbox.claim(10)
+            self.assertEqual([message.attempts for message in claimed], [attempts])
+            self.make_ready(claimed[0])
+        self.assertEqual(outbox.claim(10), [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts, message.last_error),
+                         ('FAILED', 3, 'Processing lease expired.'))
+
+    def test_late_worker_outcome_ignored(self):
+        outbox.enqueue('test', {}, 'key')
+        stale = outbox.claim(10)[0]
+        self.make_ready(stale)
+        current = outbox.claim(10)[0]
+        outbox.process(stale)
+        self.assertEqual(OutboxMessage.objects.get().status, 'PROCESSING')
+        outbox.process(current)
+        self.assertEqual(OutboxMessage.objects.get().status, 'DONE')
+
+
+@override_settings(JOB_BATCH_SIZE=2, JOB_PAUSE=0)
+class JobTests(BudgetedAPITestCase):
+    """Project deletion and archiving run as outbox jobs, and sync clients learn about them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.member = create_user('member')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(user=cls.owner)
+        cls.membership = Contributor.objects.create(user=cls.member, project=cls.project, role='MEMBER')
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=cls.contributor,
+                                         author=cls.contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+        # A thread three comments deep, and a second top-level comment.
+        parent = None
+        for depth in range(3):
+            parent = self.comment(f'Reply {depth}', parent)
+        self.comment('Other')
+        outbox.drain(concurrency=1)  # The comment notifications.
+
+    def comment(self, description, parent=None):
+        response = self.client.post(reverse('comment-list-create', args=[self.project.pk, self.issue.pk]),
+                                    {'description': description, 'parent': parent}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def sync(self, user, since=None):
+        self.authenticate(user)
+        response = self.client.get(reverse('sync'), {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def run_jobs(self):
+        self.assertEqual(outbox.drain(concurrency=1), (1, 0))
+
+    def threads(self):
+        return list(Comment.objects.order_by('path').values_list('description', 'depth', 'parent__description'))
+
+    def test_purge(self):
+        since = self.sync(self.member)['next']
+        self.authenticate(self.owner)
+        job = self.client.delete(reverse('project-detail', args=[self.project.pk])).data
+        self.run_jobs()
+
+        self.assertEqual(self.client.get(reverse('job', args=[job['id']])).data['status'], 'DONE')
+        self.assertFalse(CustomProject.all_objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(Contributor.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        # The member no longer contributes to the project: the tombstone of their
+        # membership, journaled with the deletion, is what tells them.
+        changes = self.sync(self.member, since)['changes']
+        self.assertIn(('contributor', self.membership.pk, 'DELETE'),
+                      [(change['model'], change['id'], change['operation']) for change in changes])
+
+    def test_archive_and_restore(self):
+        threads = self.threads()
+        since = self.sync(self.member)['next']
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.post(reverse('project-archive', args=[self.project.pk])).status_code, 202)
+        self.run_jobs()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(ArchivedRow.objects.filter(model='projects.comment').count(), 4)
+        data = self.sync(self.member, since)
+        self.assertIn(('contributor', self.membership.pk, 'DELETE'),
+                      [(change['model'], change['id'], change['operation']) for change in data['changes']])
+
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.delete(reverse('project-archive', args=[self.project.pk])).status_code, 202)
+        self.run_jobs()
+        self.assertEqual(self.threads(), threads)
+        self.assertFalse(ArchivedRow.objects.exists())
+        operations = {(change['model'], change['id']): change['operation']
+                      for change in self.sync(self.member, data['next'])['changes']}
+        self.assertEqual(operations[('contributor', self.membership.pk)], 'CREATE')
+        self.assertEqual(operations[('project', self.project.pk)], 'UPDATE')
+        self.assertEqual(sum(model == 'comment' for model, _ in operations), 4)
+
+    def test_state_changes_commit_with_their_journal(self):
+        # The project row is on its shard and the journal and outbox on the default database:
+        # each state change runs in one partitions.atomic block with its journal entries.
+        blocks = []
+        atomic = partitions.atomic
+
+        @contextmanager
+        def recording_atomic():
+            with atomic(), CaptureQueriesContext(connection) as queries:
+                yield
+            blocks.append('\n'.join(query['sql'] for query in queries))
+
+        def committed_together(*fragments):
+            return any(all(fragment in block for fragment in fragments) for block in blocks)
+
+        journal = 'INSERT INTO "projects_change"'
+        with mock.patch.object(partitions, 'atomic', recording_atomic):
+            for method, url in (('post', reverse('project-archive', args=[self.project.pk])),
+                                ('delete', reverse('project-archive', args=[self.project.pk])),
+                                ('delete', reverse('project-detail', args=[self.project.pk]))):
+                self.assertEqual(getattr(self.client, method)(url).status_code, 202)
+                self.run_jobs()
+        self.assertTrue(committed_together('UPDATE "projects_customproject" SET "archived_time" = \'', journal,
+                                           'INSERT INTO "projects_job"'))
+        self.assertTrue(committed_together('UPDATE "projects_customproject" SET "archived_time" = NULL', journal))
+        self.assertTrue(committed_together('UPDATE "projects_customproject" SET "deleted_time"', journal,
+                                           'INSERT INTO "projects_job"'))
+
+    @override_settings(OUTBOX_LEASE=300)
+    def test_lease_renewed_between_batches(self):
+        self.client.delete(reverse('project-detail', args=[self.project.pk]))
+        [message] = outbox.claim(10)
+        leases = []
+        renew = outbox.renew_lease
+
+        def record_lease():
+            renew()
+            leases.append(OutboxMessage.objects.get(topic='job').available_time)
+
+        with mock.patch('projects.outbox.renew_lease', record_lease):
+            self.assertTrue(outbox.process(message))
+        self.assertGreater(len(leases), 2)
+        self.assertGreater(leases[0], message.available_time)
+        self.assertEqual(leases, sorted(leases))
+
+    def test_reclaimed_job_stops(self):
+        self.client.delete(reverse('project-detail', args=[self.project.pk]))
+        [stale] = outbox.claim(10)
+        # The lease expires while the first worker stalls, and a second worker claims the job.
+        OutboxMessage.objects.filter(topic='job').update(available_time=timezone.now())
+        [current] = outbox.claim(10)
+        with self.assertLogs('projects.outbox', 'WARNING') as logs:
+            self.assertFalse(outbox.process(stale))
+        self.assertIn('lease lost', logs.output[0])
+        self.assertEqual(Comment.objects.count(), 2)  # It stopped after its first batch.
+        self.assertEqual(OutboxMessage.objects.get(topic='job').claim_token, current.claim_token)
+        self.assertTrue(outbox.process(current))
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(OutboxMessage.objects.get(topic='job').status, 'DONE')
+
+
+class SoftDeleteTests(BudgetedAPITestCase):
+    """Deleted and archived rows disappear from the default managers and the API at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.member = create_user('member')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.other = CustomProject.objects.create_project('Other', 'Other', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.project, user=cls.owner)
+        Contributor.objects.create(user=cls.member, project=cls.project, role='MEMBER')
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=cls.contributor,
+                                         author=cls.contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def project_names(self, **params):
+        return [project['name'] for project in self.client.get(reverse('project-list'), params).data]
+
+    def test_deleted_project_hidden(self):
+        self.assertEqual(self.client.delete(reverse('project-detail', args=[self.project.pk])).status_code, 202)
+        self.assertEqual(self.project_names(), ['Other'])
+        self.assertEqual(self.client.get(reverse('project-detail', args=[self.project.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('list_create_issues', args=[self.project.pk])).status_code, 404)
+        self.assertFalse(CustomProject.objects.filter(pk=self.project.pk).exists())
+        self.assertIsNotNone(CustomProject.all_objects.get(pk=self.project.pk).deleted_time)
+        # Not restorable: only archived projects are.
+        self.assertEqual(self.client.delete(reverse('project-archive', args=[self.project.pk])).status_code, 404)
+
+    def test_deleted_issue_and_comments_hidden(self):
+        comment = Comment.objects.create(description='Comment', issue=self.issue, author=self.owner)
+        url = reverse('comment-detail', args=[self.project.pk, self.issue.pk, comment.uuid])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(Comment.all_objects.count(), 1)
+
+        self.assertEqual(self.client.delete(reverse('issue', args=[self.project.pk, self.issue.pk])).status_code, 202)
+        self.assertEqual(self.client.get(reverse('list_create_issues', args=[self.project.pk])).data, [])
+        self.assertEqual(self.client.get(reverse('issue', args=[self.project.pk, self.issue.pk])).status_code, 404)
+        self.assertFalse(Issue.objects.exists())
+        self.assertTrue(Issue.all_objects.exists())
+
+    def test_archived_project_hidden_until_restored(self):
+        self.authenticate(self.member)
+        self.assertEqual(self.client.post(reverse('project-archive', args=[self.project.pk])).status_code, 403)
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.post(reverse('project-archive', args=[self.project.pk])).status_code, 202)
+        self.assertEqual(self.project_names(), ['Other'])
+        self.assertEqual(self.project_names(archived='true'), ['Softdesk'])
+        self.assertEqual(self.client.get(reverse('project-detail', args=[self.project.pk])).status_code, 404)
+
+        self.assertEqual(self.client.delete(reverse('project-archive', args=[self.project.pk])).status_code, 202)
+        self.assertEqual(self.client.delete(reverse('project-archive', args=[self.project.pk])).status_code, 409)
+        outbox.drain(concurrency=1)
+        self.assertEqual(self.project_names(), ['Softdesk', 'Other'])
+        self.assertEqual(self.client.get(reverse('issue', args=[self.project.pk, self.issue.pk])).data['name'], 'Issue')
+
+    def test_archive_projects_command(self):
+        Change.objects.filter(project_id=self.project.pk).update(created_time=timezone.now() - timedelta(days=400))
+        output = StringIO()
+        call_command('archive_projects', '--inactive-days', '365', '--dry-run', stdout=output)
+        self.assertIn('Would archive 1 project(s).', output.getvalue())
+        self.assertEqual(self.project_names(), ['Softdesk', 'Other'])
+        call_command('archive_projects', '--inactive-days', '365', stdout=StringIO())
+        self.assertEqual(self.project_names(), ['Other'])
+        self.assertEqual(Job.objects.get().action, 'ARCHIVE')
+
+
+class ProjectCreationTests(BudgetedAPITestCase):
+    """Projects are created with their owner in one transaction, under names unique across shards."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def create(self, name):
+        return self.client.post(reverse('project-list'), {'name': name, 'description': 'Other', 'type': 'BACKEND'},
+                                format='json')
+
+    def test_created_with_owner(self):
+        response = self.create('Other')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(Contributor.objects.get(project_id=response.data['id']).role, 'OWNER')
+        self.assertEqual(ProjectShard.objects.get(pk=response.data['id']).name, 'Other')
+        self.assertEqual(self.create('Softdesk').status_code, 409)
+
+    def test_name_taken_on_another_shard(self):
+        # A project of another shard, or one created concurrently: only the shard map has its name.
+        ProjectShard.objects.create(name='Other', database='default')
+        self.assertEqual(self.create('Other').status_code, 409)
+        with mock.patch.object(CustomProject.objects, 'taken_names', return_value=set()):
+            self.assertEqual(self.create('Other').status_code, 409)
+        self.assertFalse(CustomProject.all_objects.filter(name='Other').exists())
+        self.assertEqual(Contributor.objects.count(), 1)
+
+    def test_import_all_or_none(self):
+        ProjectShard.objects.create(name='Taken', database='default')
+        response = self.client.post(reverse('project-import'), {'projects': [
+            {'name': 'First', 'description': 'First', 'type': 'BACKEND'},
+            {'name': 'Taken', 'description': 'Taken', 'type': 'BACKEND'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['names'], ['Taken'])
+        self.assertFalse(ProjectShard.objects.filter(name='First').exists())
+
+    def test_rename(self):
+        self.create('Other')
+        url = reverse('project-detail', args=[self.project.pk])
+        data = {'name': 'Other', 'description': 'Issue tracker', 'type': 'BACKEND'}
+        self.assertEqual(self.client.put(url, data, format='json').status_code, 409)
+        self.assertEqual(ProjectShard.objects.get(pk=self.project.pk).name, 'Softdesk')
+
+        response = self.client.put(url, {**data, 'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(ProjectShard.objects.get(pk=self.project.pk).name, 'Renamed')
+        self.assertEqual(self.create('Softdesk').status_code, 201)
+
+    def test_name_freed_by_purge(self):
+        self.client.delete(reverse('project-detail', args=[self.project.pk]))
+        self.assertEqual(self.create('Softdesk').status_code, 409)  # Kept until purged.
+        outbox.drain(concurrency=1)
+        self.assertEqual(self.create('Softdesk').status_code, 201)
+
+
+class BulkContributorTests(BudgetedAPITestCase):
+    """Contributors are added and removed by username, with a constant number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.maintainer = create_user('maintainer')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        Contributor.objects.create(user=cls.maintainer, project=cls.project, role='MAINTAINER')
+        cls.users = [create_user(f'user{number}') for number in range(6)]
+
+    def setUp(self):
+        self.authenticate(self.owner)
+        self.url = reverse('project-contributors-bulk', args=[self.project.pk])
+
+    def send(self, method, usernames, **data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(self.url, {'usernames': usernames, **data}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return {result['username']: result['status'] for result in response.data['results']}, len(queries)
+
+    def test_add(self):
+        results, _ = self.send('post', ['user0', 'owner', 'ghost', 'user0'])
+        self.assertEqual(results, {'user0': 'added', 'owner': 'already_contributor', 'ghost': 'not_found'})
+        self.assertEqual(Contributor.objects.get(user=self.users[0]).role, 'MEMBER')
+
+        _, one = self.send('post', ['user1'])
+        _, many = self.send('post', [f'user{number}' for number in range(2, 6)], role='MAINTAINER')
+        self.assertEqual(one, many)
+        self.assertEqual(Contributor.objects.filter(project=self.project, role='MAINTAINER').count(), 5)
+        self.assertEqual(Change.objects.filter(model='contributor', operation='CREATE').count(), 2 + 6)
+
+    def test_add_checks(self):
+        for data in ({}, {'usernames': []}, {'usernames': 'user0'}, {'usernames': ['']}):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post(self.url, data, format='json').status_code, 400)
+        with override_settings(CONTRIBUTORS_BULK_MAX_SIZE=2):
+            self.assertEqual(self.client.post(self.url, {'usernames': ['a', 'b', 'c']}, format='json').status_code,
+                             400)
+        self.authenticate(self.maintainer)
+        response = self.client.post(self.url, {'usernames': ['user0'], 'role': 'OWNER'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.send('post', ['user0'])[0], {'user0': 'added'})
+
+    def test_remove(self):
+        self.send('post', [f'user{number}' for number in range(6)])
+        issue = Issue.objects.create(name='Issue', description='Description', type='BUG', project=self.project,
+                                     user=Contributor.objects.get(user=self.users[0]),
+                                     author=Contributor.objects.get(user=self.owner))
+        self.authenticate(self.maintainer)
+        results, _ = self.send('delete', ['user0', 'owner', 'ghost', 'user0'])
+        self.assertEqual(results, {'user0': 'removed', 'owner': 'forbidden', 'ghost': 'not_found'})
+        self.assertFalse(Issue.all_objects.filter(pk=issue.pk).exists())
+        self.assertEqual(self.send('delete', ['user0'])[0], {'user0': 'not_contributor'})
+        self.send('delete', [f'user{number}' for number in range(1, 6)])
+        self.assertEqual(Contributor.objects.filter(project=self.project).count(), 2)
+
+        self.authenticate(self.users[0])
+        self.assertEqual(self.client.delete(self.url, {'usernames': ['owner']}, format='json').status_code, 403)
+
+
+class RoleTests(BudgetedAPITestCase):
+    """Contributor roles grant permission bitmasks checked without queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.members = {role: Contributor.objects.create(user=create_user(role.lower()), project=cls.project, role=role)
+                       for role in ('MAINTAINER', 'MEMBER', 'VIEWER')}
+        cls.members['OWNER'] = Contributor.objects.get(user=cls.owner)
+        cls.own_issue = Issue.objects.create(name='Own', description='Description', type='BUG', project=cls.project,
+                                             user=cls.members['MEMBER'], author=cls.members['MEMBER'])
+        cls.other_issue = Issue.objects.create(name='Other', description='Description', type='BUG',
+                                               project=cls.project, user=cls.members['OWNER'],
+                                               author=cls.members['OWNER'])
+
+    def membership(self, role):
+        contributor = self.members[role]
+        return Membership(contributor.pk, contributor.user_id, role, ROLE_PERMISSIONS[role])
+
+    def test_permission_matrix(self):
+        expected = {
+            ('view', None): {'OWNER', 'MAINTAINER', 'MEMBER', 'VIEWER'},
+            ('create_issue', None): {'OWNER', 'MAINTAINER', 'MEMBER'},
+            ('change_issue', 'own'): {'OWNER', 'MAINTAINER', 'MEMBER'},
+            ('change_issue', 'other'): {'OWNER', 'MAINTAINER'},
+            ('delete_issue', 'other'): {'OWNER', 'MAINTAINER'},
+            ('manage_contributors', None): {'OWNER', 'MAINTAINER'},
+            ('manage_roles', None): {'OWNER'},
+            ('manage_webhooks', None): {'OWNER'},
+            ('delete_project', None): {'OWNER'},
+        }
+        issues = {None: None, 'own': self.own_issue, 'other': self.other_issue}
+        with self.assertNumQueries(0):
+            for (action, issue), roles in expected.items():
+                allowed = {role for role in self.members if can(self.membership(role), action, issues[issue])}
+                self.assertEqual(allowed, roles, action)
+            self.assertFalse(can(None, 'view'))
+
+    def test_membership_loaded_once_per_request(self):
+        self.authenticate(self.members['MEMBER'].user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('issue', args=[self.project.pk, self.own_issue.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum('"projects_contributor"' in query['sql'] for query in queries), 1)
+
+    def test_roles_enforced(self):
+        self.authenticate(self.members['VIEWER'].user)
+        url = reverse('list_create_issues', args=[self.project.pk])
+        data = {'name': 'Issue', 'description': 'Description', 'type': 'BUG', 'user': self.members['VIEWER'].pk}
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url, data, format='json').status_code, 403)
+
+        self.authenticate(self.members['MEMBER'].user)
+        issue_data = {'name': 'Renamed', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW',
+                      'type': 'BUG', 'user': self.members['MEMBER'].pk}
+        self.assertEqual(self.client.put(reverse('issue', args=[self.project.pk, self.own_issue.pk]), issue_data,
+                                         format='json').status_code, 200)
+        self.assertEqual(self.client.put(reverse('issue', args=[self.project.pk, self.other_issue.pk]), issue_data,
+                                         format='json').status_code, 403)
+
+    def test_role_change(self):
+        url = reverse('project-contributor', args=[self.project.pk, self.members['VIEWER'].user_id])
+        self.authenticate(self.members['MAINTAINER'].user)
+        self.assertEqual(self.client.patch(url, {'role': 'MEMBER'}, format='json').status_code, 403)
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.patch(url, {'role': 'ADMIN'}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'role': 'MEMBER'}, format='json').data['role'], 'MEMBER')
+        request = SimpleNamespace(user=self.members['VIEWER'].user)
+        self.assertEqual(get_membership(request, self.project.pk).permissions, ROLE_PERMISSIONS['MEMBER'])
+
+
+@override_settings(COMMENT_THREAD_REPLIES=2, COMMENT_MAX_DEPTH=3)
+class CommentThreadTests(BudgetedAPITestCase):
+    """Replies form threads listed in path order, a page of threads at a time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        contributor = Contributor.objects.get(user=cls.owner)
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=contributor,
+                                         author=contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+        self.url = reverse('comment-list-create', args=[self.project.pk, self.issue.pk])
+
+    def reply(self, description, parent=None):
+        response = self.client.post(self.url, {'description': description, 'parent': parent}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertWithinQueryBudget(response)
+        return response.data
+
+    def test_thread(self):
+        first = self.reply('First')
+        answer = self.reply('Answer', first['id'])
+        self.reply('Second')
+        nested = self.reply('Nested', answer['id'])
+        self.reply('Late answer', first['id'])
+        self.assertEqual((answer['depth'], nested['depth']), (1, 2))
+
+        response = self.client.get(reverse('comment-detail', args=[self.project.pk, self.issue.pk, first['uuid']]),
+                                   {'thread': 'true'})
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.data['reply_count'], 3)
+        self.assertEqual([reply['description'] for reply in response.data['replies']],
+                         ['Answer', 'Nested', 'Late answer'])
+
+    def test_thread_pages(self):
+        roots = [self.reply(f'Thread {number}') for number in range(3)]
+        for number in range(3):
+            self.reply(f'Reply {number}', roots[0]['id'])
+
+        first = self.client.get(self.url, {'threads': 'true', 'limit': 2})
+        self.assertWithinQueryBudget(first)
+        self.assertEqual([(thread['excerpt'], thread['reply_count'], len(thread['replies']))
+                          for thread in first.data['results']], [('Thread 0', 3, 2), ('Thread 1', 0, 0)])
+        last = self.client.get(self.url, {'threads': 'true', 'limit': 2, 'after': first.data['next']})
+        self.assertEqual([thread['excerpt'] for thread in last.data['results']], ['Thread 2'])
+        self.assertIsNone(last.data['next'])
+
+    def test_reply_checks(self):
+        parent = None
+        for depth in range(4):
+            parent = self.reply(f'Depth {depth}', parent)['id']
+        response = self.client.post(self.url, {'description': 'Too deep', 'parent': parent}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        other = Issue.objects.create(name='Other', description='Description', type='BUG', project=self.project,
+                                     user=self.issue.user, author=self.issue.author)
+        response = self.client.post(reverse('comment-list-create', args=[self.project.pk, other.pk]),
+                                    {'description': 'Elsewhere', 'parent': parent}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DescriptionTests(BudgetedAPITestCase):
+    """Descriptions are stored compressed and only loaded by the views sending them in full."""
+
+    DESCRIPTION = '# Crash on start\n\nThe **app** crashes, see [the log](https://example.com/log).\n\n' + (
+        '- The same stack trace, again and again.\n' * 5000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        contributor = Contributor.objects.get(user=cls.owner)
+        cls.issue = Issue.objects.create(name='Issue', description=cls.DESCRIPTION, type='BUG', user=contributor,
+                                         author=contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def test_excerpt(self):
+        self.assertEqual(excerpt('## Title\n\n> *Quoted* `code` <b>tag</b>\n![img](a.png)', 200), 'Title Quoted code tag img')
+        self.assertEqual(excerpt('one two three', 9), 'one two…')
+        self.assertEqual(self.issue.excerpt[:44], 'Crash on start The app crashes, see the log.')
+        self.assertLessEqual(len(self.issue.excerpt), 200)
+
+    def test_stored_compressed(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT description FROM projects_issue WHERE id = %s', [self.issue.pk])
+            stored = bytes(cursor.fetchone()[0])
+        self.assertEqual(zlib.decompress(stored).decode(), self.DESCRIPTION)
+        self.assertLess(len(stored), len(self.DESCRIPTION) // 50)
+        self.assertEqual(Issue.objects.get().description, self.DESCRIPTION)
+
+    def test_loaded_by_detail_views_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list_create_issues', args=[self.project.pk]))
+        self.assertEqual(response.data[0]['excerpt'], self.issue.excerpt)
+        self.assertNotIn('description', response.data[0])
+        self.assertFalse([query for query in queries if '"projects_issue"."description"' in query['sql']])
+
+        response = self.client.get(reverse('issue', args=[self.project.pk, self.issue.pk]))
+        self.assertEqual(response.data['description'], self.DESCRIPTION)
+
+
+class AttachmentTests(BudgetedAPITestCase):
+    """Attachments are stored once per content and downloaded with Range and conditional requests."""
+
+    CONTENT = b'0123456789abcdefghij'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.viewer = create_user('viewer')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        Contributor.objects.create(user=cls.viewer, project=cls.project, role='VIEWER')
+        contributor = Contributor.objects.get(user=cls.owner)
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=contributor,
+                                         author=contributor, project=cls.project)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ATTACHMENT_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        get_storage.cache_clear()
+        self.addCleanup(get_storage.cache_clear)
+        self.authenticate(self.owner)
+        self.url = reverse('issue-attachments', args=[self.project.pk, self.issue.pk])
+
+    def upload(self, content=CONTENT, name='log.txt'):
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content, 'text/plain')},
+                                format='multipart')
+
+    def download(self, **headers):
+        attachment = Attachment.objects.first()
+        response = self.client.get(reverse('issue-attachment', args=[self.project.pk, self.issue.pk, attachment.uuid]),
+                                   headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_stored_once_per_content(self):
+        first, second = self.upload().data, self.upload(name='copy.txt').data
+        self.assertEqual(first['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+        self.assertEqual((first['size'], second['sha256']), (len(self.CONTENT), first['sha256']))
+        self.assertEqual([path.name for path in get_storage().root.glob('??/*')], [first['sha256']])
+        response = self.client.get(self.url)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual([attachment['name'] for attachment in response.data], ['log.txt', 'copy.txt'])
+
+    def test_download(self):
+        self.upload()
+        response, body = self.download()
+        self.assertEqual((response.status_code, body), (200, self.CONTENT))
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.CONTENT).hexdigest()}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.download(If_None_Match=response['ETag'])[0].status_code, 304)
+        # A client asking for the media type of the file is not refused.
+        self.assertEqual(self.download(Accept='text/plain')[0].status_code, 200)
+
+    def test_ranges(self):
+        self.upload()
+        etag = f'"{hashlib.sha256(self.CONTENT).hexdigest()}"'
+        for header, content_range, body in [('bytes=2-5', 'bytes 2-5/20', b'2345'),
+                                            ('bytes=15-', 'bytes 15-19/20', b'fghij'),
+                                            ('bytes=-3', 'bytes 17-19/20', b'hij'),
+                                            ('bytes=18-40', 'bytes 18-19/20', b'ij')]:
+            with self.subTest(range=header):
+                response, content = self.download(Range=header)
+                self.assertEqual((response.status_code, response['Content-Range'], content), (206, content_range, body))
+                self.assertEqual(int(response['Content-Length']), len(body))
+
+        response, content = self.download(Range='bytes=2-5', If_Range=etag)
+        self.assertEqual((response.status_code, content), (206, b'2345'))
+        # The file changed since the client's copy: it gets the whole file.
+        response, content = self.download(Range='bytes=2-5', If_Range='"stale"')
+        self.assertEqual((response.status_code, content), (200, self.CONTENT))
+
+        response, _ = self.download(Range='bytes=20-30')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */20'))
+        self.assertEqual(self.download(Range='bytes=5-2')[0].status_code, 416)
+        self.assertEqual(self.download(Range='lines=1-2')[0].status_code, 200)
+
+    def test_upload_checks(self):
+        with override_settings(ATTACHMENT_MAX_SIZE=10, ATTACHMENT_CHUNK_SIZE=4):
+            self.assertEqual(self.upload().status_code, 413)
+        self.assertFalse(Attachment.objects.exists())
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+        self.authenticate(self.viewer)
+        self.assertEqual(self.upload().status_code, 403)
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), "The admin is not installed (API-only settings).")
+class AdminTests(BudgetedAPITestCase):
+    """Admin changelists cost the same queries whatever the size of their table, and never load descriptions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def add_rows(self, number):
+        start = CustomProject.objects.count()
+        for index in range(start, start + number):
+            project = CustomProject.objects.create_project(f'Project {index}', 'Description', 'BACKEND', self.staff)
+            contributor = Contributor.objects.get(project=project)
+            issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=contributor,
+                                         author=contributor, project=project)
+            comment = Comment.objects.create(description='Comment', issue=issue, author=self.staff)
+            Attachment.objects.create(issue=issue, comment=comment, uploaded_by=self.staff, name='log.txt',
+                                      content_type='text/plain', size=1, sha256='0' * 64)
+
+    def changelist(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:projects_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_changelists_constant_queries(self):
+        models = ['customproject', 'contributor', 'issue', 'comment', 'attachment']
+        self.add_rows(1)
+        counts = {model: len(self.changelist(model)[1]) for model in models}
+        self.add_rows(5)
+        for model in models:
+            with self.subTest(model=model):
+                response, queries = self.changelist(model)
+                self.assertEqual(len(queries), counts[model])
+                self.assertEqual(response.context['cl'].result_count, 6)
+                self.assertFalse([query['sql'] for query in queries
+                                  if '"projects_issue"."description"' in query['sql']])
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_count_stops_at_limit(self):
+        self.add_rows(5)
+        response, queries = self.changelist('issue')
+        # SQLite has no estimate: the changelist reports the limit, plus one for the next page.
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertEqual(len(response.context['cl'].result_list), 5)
+        self.assertTrue([query['sql'] for query in queries if 'COUNT' in query['sql'] and 'LIMIT 4' in query['sql']])
+        response = self.client.get(reverse('admin:projects_issue_changelist'), {'status': 'TODO'})
+        self.assertEqual(response.status_code, 200)
+
+
+class PartitionTests(BudgetedAPITestCase):
+    """The issues of a partitioned project are routed to its partition, the rest stays on its shard."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.large = CustomProject.objects.create_project('Large', 'Large tenant', 'BACKEND', cls.owner)
+        cls.small = CustomProject.objects.create_project('Small', 'Small tenant', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(project=cls.large)
+
+    def test_routing(self):
+        router = ProjectRouter()
+        with override_settings(ISSUE_PARTITIONS={self.large.pk: 'tenant'}):
+            self.assertEqual(database_for('projects.issue', self.large.pk), 'tenant')
+            self.assertEqual(database_for('projects.comment', self.large.pk), 'tenant')
+            self.assertEqual(database_for('projects.contributor', self.large.pk), 'default')
+            self.assertEqual(database_for('projects.issue', self.small.pk), 'default')
+            with use_project(self.large.pk):
+                self.assertEqual(router.db_for_read(Issue), 'tenant')
+                self.assertEqual(router.db_for_write(Comment), 'tenant')
+                self.assertEqual(router.db_for_read(Contributor), 'default')
+                self.assertEqual(partitions.project_databases(self.large.pk), ['default', 'tenant'])
+            with use_project(self.small.pk):
+                self.assertEqual(router.db_for_read(Issue), 'default')
+            # The project of a loaded row wins over the project being served.
+            issue = Issue(project_id=self.large.pk)
+            self.assertEqual(router.db_for_write(Issue, instance=issue), 'tenant')
+            self.assertIsNone(router.db_for_read(Issue))
+            self.assertIsNone(router.db_for_read(Change))
+
+    def test_mirror_targets(self):
+        self.assertEqual(partitions.mirror_targets(self.owner), set())
+        self.assertEqual(partitions.mirror_targets(self.contributor), set())
+        with override_settings(ISSUE_PARTITIONS={self.large.pk: 'tenant'}):
+            self.assertEqual(partitions.mirror_targets(self.owner), {'tenant'})
+            self.assertEqual(partitions.mirror_targets(self.contributor), {'tenant'})
+            self.assertEqual(partitions.mirror_targets(self.small), set())
+
+    @override_settings(DATABASE_ID_BLOCKS={'default': 3}, DATABASE_ID_BLOCK_SIZE=1000)
+    def test_id_block(self):
+        partitions.reserve_id_block('default')
+        issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=self.contributor,
+                                     author=self.contributor, project=self.large)
+        self.assertGreater(issue.pk, 3000)
+        with self.assertRaisesMessage(ValueError, "No ID block is configured for the 'tenant' database."):
+            partitions.reserve_id_block('tenant')
+
+    def test_partition_project_copies_workload(self):
+        workload.issue_saved(Issue.objects.create(name='Issue', description='Description', type='BUG', priority='HIGH',
+                                                  user=self.contributor, author=self.contributor, project=self.large))
+        copied = {}
+
+        def copy_rows(model, queryset, alias, batch_size):
+            copied[model] = copied.get(model, 0) + queryset.count()
+            return 0
+
+        with mock.patch.object(partitions, 'reserve_id_block'), mock.patch.object(partitions, 'copy_rows', copy_rows):
+            partitions.partition_project(self.large.pk, 'tenant')
+        # Every row deleted from the shard was copied first (issues once per lookup of the plan).
+        self.assertGreaterEqual(copied[Issue], 1)
+        self.assertEqual(copied[Workload], 1)
+        self.assertFalse(Workload.objects.filter(project=self.large).exists())
+        self.assertFalse(Issue.objects.filter(project=self.large).exists())
+
+    def test_partition_project_command_checks(self):
+        for alias in ('tenant', 'default'):
+            with self.subTest(alias=alias), self.assertRaisesMessage(CommandError, 'is not a partition database'):
+                call_command('partition_project', self.large.pk, '--database', alias)
+
+
+class ShardTests(BudgetedAPITestCase):
+    """Projects are placed on shards by the shard map, and their writes are refused while they move."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.projects = [CustomProject.objects.create_project(f'Project {number}', 'Project', 'BACKEND', cls.owner)
+                        for number in range(3)]
+        cls.project = cls.projects[0]
+        cls.contributor = Contributor.objects.get(project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+        self.addCleanup(forget_placement, self.project.pk)
+
+    def test_placement_cached(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(placement(self.project.pk), ('default', False))
+        with override_settings(SHARDS=['default', 'east'], SHARD_MAP_TTL=60):
+            ProjectShard.objects.filter(pk=self.project.pk).update(database='east')
+            with self.assertNumQueries(1):
+                self.assertEqual(placement(self.project.pk), ('east', False))
+                self.assertEqual(placement(self.project.pk), ('east', False))
+            self.assertEqual(database_for('projects.issue', self.project.pk), 'east')
+            ProjectShard.objects.filter(pk=self.project.pk).update(database='default')
+            forget_placement(self.project.pk)
+            self.assertEqual(placement(self.project.pk), ('default', False))
+            # Projects missing from the map predate it: they live on the default database.
+            self.assertEqual(placement(10 ** 6), ('default', False))
+
+    @override_settings(SHARDS=['default', 'east'])
+    def test_ids_allocated_on_shards(self):
+        entries = ProjectShard.allocate_many([f'Other {number}' for number in range(20)])
+        self.assertEqual(len({entry.pk for entry in entries}), 20)
+        self.assertLessEqual({entry.database for entry in entries}, {'default', 'east'})
+
+    def test_writes_refused_while_moving(self):
+        ProjectShard.objects.filter(pk=self.project.pk).update(moving=True)
+        with override_settings(SHARDS=['default', 'east']):
+            with use_project(self.project.pk), self.assertRaises(ProjectMoving):
+                ProjectRouter().db_for_write(Issue)
+            response = self.client.post(reverse('list_create_issues', args=[self.project.pk]), {
+                'name': 'Issue', 'description': 'Description', 'type': 'BUG', 'user': self.contributor.pk,
+            }, format='json')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.data['detail'].code, 'project_moving')
+            self.assertEqual(self.client.get(reverse('list_create_issues', args=[self.project.pk])).status_code, 200)
+
+    def test_listing_merged_by_id(self):
+        ids = [project.pk for project in self.projects]
+        first = self.client.get(reverse('project-list'), {'limit': 2}).data
+        self.assertEqual([project['id'] for project in first], ids[:2])
+        rest = self.client.get(reverse('project-list'), {'after': first[-1]['id'], 'limit': 2}).data
+        self.assertEqual([project['id'] for project in rest], ids[2:])
+        self.assertEqual([project.pk for project in shards.merge_pages(CustomProject.objects.all(), ids[0])], ids[1:])
+
+    def test_move_project_command_checks(self):
+        with self.assertRaisesMessage(CommandError, "'east' is not listed in SHARDS."):
+            call_command('move_project', self.project.pk, '--to', 'east')
+        with self.assertRaisesMessage(CommandError, "is already on 'default'"):
+            call_command('move_project', self.project.pk, '--to', 'default')
+        with self.assertRaisesMessage(CommandError, 'is not in the shard map'):
+            call_command('move_project', 10 ** 6, '--to', 'default')
+
+
+class NotificationTests(BudgetedAPITestCase):
+    """Issue creations notify the contactable contributors through the outbox, listed page by page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.member = create_user('member', can_be_contacted=True)
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.create(user=cls.member, project=cls.project, role='MEMBER')
+
+    def test_notifications_paginated(self):
+        self.authenticate(self.owner)
+        for number in range(5):
+            response = self.client.post(reverse('list_create_issues', args=[self.project.pk]), {
+                'name': f'Issue {number}', 'description': 'Description', 'type': 'BUG',
+                'user': self.contributor.pk if number == 4 else Contributor.objects.get(user=self.owner).pk,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(outbox.drain(concurrency=1), (5, 0))
+        self.assertEqual(outbox.drain(concurrency=1), (0, 0))
+
+        self.authenticate(self.member)
+        pages, before = [], None
+        while True:
+            response = self.client.get(reverse('notifications'), {'limit': 2, **({'before': before} if before else {})})
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinQueryBudget(response)
+            pages.append([notification['verb'] for notification in response.data['results']])
+            before = response.data['next']
+            if before is None:
+                break
+        self.assertEqual(pages, [['issue_assigned', 'issue_created'], ['issue_created', 'issue_created'],
+                                 ['issue_created']])
+        self.assertEqual(self.client.get(reverse('notifications'), {'before': 'x'}).status_code, 400)
+
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.get(reverse('notifications')).data, {'results': [], 'next': None})
+
+
+class IssueHistoryTests(BudgetedAPITestCase):
+    """Issue updates append field-level diffs to the history, aggregated into the project stats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(user=cls.owner)
+        cls.member = Contributor.objects.create(user=create_user('member'), project=cls.project, role='MEMBER')
+        cls.issue = Issue.objects.create(name='Issue', description='Description', type='BUG', user=cls.contributor,
+                                         author=cls.contributor, project=cls.project)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def update(self, **fields):
+        data = {'name': 'Issue', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW', 'type': 'BUG',
+                'user': self.contributor.pk, **fields}
+        return self.client.put(reverse('issue', args=[self.project.pk, self.issue.pk]), data, format='json')
+
+    def history(self, **params):
+        response = self.client.get(reverse('issue-history', args=[self.project.pk, self.issue.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        return response.data
+
+    def test_changes_recorded_and_paginated(self):
+        self.assertEqual(self.update(status='IN_PROGRESS', priority='HIGH').status_code, 200)
+        self.assertEqual(self.update(status='IN_PROGRESS', priority='HIGH').status_code, 200)  # No change.
+        self.assertEqual(self.update(status='FINISHED', priority='HIGH', user=self.member.pk).status_code, 200)
+
+        first = self.history(limit=1)
+        self.assertEqual(first['results'][0]['changes'], {
+            'status': ['IN_PROGRESS', 'FINISHED'], 'user': [self.contributor.pk, self.member.pk],
+        })
+        self.assertEqual(first['results'][0]['actor'], self.owner.pk)
+        last = self.history(limit=1, before=first['next'])
+        self.assertEqual(last['results'][0]['changes'], {'status': ['TO_DO', 'IN_PROGRESS'], 'priority': ['LOW', 'HIGH']})
+        self.assertIsNone(last['next'])
+        response = self.client.get(reverse('issue-history', args=[self.project.pk, self.issue.pk]), {'before': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_rolled_back_with_its_history(self):
+        self.client.raise_request_exception = False
+        with mock.patch.object(IssueChange.objects, 'create', side_effect=DatabaseError('Disk full')):
+            self.assertEqual(self.update(status='IN_PROGRESS').status_code, 500)
+        self.issue.refresh_from_db()
+        self.assertEqual(self.issue.status, 'TO_DO')
+
+    def test_stats(self):
+        self.update(status='IN_PROGRESS')
+        self.update(status='FINISHED')
+        started, finished = IssueChange.objects.order_by('id')
+        IssueChange.objects.filter(pk=started.pk).update(created_time=finished.created_time - timedelta(hours=6))
+        other = Issue.objects.create(name='Other', description='Description', type='BUG', user=self.contributor,
+                                     author=self.contributor, project=self.project)
+        IssueChange.objects.create(issue=other, project_id=self.project.pk, actor=self.owner, diff='{}',
+                                   status='FINISHED')
+
+        response = self.client.get(reverse('issue-stats', args=[self.project.pk]), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual([row['count'] for row in response.data['throughput']], [2])
+        # The other issue was never started: it has no cycle time.
+        self.assertEqual(response.data['cycle_time'], {'count': 1, 'mean_hours': 6.0, 'median_hours': 6.0})
+        self.assertEqual(self.client.get(reverse('issue-stats', args=[self.project.pk]), {'days': 'x'}).status_code, 400)
+
+
+class StandInServer:
+    """Local HTTP server standing in for a webhook endpoint, answering with a route's response."""
+
+    def __init__(self):
+        self.requests = []
+        self.aborted = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                server.requests.append((self.path, dict(self.headers), body))
+                if self.path == '/redirect':
+                    self.send_response(302)
+                    self.send_header('Location', '/hook')
+                    self.end_headers()
+                elif self.path == '/flood':
+                    self.send_response(200)
+                    self.end_headers()
+                    try:
+                        for _ in range(1024):
+                            self.wfile.write(b'x' * 65536)
+                    except OSError:
+                        server.aborted.set()
+                else:
+                    self.send_response(204)
+                    self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@override_settings(WEBHOOK_DEBOUNCE=0, WEBHOOK_MAX_ATTEMPTS=2, WEBHOOK_TIMEOUT=5)
+class WebhookTests(BudgetedAPITestCase):
+    """Webhooks only reach public endpoints, without following redirects."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributor = Contributor.objects.get(user=cls.owner)
+
+    def setUp(self):
+        self.authenticate(self.owner)
+        self.server = StandInServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def register(self, url):
+        return self.client.post(reverse('project-webhooks', args=[self.project.pk]), {'url': url}, format='json')
+
+    def create_issue(self):
+        response = self.client.post(reverse('list_create_issues', args=[self.project.pk]), {
+            'name': 'Issue', 'description': 'Description', 'type': 'BUG', 'user': self.contributor.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_private_targets_refused_at_registration(self):
+        for url in ('http://127.0.0.1/hook', 'http://localhost:8000/hook', 'http://10.0.0.1/hook',
+                    'http://169.254.169.254/latest/meta-data/', 'http://[::1]/hook', 'http://[::ffff:127.0.0.1]/',
+                    'http://0.0.0.0/hook', 'ftp://93.184.216.34/hook'):
+            with self.subTest(url=url):
+                response = self.register(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('url', response.data)
+        self.assertEqual(self.register('https://93.184.216.34/hook').status_code, 201)
+        with override_settings(WEBHOOK_ALLOWED_NETWORKS=['127.0.0.0/8']):
+            self.assertEqual(self.register(self.server.url('/hook')).status_code, 201)
+
+    def test_delivered_signed(self):
+        with override_settings(WEBHOOK_ALLOWED_NETWORKS=['127.0.0.1/32']):
+            webhook = self.register(self.server.url('/hook')).data
+            self.create_issue()
+            self.assertEqual(webhooks.deliver(), (1, 0))
+        [(path, headers, body)] = self.server.requests
+        signature = 'sha256=' + hmac.new(webhook['secret'].encode(), body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Softdesk-Signature'], signature)
+        self.assertEqual([event['model'] for event in json.loads(body)['events']], ['issue'])
+        self.assertEqual(webhooks.deliver(), (0, 0))
+
+    def test_private_target_refused_at_delivery(self):
+        # Registered before the host moved to a private address.
+        Webhook.objects.create(project=self.project, url=self.server.url('/hook'), secret='secret')
+        self.create_issue()
+        with self.assertLogs('projects.webhooks', 'WARNING') as logs:
+            self.assertEqual(webhooks.deliver(), (0, 1))
+        self.assertIn('127.0.0.1 is not a public address', logs.output[0])
+        self.assertEqual(self.server.requests, [])
+
+    @override_settings(WEBHOOK_ALLOWED_NETWORKS=['127.0.0.1/32'])
+    def test_redirect_not_followed(self):
+        webhook = Webhook.objects.create(project=self.project, url=self.server.url('/redirect'), secret='secret')
+        self.create_issue()
+        with self.assertLogs('projects.webhooks', 'WARNING') as logs:
+            self.assertEqual(webhooks.deliver(), (0, 1))
+        self.assertIn('HTTP 302', logs.output[0])
+        self.assertEqual([path for path, _, _ in self.server.requests], ['/redirect'])
+        Webhook.objects.filter(pk=webhook.pk).update(next_attempt_time=timezone.now())
+        with self.assertLogs('projects.webhooks', 'WARNING'):
+            webhooks.deliver()
+        self.assertEqual(WebhookDeadLetter.objects.get().last_error, 'HTTP 302')
+
+    @override_settings(WEBHOOK_ALLOWED_NETWORKS=['127.0.0.1/32'], WEBHOOK_MAX_RESPONSE_SIZE=1024)
+    def test_response_read_capped(self):
+        Webhook.objects.create(project=self.project, url=self.server.url('/flood'), secret='secret')
+        self.create_issue()
+        self.assertEqual(webhooks.deliver(), (1, 0))
+        # The connection is closed after the first kilobyte, long before the 64 MB sent.
+        self.assertTrue(self.server.aborted.wait(5))
+
+
+class WorkloadTests(BudgetedAPITestCase):
+    """Issue writes keep the workload counters exact; they drive automatic assignment and rebalancing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.owner)
+        cls.contributors = [Contributor.objects.get(project=cls.project, user=cls.owner)]
+        for name, role in (('alice', 'MEMBER'), ('bob', 'MEMBER'), ('viewer', 'VIEWER')):
+            cls.contributors.append(Contributor.objects.create(user=create_user(name), project=cls.project, role=role))
+
+    def setUp(self):
+        self.authenticate(self.owner)
+
+    def create(self, **fields):
+        data = {'name': 'Issue', 'description': 'Description', 'status': 'TO_DO', 'priority': 'LOW', 'type': 'BUG',
+                **fields}
+        response = self.client.post(reverse('list_create_issues', args=[self.project.pk]), data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        return response.data
+
+    def loads(self):
+        return {row.contributor_id: (row.open_issues, row.weight)
+                for row in Workload.objects.filter(project=self.project) if row.open_issues}
+
+    def test_counters_follow_issue_writes(self):
+        owner, alice, bob, _ = (contributor.pk for contributor in self.contributors)
+        issue = self.create(user=alice, priority='HIGH')
+        self.create(user=alice)
+        self.assertEqual(self.loads(), {alice: (2, 4)})
+
+        url = reverse('issue', args=[self.project.pk, issue['id']])
+        response = self.client.put(url, {**issue, 'user': bob, 'priority': 'MEDIUM'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(self.loads(), {alice: (1, 1), bob: (1, 2)})
+
+        response = self.client.put(url, {**issue, 'user': bob, 'status': 'FINISHED'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.loads(), {alice: (1, 1)})
+
+        other = self.create(user=owner, priority='HIGH')
+        self.assertEqual(self.client.delete(reverse('issue', args=[self.project.pk, other['id']])).status_code, 202)
+        self.assertEqual(self.loads(), {alice: (1, 1)})
+
+        self.contributors[1].delete()
+        self.assertEqual(self.loads(), {})
+
+    def test_auto_assign_picks_least_loaded(self):
+        owner, alice, bob, _ = (contributor.pk for contributor in self.contributors)
+        self.create(user=owner, priority='HIGH')
+        self.create(user=alice, priority='MEDIUM')
+        # Bob has no open issue, then the lowest weight; the viewer is never picked.
+        self.assertEqual(self.create(auto_assign=True, priority='HIGH')['user'], bob)
+        self.assertEqual(self.create(auto_assign=True)['user'], alice)
+        self.assertEqual(self.loads(), {owner: (1, 3), alice: (2, 3), bob: (1, 3)})
+
+    def test_user_or_auto_assign_required(self):
+        response = self.client.post(reverse('list_create_issues', args=[self.project.pk]),
+                                    {'name': 'Issue', 'description': 'Description', 'type': 'BUG'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user', response.data)
+
+    def test_rebalance_evens_out_workloads(self):
+        owner, alice, bob, viewer = (contributor.pk for contributor in self.contributors)
+        for priority in ('HIGH', 'HIGH', 'MEDIUM', 'LOW', 'LOW'):
+            self.create(user=alice, priority=priority)
+        self.create(user=viewer, priority='MEDIUM')
+
+        response = self.client.post(reverse('project-workload-rebalance', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        # The viewer's issue goes to the owner, then the two HIGH issues leave Alice; moving
+        # any other issue would not narrow the spread.
+        self.assertEqual(self.loads(), {owner: (2, 5), alice: (3, 4), bob: (1, 3)})
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(Issue.objects.get(pk=response.data[0]['id']).changes.count(), 1)
+
+        response = self.client.get(reverse('project-workload', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual([row['id'] for row in response.data], [viewer, bob, alice, owner])
+        self.assertEqual(response.data[0], {'id': viewer, 'user': self.contributors[3].user_id, 'role': 'VIEWER',
+                                            'open_issues': 0, 'weight': 0})
+
+    def test_rebalance_reserved_to_maintainers(self):
+        self.authenticate(self.contributors[1].user)
+        response = self.client.post(reverse('project-workload-rebalance', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class WarmupTests(BudgetedAPITransactionTestCase):
+    """Workers warm up before serving, the ASGI ones on the lifespan startup event."""
+
+    def lifespan(self):
+        """Run a startup and a shutdown through the ASGI application; return the warm-up timings and the replies."""
+        timings, replies = [], []
+        messages = asyncio.Queue()
+        for message_type in ('lifespan.startup', 'lifespan.shutdown'):
+            messages.put_nowait({'type': message_type})
+
+        async def send(message):
+            replies.append(message['type'])
+
+        with mock.patch.object(asgi, 'warm_up', side_effect=lambda: timings.append(warm_up())):
+            asyncio.run(asgi.application({'type': 'lifespan'}, messages.get, send))
+        return timings, replies
+
+    def test_warm_up(self):
+        self.assertIn(('issue-attachment', reverse('issue-attachment', args=[1, 1, UUID(int=0)])), sample_urls())
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('softdesk.warmup', 'INFO'):
+            timings = warm_up()
+        self.assertEqual(set(timings), {'routes', 'serializers', 'requests', 'databases', 'total'})
+        # The requests stop at authentication: only the database priming reads tables.
+        self.assertTrue(queries)
+        self.assertFalse([query['sql'] for query in queries if 'projects_issue' in query['sql'] and 'LIMIT 1' not in query['sql']])
+
+    def test_lifespan_startup(self):
+        with self.assertLogs('softdesk.warmup', 'INFO'):
+            timings, replies = self.lifespan()
+        self.assertEqual(replies, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertIsNotNone(timings[0])
+
+        # Run from the event loop of the server, the warm-up fails on its first query.
+        async def in_event_loop():
+            return warm_up()
+
+        with self.assertLogs('softdesk.warmup', 'ERROR'):
+            self.assertIsNone(asyncio.run(in_event_loop()))
+        with override_settings(WARMUP_ON_START=False):
+            self.assertEqual(self.lifespan(), ([], ['lifespan.startup.complete', 'lifespan.shutdown.complete']))
+
+
+class ConcurrentAssignmentTests(BudgetedAPITransactionTestCase):
+    """Automatic assignments lock the counter they pick, so concurrent ones each see the weight the others added."""
+
+    def setUp(self):
+        owner = create_user('owner')
+        self.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', owner)
+        self.token = f'Bearer {RefreshToken.for_user(owner).access_token}'
+        self.contributors = [Contributor.objects.get(project=self.project).pk] + [
+            Contributor.objects.create(user=create_user(name), project=self.project, role='MEMBER').pk
+            for name in ('alice', 'bob', 'carol')]
+        Contributor.objects.create(user=create_user('viewer'), project=self.project, role='VIEWER')
+
+    def test_pick_creates_counters_and_locks_one(self):
+        with partitions.atomic(), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(workload.pick(self.project.pk), self.contributors[0])
+        self.assertEqual(set(Workload.objects.values_list('contributor_id', flat=True)), set(self.contributors))
+        lock = queries[-1]['sql']
+        self.assertIn('LIMIT 1', lock)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', lock)
+        with CaptureQueriesContext(connection) as queries:
+            workload.pick(self.project.pk)
+        # Once every counter exists, a pick is the lookup of missing ones and the lock.
+        self.assertEqual(len(queries), 2)
+
+    # SQLite has no row locks: its shared in-memory test database refuses concurrent writers.
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_auto_assign(self):
+        project, token, contributors = self.project, self.token, self.contributors
+        barrier = threading.Barrier(len(contributors) * 2)
+        statuses = []
+
+        def create():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=token)
+            barrier.wait()
+            try:
+                response = client.post(reverse('list_create_issues', args=[project.pk]),
+                                       {'name': 'Issue', 'description': 'Description', 'type': 'BUG',
+                                        'priority': 'LOW', 'auto_assign': True}, format='json')
+                statuses.append(response.status_code)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=create) for _ in range(len(contributors) * 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [201] * len(threads))
+        # Two issues each: no assignment read a counter another one was about to raise.
+        self.assertEqual(dict(Workload.objects.filter(project=project).values_list('contributor_id', 'open_issues')),
+                         dict.fromkeys(contributors, 2))
+        self.assertEqual(sorted(Issue.objects.filter(project=project).values_list('user_id', flat=True)),
+                         sorted(contributors * 2))
+
+
+# Run in a new interpreter: the settings and the URLconf of a process are fixed once loaded.
+API_PROFILE_REQUEST = """
+import json
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = ':memory:'
+import django
+django.setup()
+from django.apps import apps
+from django.core.management import call_command
+from django.test import Client
+from django.test.utils import setup_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+from softdesk.testing import create_user
+setup_test_environment()
+call_command('migrate', verbosity=0)
+user = create_user('api')
+response = Client().get('/api/users/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+print(json.dumps({'status': response.status_code, 'content_type': response['Content-Type'],
+                  'admin': apps.is_installed('django.contrib.admin'), 'users': len(response.json())}))
+"""
+
+
+class ApiProfileTests(SimpleTestCase):
+    """The API-only settings profile boots without the browser apps and serves authenticated requests."""
+
+    def test_authenticated_request(self):
+        result = subprocess.run([sys.executable, '-c', API_PROFILE_REQUEST], cwd=settings.BASE_DIR,
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'softdesk.settings_api'},
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.splitlines()[-1]),
+                         {'status': 200, 'content_type': 'application/json', 'admin': False, 'users': 1})
+
+
+class ProfilingTests(BudgetedAPITestCase):
+    """Staff users get a profile of their request by sending the X-Profile header."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.project = CustomProject.objects.create_project('Softdesk', 'Issue tracker', 'BACKEND', cls.staff)
+        contributor = Contributor.objects.get(project=cls.project, user=cls.staff)
+        Issue.objects.bulk_create([Issue(name=f'Issue {number}', description='Description', type='BUG',
+                                         user=contributor, author=contributor, project=cls.project)
+                                   for number in range(50)])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(PROFILE_DIR=self.directory, PROFILE_INTERVAL=0.001)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_staff_request_profiled(self):
+        self.authenticate(self.staff)
+        response = self.client.get(reverse('list_create_issues', args=[self.project.pk]), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = self.directory / response['X-Profile']
+        self.assertRegex(profile.name, r'-GET-list_create_issues-\d+ms-3q-')
+        for line in profile.read_text().splitlines():
+            self.assertRegex(line, r'^GET list_create_issues(;[^;]+)+ \d+$')
+
+    def test_other_request_not_profiled(self):
+        member = create_user('member')
+        Contributor.objects.create(user=member, project=self.project, role='MEMBER')
+        self.authenticate(member)
+        response = self.client.get(reverse('list_create_issues', args=[self.project.pk]), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(list(self.directory.iterdir()), [])
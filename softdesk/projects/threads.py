@@ -0,0 +1,71 @@
+from django.db.models import Count, Window
+from django.db.models.functions import RowNumber, Substr
+
+from .models import Comment, comment_path
+
+# Sorts after every digit: the paths of a subtree lie between its root's path and
+# that path followed by THREAD_END, which keeps subtree lookups on the path index.
+THREAD_END = ':'
+
+
+def subtree_of(path):
+    """Return the lookups selecting the comment with the given path and all of its replies."""
+    return {'path__gte': path, 'path__lt': path + THREAD_END}
+
+
+def top_level_page(issue, after=None, limit=None):
+    """
+    Return one keyset page of the top-level comments of an issue, in thread order.
+    Their descriptions are deferred: pages send the excerpts.
+
+    Args:
+        issue (Issue): The commented issue.
+        after (int, optional): ID of the last top-level comment of the previous page.
+        limit (int, optional): Page size; every thread when omitted.
+    Returns:
+        list: The comments, ordered by path.
+    """
+    comments = Comment.objects.filter(issue=issue, depth=0).defer('description')
+    if after is not None:
+        comments = comments.filter(path__gt=comment_path('', after))
+    comments = comments.order_by('path')
+    return list(comments[:limit] if limit is not None else comments)
+
+
+def first_replies(issue, roots, limit):
+    """
+    Load the first replies of a page of threads, and the size of each thread, with one query.
+    The roots of a page are consecutive in path order, so all of their replies lie in one
+    range of the path index. Replies are numbered within their thread by a window
+    function, which keeps at most ``limit`` of them per thread whatever its size.
+    Their descriptions are deferred, as on the top-level comments.
+    Args:
+        issue (Issue): The commented issue.
+        roots (list): Top-level comments, ordered by path.
+        limit (int): Maximum number of replies loaded per thread (at least 1).
+    Returns:
+        dict: Root ID -> (number of replies, first replies in thread order).
+    """
+    threads = {root.pk: (0, []) for root in roots}
+    if not roots:
+        return threads
+    root = Substr('path', 1, Comment.PATH_SEGMENT)
+    replies = (Comment.objects
+               .filter(issue=issue, depth__gt=0, path__gt=roots[0].path, path__lt=roots[-1].path + THREAD_END)
+               .annotate(root=root,
+                         position=Window(RowNumber(), partition_by=[root], order_by='path'),
+                         thread_size=Window(Count('pk'), partition_by=[root]))
+               .filter(position__lte=limit)
+               .defer('description')
+               .order_by('path'))
+    for reply in replies:
+        root_id = int(reply.root)
+        if root_id in threads:
+            threads[root_id][1].append(reply)
+            threads[root_id] = (reply.thread_size, threads[root_id][1])
+    return threads
+
+
+def subtree(comment):
+    """Return a comment and all of its live replies, in thread order, with one query."""
+    return list(Comment.objects.filter(issue_id=comment.issue_id, **subtree_of(comment.path)).order_by('path'))
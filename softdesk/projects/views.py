@@ -1,14 +1,30 @@
+import base64
+import binascii
+import secrets
+import statistics
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
 from django.http import Http404
 from django.shortcuts import get_object_or_404
-from rest_framework import status, generics
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from projects.permissions import CommentPermissions, ProjectPermissions
+from projects import attachments, history, jobs, outbox, partitions, shards, threads, webhooks, workload
+from projects.manager import ProjectNameTaken
+from projects.routers import database_for
+from projects.signals import publish_change, record_change, record_changes
+from projects.permissions import BASIC_ROLES, ROLES, CommentPermissions, ProjectPermissions, can, get_membership
+from softdesk.budgets import query_budget
 from users.models import CustomUser
-from .models import Contributor, CustomProject, Issue, Comment
-from .serializers import CommentSerializer, ContributorSerializer, CustomProjectSerializer, IssueSerializer
-from rest_framework.permissions import IsAuthenticated
+from .models import Attachment, Change, Contributor, CustomProject, Issue, IssueChange, Comment, Job, Notification, Webhook
+from .serializers import CHANGE_SERIALIZERS, AttachmentSerializer, CommentListSerializer, CommentSerializer, ContributorSerializer, CustomProjectSerializer, IssueListSerializer, IssueSerializer, JobSerializer, NotificationSerializer, WebhookSerializer, WorkloadSerializer, serialize_changes
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,11 +40,14 @@ class ProjectAPIView(APIView):
         - ProjectPermissions: Custom project-level permissions
     """
     permission_classes = [IsAuthenticated, ProjectPermissions]
+    # URL kwarg holding the project ID, read by the ProjectRoutingMiddleware.
+    project_url_kwarg = 'pk'
     
     
     def get_object(self, pk):
         """
-        Retrieve a CustomProject instance by primary key.
+        Retrieve a CustomProject instance by primary key and check the object permissions
+        of the request on it (owners only for updates and deletions).
 
         Args:
             pk: The primary key of the CustomProject to retrieve.
@@ -36,13 +55,18 @@ class ProjectAPIView(APIView):
             CustomProject: The CustomProject instance with the specified primary key.
         Raises:
             Http404: If no CustomProject with the given primary key exists.
+            PermissionDenied: If the user may not perform the request on the project.
         """
         try:
-            return CustomProject.objects.get(pk=pk)
+            project = CustomProject.objects.get(pk=pk)
         except CustomProject.DoesNotExist:
             raise Http404
+        self.check_object_permissions(self.request, project)
+        return project
     
     
+    # The list reads a page from every shard.
+    @query_budget(2, per_database=1)
     def get(self, request, pk=None):
         """
         Retrieve a single project or list all projects.
@@ -51,10 +75,15 @@ class ProjectAPIView(APIView):
             request: The HTTP request object.
             pk (int, optional): Primary key of the project to retrieve. 
                                If None, returns all projects.
+        Query Parameters:
+            archived (str, optional): 'true' to list the archived projects instead.
+            after (int, optional): List the projects with a greater ID (keyset pagination).
+            limit (int, optional): Maximum number of projects listed.
         Returns:
             Response: JSON response containing either:
                 - Single project data when pk is provided
-                - List of all projects when pk is None
+                - List of the projects of every shard, ordered by ID, when pk is None
+                - 400 Bad Request if the after cursor or the limit is invalid
         Raises:
             Http404: When project with given pk does not exist.
         """
@@ -62,11 +91,21 @@ class ProjectAPIView(APIView):
             project = self.get_object(pk)
             serializer = CustomProjectSerializer(project)
             return Response(serializer.data)
-        projects = CustomProject.objects.all()
+        try:
+            after = int(request.query_params['after']) if 'after' in request.query_params else None
+            limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+        except ValueError:
+            return Response({"error": "Invalid after cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('archived') == 'true':
+            projects = CustomProject.all_objects.filter(deleted_time__isnull=True, archived_time__isnull=False)
+        else:
+            projects = CustomProject.objects.all()
+        projects = shards.merge_pages(projects, after, max(1, limit) if limit is not None else None)
         serializer = CustomProjectSerializer(projects, many=True)
         return Response(serializer.data)
     
     
+    @query_budget(11)
     def post(self, request):
         """
         Create a new project with the authenticated user as the author.
@@ -78,19 +117,20 @@ class ProjectAPIView(APIView):
             request: HTTP request object containing project data and authenticated user  
         Returns:
             Response: JSON response with created project data and 201 status on success,
-                     or validation errors with 400 status on failure     
+                     validation errors with 400 status on failure, or 409 status if
+                     the name is already taken
         """
-        data = request.data.copy()
-        data["author"] = request.user
-        serializer = CustomProjectSerializer(data=data)
-        print('serializer', serializer)
-        if serializer.is_valid():
-            project = serializer.save(author=data["author"])
-            Contributor.objects.create(user=request.user, project=project)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CustomProjectSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project = CustomProject.objects.create_project(author=request.user, **serializer.validated_data)
+        except IntegrityError:
+            return Response({"error": "A project with this name already exists."}, status=status.HTTP_409_CONFLICT)
+        return Response(CustomProjectSerializer(project).data, status=status.HTTP_201_CREATED)
     
     
+    @query_budget(8)
     def put(self, request, pk):
         """
         Update an existing project with provided data.
@@ -100,33 +140,112 @@ class ProjectAPIView(APIView):
             pk: Primary key of the project to be updated
         Returns:
             Response: JSON response containing the updated project data if successful,
-                     or validation errors with 400 status code if data is invalid
+                     validation errors with 400 status code if data is invalid, or
+                     409 status code if the new name is already taken
         Raises:
             Http404: If project with given pk does not exist
         """
         project = self.get_object(pk)
         serializer = CustomProjectSerializer(project, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with partitions.atomic():
+                serializer.save()
+        except IntegrityError:
+            return Response({"error": "A project with this name already exists."}, status=status.HTTP_409_CONFLICT)
+        return Response(serializer.data)
     
     
     def delete(self, request, pk):
         """
         Delete a project instance.
 
+        The project is hidden at once and its data is purged in the background
+        in bounded batches; the returned job can be polled for progress.
+
         Args:
             request: The HTTP request object.
             pk: Primary key of the project to be deleted.
         Returns:
-            Response: HTTP 204 No Content status upon successful deletion.
+            Response: HTTP 202 Accepted with the purge job data.
         Raises:
             Http404: If the project with the given pk does not exist.
         """
         project = self.get_object(pk)
-        project.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        job = jobs.soft_delete(project, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+def get_role(request, project_id):
+    """
+    Read the role given to the contributors added by a request, and check that the
+    user may add contributors with it.
+
+    Returns:
+        tuple: (role, None), or (None, error Response) if the role is invalid (400)
+               or not allowed to the user (403).
+    """
+    role = request.data.get('role', 'MEMBER')
+    if role not in ROLES:
+        return None, Response({"error": f"Role must be one of {', '.join(ROLES)}."},
+                              status=status.HTTP_400_BAD_REQUEST)
+    membership = get_membership(request, project_id)
+    if not can(membership, 'manage_contributors'):
+        return None, Response({"error": "Only the project maintainers can add contributors."},
+                              status=status.HTTP_403_FORBIDDEN)
+    if role not in BASIC_ROLES and not can(membership, 'manage_roles'):
+        return None, Response({"error": "Only the project owners can grant this role."},
+                              status=status.HTTP_403_FORBIDDEN)
+    return role, None
+
+
+class ProjectImportAPIView(APIView):
+    """
+    API view creating many projects at once, with the caller as their author.
+    Endpoint:
+        POST /projects/import/
+    Permissions:
+        - IsAuthenticated: User must be logged in
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Create a list of projects in one transaction, all or none.
+
+        Request Data:
+            projects (list): Objects with the ``name``, ``description`` and ``type`` of
+                each project, at most ``PROJECT_IMPORT_MAX_SIZE`` of them.
+        Returns:
+            Response: JSON response with one of the following:
+                - 201: The created projects, in the order given
+                - 400: Missing, oversized or invalid list, or duplicate names in it
+                - 409: Names already taken, listed under ``names``
+        """
+        rows = request.data.get('projects')
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "A non-empty 'projects' list is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.PROJECT_IMPORT_MAX_SIZE:
+            return Response({"error": f"At most {settings.PROJECT_IMPORT_MAX_SIZE} projects can be imported at once."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = CustomProjectSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        names = [row['name'] for row in serializer.validated_data]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            return Response({"error": "Project names must be unique.", "names": duplicates},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            projects = CustomProject.objects.create_projects(serializer.validated_data, request.user)
+        except ProjectNameTaken as error:
+            return Response({"error": "Project names already taken.", "names": error.names},
+                            status=status.HTTP_409_CONFLICT)
+        except IntegrityError:
+            return Response({"error": "A project with one of these names was created meanwhile."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(CustomProjectSerializer(projects, many=True).data, status=status.HTTP_201_CREATED)
 
 
 class ProjectContributorsView(APIView):
@@ -135,16 +254,19 @@ class ProjectContributorsView(APIView):
     This view handles CRUD operations for contributors within a project:
     - GET: Retrieve a specific contributor or list all contributors for a project
     - POST: Add a new contributor to a project by username
-    - DELETE: Remove a contributor from a project (author only)
+    - PATCH: Change the role of a contributor (owners only)
+    - DELETE: Remove a contributor from a project (maintainers and owners)
     The view supports both individual contributor operations (when user_id is provided)
     and bulk operations on all contributors for a project.
     Permissions:
         - IsAuthenticated: Only authenticated users can access this view
-        - Project author: Only project authors can delete contributors
+        - Maintainers and owners can add and remove contributors; only owners can
+          grant the maintainer and owner roles, or remove an owner
     URL Patterns:
         - GET /projects/{project_id}/contributors/ - List all contributors
         - GET /projects/{project_id}/contributors/{user_id}/ - Get specific contributor
         - POST /projects/{project_id}/contributors/ - Add new contributor
+        - PATCH /projects/{project_id}/contributors/{user_id}/ - Change the role of a contributor
         - DELETE /projects/{project_id}/contributors/{user_id}/ - Remove contributor
     """
     permission_classes = [IsAuthenticated]
@@ -180,6 +302,7 @@ class ProjectContributorsView(APIView):
             return Contributor.objects.filter(project=project)
 
 
+    @query_budget(3)
     def get(self, request, project_id, user_id=None):
         """
         Retrieve contributor(s) for a specific project.
@@ -215,10 +338,12 @@ class ProjectContributorsView(APIView):
             project_id (int): ID of the project to add the contributor to
         Request Data:
             username (str): Username of the user to add as contributor
+            role (str, optional): Role of the new contributor, 'MEMBER' by default
         Returns:
             Response: JSON response with one of the following:
                 - 201: Successfully created contributor with serialized data
-                - 400: Bad request if username missing or user already contributor
+                - 400: Bad request if username missing, role invalid or user already contributor
+                - 403: The requesting user may not add contributors with this role
                 - 404: Not found if project or user doesn't exist
         Raises:
             Http404: If project with given ID doesn't exist
@@ -227,6 +352,9 @@ class ProjectContributorsView(APIView):
         username_to_add = request.data.get("username")
         if not username_to_add:
             return Response({"error": "Username to add is required."}, status=status.HTTP_400_BAD_REQUEST)
+        role, error = get_role(request, project.pk)
+        if error is not None:
+            return error
         
         try:
             user_to_add = CustomUser.objects.get(username=username_to_add)
@@ -236,39 +364,203 @@ class ProjectContributorsView(APIView):
         if Contributor.objects.filter(user=user_to_add, project=project).exists():
             return Response({"error": "User is already a contributor to this project"}, status=status.HTTP_400_BAD_REQUEST)
 
-        contributor = Contributor(user=user_to_add, project=project)
+        contributor = Contributor(user=user_to_add, project=project, role=role)
         contributor.save()
 
         serializer = ContributorSerializer(contributor)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+    def patch(self, request, project_id, user_id):
+        """
+        Change the role of a contributor.
+        Only the project owners can change roles.
+        Args:
+            request: HTTP request object containing the new role
+            project_id (int): ID of the project
+            user_id (int): ID of the contributing user
+        Request Data:
+            role (str): The new role: 'OWNER', 'MAINTAINER', 'MEMBER' or 'VIEWER'
+        Returns:
+            Response: JSON response with one of the following:
+                - 200: The updated contributor
+                - 400: Missing or invalid role
+                - 403: The requesting user is not a project owner
+                - 404: Not found if the project or contributor doesn't exist
+        """
+        if not can(get_membership(request, project_id), 'manage_roles'):
+            return Response({"error": "Only the project owners can change roles."}, status=status.HTTP_403_FORBIDDEN)
+        if request.data.get('role') not in ROLES:
+            return Response({"error": f"Role must be one of {', '.join(ROLES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        contributor = self.get_object(project_id, user_id)
+        contributor.role = request.data['role']
+        contributor.save(update_fields=['role'])
+        return Response(ContributorSerializer(contributor).data)
     
     
     def delete(self, request, project_id, user_id):
         """
         Remove a contributor from a project.
-        This method allows the project author to remove a contributor from their project.
-        Only the author of the project has permission to remove contributors.
+        This method allows the project maintainers and owners to remove a contributor
+        from the project; only owners can remove another owner.
         Args:
             request: The HTTP request object containing user authentication data.
             project_id (int): The unique identifier of the project.
             user_id (int): The unique identifier of the user to be removed as contributor.
         Returns:
             Response: HTTP 204 No Content on successful deletion.
-            Response: HTTP 403 Forbidden if the requesting user is not the project author.
+            Response: HTTP 403 Forbidden if the requesting user may not remove this contributor.
             Response: HTTP 404 Not Found if the project or contributor doesn't exist.
         Raises:
             Http404: If the project with the given project_id doesn't exist.
         """
-        project = get_object_or_404(CustomProject, id=project_id)
-        
-        if project.author != request.user:
-            return Response({"error": "Only the author of the project can remove contributors."}, status=status.HTTP_403_FORBIDDEN)
+        membership = get_membership(request, project_id)
+        if not can(membership, 'manage_contributors'):
+            return Response({"error": "Only the project maintainers can remove contributors."}, status=status.HTTP_403_FORBIDDEN)
 
         contributor = self.get_object(project_id, user_id)
+        if contributor.role == 'OWNER' and not can(membership, 'manage_roles'):
+            return Response({"error": "Only the project owners can remove an owner."}, status=status.HTTP_403_FORBIDDEN)
         contributor.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ProjectContributorsBulkView(APIView):
+    """
+    API view adding or removing many contributors of a project at once, by username.
+    Endpoints:
+        POST /projects/{project_id}/contributors/bulk/ - Add contributors
+        DELETE /projects/{project_id}/contributors/bulk/ - Remove contributors
+    Permissions:
+        - IsAuthenticated: Only authenticated users can access this view
+        - Maintainers and owners can add and remove contributors; only owners can
+          grant the maintainer and owner roles, or remove an owner
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_usernames(self, request):
+        """
+        Read the list of usernames of the request, without duplicates.
+
+        Returns:
+            tuple: (list of usernames, None) or (None, 400 Response) if the list is invalid.
+        """
+        usernames = request.data.get('usernames')
+        if (not isinstance(usernames, list) or not usernames
+                or not all(isinstance(username, str) and username for username in usernames)):
+            return None, Response({"error": "A non-empty 'usernames' list is required."},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        if len(usernames) > settings.CONTRIBUTORS_BULK_MAX_SIZE:
+            return None, Response(
+                {"error": f"At most {settings.CONTRIBUTORS_BULK_MAX_SIZE} usernames can be sent at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return list(dict.fromkeys(usernames)), None
+
+    def post(self, request, project_id):
+        """
+        Add users to a project as contributors.
+        The users are resolved with one query, current members are skipped with
+        another, and the others are inserted at once; the whole addition is one
+        transaction.
+
+        Request Data:
+            usernames (list): Usernames of the users to add.
+            role (str, optional): Role of the new contributors, 'MEMBER' by default.
+        Returns:
+            Response: JSON response with one of the following:
+                - 200: One result per username, with a ``status`` of 'added' (and the
+                  new ``contributor``), 'already_contributor' or 'not_found'
+                - 400: Missing or oversized username list, or invalid role
+                - 403: The requesting user may not add contributors with this role
+                - 404: Project not found
+        """
+        project = get_object_or_404(CustomProject, id=project_id)
+        role, error = get_role(request, project.pk)
+        if error is None:
+            usernames, error = self.get_usernames(request)
+        if error is not None:
+            return error
+
+        users = dict(CustomUser.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        with partitions.atomic():
+            members = set(Contributor.objects.filter(project=project, user_id__in=users.values())
+                          .values_list('user_id', flat=True))
+            new_ids = [user_id for user_id in users.values() if user_id not in members]
+            added = {}
+            if new_ids:
+                # Members added concurrently are skipped by the unique constraint; the rows
+                # are read back for their IDs, which ignore_conflicts inserts do not return.
+                Contributor.objects.bulk_create(
+                    [Contributor(user_id=user_id, project=project, role=role) for user_id in new_ids],
+                    ignore_conflicts=True,
+                )
+                added = {contributor.user_id: contributor for contributor in
+                         Contributor.objects.filter(project=project, user_id__in=new_ids)}
+                partitions.mirror_created(added.values())
+                for change in record_changes(list(added.values()), 'CREATE'):
+                    publish_change(change)
+
+        results = []
+        for username in usernames:
+            user_id = users.get(username)
+            if user_id is None:
+                results.append({"username": username, "status": "not_found"})
+            elif user_id in added:
+                results.append({"username": username, "status": "added",
+                                "contributor": ContributorSerializer(added[user_id]).data})
+            else:
+                results.append({"username": username, "status": "already_contributor"})
+        return Response({"results": results})
+
+    def delete(self, request, project_id):
+        """
+        Remove contributors from a project.
+        The users are resolved with one query and their memberships deleted with one
+        ORM deletion, which journals and mirrors each removed row; issues assigned
+        to them are deleted along, as for a single removal.
+
+        Request Data:
+            usernames (list): Usernames of the contributors to remove.
+        Returns:
+            Response: JSON response with one of the following:
+                - 200: One result per username, with a ``status`` of 'removed',
+                  'not_contributor', 'not_found' or 'forbidden' (an owner, for
+                  maintainers)
+                - 400: Missing or oversized username list
+                - 403: The requesting user may not remove contributors
+                - 404: Project not found
+        """
+        project = get_object_or_404(CustomProject, id=project_id)
+        membership = get_membership(request, project.pk)
+        if not can(membership, 'manage_contributors'):
+            return Response({"error": "Only the project maintainers can remove contributors."},
+                            status=status.HTTP_403_FORBIDDEN)
+        usernames, error = self.get_usernames(request)
+        if error is not None:
+            return error
+
+        users = dict(CustomUser.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        with partitions.atomic():
+            contributors = Contributor.objects.filter(project=project, user_id__in=users.values())
+            roles = dict(contributors.values_list('user_id', 'role'))
+            kept = {user_id for user_id, role in roles.items() if role == 'OWNER' and not can(membership, 'manage_roles')}
+            if len(kept) < len(roles):
+                contributors.exclude(user_id__in=kept).delete()
+
+        results = []
+        for username in usernames:
+            user_id = users.get(username)
+            if user_id is None:
+                result = "not_found"
+            elif user_id not in roles:
+                result = "not_contributor"
+            else:
+                result = "forbidden" if user_id in kept else "removed"
+            results.append({"username": username, "status": result})
+        return Response({"results": results})
+
+
 class ProjectIssueAPIView(APIView):
     """
     API view for managing issues within projects.
@@ -278,13 +570,13 @@ class ProjectIssueAPIView(APIView):
         GET /projects/{project_id}/issues/ - List all issues for a project
         GET /projects/{project_id}/issues/{issue_id}/ - Retrieve a specific issue
         POST /projects/{project_id}/issues/ - Create a new issue (contributors only)
-        PUT /projects/{project_id}/issues/{issue_id}/ - Update an issue (creator or project author only)
-        DELETE /projects/{project_id}/issues/{issue_id}/ - Delete an issue (creator or project author only)
+        PUT /projects/{project_id}/issues/{issue_id}/ - Update an issue (creator or project maintainer only)
+        DELETE /projects/{project_id}/issues/{issue_id}/ - Delete an issue (creator or project maintainer only)
     Permissions:
         - User must be authenticated
         - User must have project permissions
         - POST: User must be a contributor of the project
-        - PUT/DELETE: User must be the issue creator or project author
+        - PUT/DELETE: User must be the issue creator or a project maintainer
     """
     permission_classes = [IsAuthenticated, ProjectPermissions]
 
@@ -302,16 +594,19 @@ class ProjectIssueAPIView(APIView):
                 - If issue_id is provided: Returns the specific Issue object
                 - If issue_id is None: Returns a QuerySet of all Issue objects for the project
         Raises:
-            Http404: If the project with the given project_id doesn't exist, or if 
+            Http404: If the project with the given project_id doesn't exist, or if
                     the issue with the given issue_id doesn't exist in the specified project.
         """
-        project = get_object_or_404(CustomProject, id=project_id)
+        # ProjectPermissions loaded the membership; it tells whether the project is active.
+        if not get_membership(self.request, project_id).project_active:
+            raise Http404
         if issue_id:
-            return get_object_or_404(Issue, id=issue_id, project=project)
+            return get_object_or_404(Issue, id=issue_id, project_id=project_id)
         else:
-            return Issue.objects.filter(project=project)
+            return Issue.objects.filter(project_id=project_id).defer('description')
 
 
+    @query_budget(3)
     def get(self, request, project_id, issue_id=None):
         """
         Retrieve issue(s) for a specific project.
@@ -323,7 +618,8 @@ class ProjectIssueAPIView(APIView):
         Returns:
             Response: JSON response containing either:
                 - Single issue data if issue_id is provided
-                - List of all issues for the project if issue_id is None
+                - List of all issues for the project if issue_id is None, with the
+                  ``excerpt`` of their description instead of the full text
         Raises:
             Http404: If the project or issue does not exist
         """
@@ -333,9 +629,11 @@ class ProjectIssueAPIView(APIView):
             return Response(serializer.data)
         else:
             issues = self.get_object(project_id)
-            serializer = IssueSerializer(issues, many=True)
+            serializer = IssueListSerializer(issues, many=True)
             return Response(serializer.data)
 
+    # An automatic assignment creates the missing workload counters, then locks the lightest.
+    @query_budget(13)
     def post(self, request, project_id):
         """
         Create a new issue for a specific project.
@@ -347,13 +645,14 @@ class ProjectIssueAPIView(APIView):
         Returns:
             Response: 
                 - 201 CREATED with serialized issue data if successful
-                - 403 FORBIDDEN if user is not a contributor
+                - 403 FORBIDDEN if user may not create issues (not a contributor, or a viewer)
                 - 400 BAD REQUEST if serializer validation fails
         Raises:
             Http404: If project or assigned user doesn't exist
         """
         project = get_object_or_404(CustomProject, id=project_id)
-        if not Contributor.objects.filter(user=request.user, project=project).exists():
+        membership = get_membership(request, project.pk)
+        if not can(membership, 'create_issue'):
             return Response({"error": "You must be a contributor of the project to create an issue."},
                             status=status.HTTP_403_FORBIDDEN)
 
@@ -361,8 +660,7 @@ class ProjectIssueAPIView(APIView):
         
         if serializer.is_valid():
             # The authenticated user becomes the author of the issue
-            author_contributor = Contributor.objects.get(user=request.user, project=project)
-            serializer.validated_data['author'] = author_contributor
+            serializer.validated_data['author_id'] = membership.contributor_id
             serializer.validated_data['project'] = project
             
             # Check if a specific contributor is assigned
@@ -375,17 +673,32 @@ class ProjectIssueAPIView(APIView):
             # If no contributor is assigned, leave the field empty (None)
             # The issue can remain unassigned
             
-            serializer.save()
+            # Notifications are written to the outbox in the same transaction
+            # and sent by the drain_outbox worker, off the request path. The workload
+            # counters are updated in it too; an automatic assignment holds the lock of
+            # the counter it read until the new issue is counted.
+            with partitions.atomic():
+                if serializer.validated_data.pop('auto_assign', False):
+                    assignee = workload.pick(project.pk)
+                    if assignee is None:
+                        return Response({"error": "No contributor of the project can be assigned issues."},
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    serializer.validated_data.pop('user', None)
+                    serializer.validated_data['user_id'] = assignee
+                issue = serializer.save()
+                workload.issue_saved(issue)
+                outbox.issue_created(issue, request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
     
+    @query_budget(11)
     def put(self, request, project_id, issue_id):
         """
         Update an existing issue within a project.
         This method allows updating an issue if the requesting user is either:
-        - The creator of the issue, or
-        - The author of the project containing the issue
+        - The creator or assignee of the issue, or
+        - A maintainer or owner of the project containing the issue
         Args:
             request: The HTTP request object containing the updated issue data
             project_id (int): The ID of the project containing the issue
@@ -399,46 +712,210 @@ class ProjectIssueAPIView(APIView):
         Raises:
             Http404: If the specified project or issue cannot be found
         """
-        project = get_object_or_404(CustomProject, id=project_id)
-        issue = get_object_or_404(Issue, id=issue_id, project=project)
+        # Deleted and archived projects are hidden, their issues with them.
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        issue = get_object_or_404(Issue, id=issue_id, project_id=project_id)
 
-        if request.user == issue.user.user or request.user == project.author:
+        if can(get_membership(request, project_id), 'change_issue', issue):
             serializer = IssueSerializer(issue, data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                before = history.snapshot(issue)
+                with partitions.atomic():
+                    serializer.save()
+                    workload.issue_saved(issue, before)
+                    history.record(issue, before, request.user)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         else:
-            return Response({"error": "Only the issue creator or project author can modify this issue."}, status=status.HTTP_403_FORBIDDEN)
+            return Response({"error": "Only the issue creator or a project maintainer can modify this issue."}, status=status.HTTP_403_FORBIDDEN)
 
 
+    @query_budget(10)
     def delete(self, request, project_id, issue_id):
         """
         Delete a specific issue from a project.
         This method allows the deletion of an issue by either the issue creator
-        or the project author. Only authorized users can perform this operation.
+        or a project maintainer. Only authorized users can perform this operation.
         Args:
             request: The HTTP request object containing user authentication data.
             project_id (int): The unique identifier of the project containing the issue.
             issue_id (int): The unique identifier of the issue to be deleted.
+        The issue is hidden at once and its comments and history are purged in the
+        background; the returned job can be polled for progress.
         Returns:
-            Response: HTTP 204 No Content on successful deletion.
+            Response: HTTP 202 Accepted with the purge job data on successful deletion.
             Response: HTTP 403 Forbidden if user lacks permission to delete the issue.
             Response: HTTP 404 Not Found if project or issue doesn't exist.
         Raises:
             Http404: When the specified project or issue is not found.
         Permissions:
-            - Issue creator can delete their own issue
-            - Project author can delete any issue within their project
+            - Issue creator or assignee can delete their own issue
+            - Project maintainers and owners can delete any issue within their project
         """
-        project = get_object_or_404(CustomProject, id=project_id)
-        issue = get_object_or_404(Issue, id=issue_id, project=project)
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
         
-        if issue.user.user != request.user and project.author != request.user:
-            return Response({"error": "Only the issue creator or project author can delete this issue."}, status=status.HTTP_403_FORBIDDEN)
+        if not can(get_membership(request, project_id), 'delete_issue', issue):
+            return Response({"error": "Only the issue creator or a project maintainer can delete this issue."}, status=status.HTTP_403_FORBIDDEN)
         
-        issue.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        job = jobs.soft_delete(issue, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class IssueHistoryAPIView(APIView):
+    """
+    API view exposing the change history of an issue, most recent first.
+    The timeline is keyset paginated on the change id, so every page costs one
+    index range scan whatever its depth.
+    Endpoints:
+        GET /projects/{project_id}/issues/{issue_id}/history/ - First page of the history
+        GET /projects/{project_id}/issues/{issue_id}/history/?before={cursor} - Following page
+    Query Parameters:
+        before (int, optional): The ``next`` cursor returned by the previous page.
+        limit (int, optional): Page size, capped by ``HISTORY_MAX_PAGE_SIZE``.
+    Permissions:
+        - User must be authenticated
+        - User must be a contributor of the project
+    """
+    permission_classes = [IsAuthenticated, ProjectPermissions]
+
+    @query_budget(4)
+    def get(self, request, project_id, issue_id):
+        """
+        Return one page of the changes of an issue.
+
+        Returns:
+            Response: JSON response with the ``results`` of the page, each holding the
+                     changed fields as ``{field: [old, new]}``, and the ``next`` cursor
+                     (None on the last page), or 400 if the parameters are invalid.
+        Raises:
+            Http404: If the project or issue does not exist
+        """
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            limit = int(request.query_params.get('limit', settings.HISTORY_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "Invalid before cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.HISTORY_MAX_PAGE_SIZE))
+
+        changes = IssueChange.objects.filter(issue=issue)
+        if before is not None:
+            changes = changes.filter(id__lt=before)
+        page = list(changes.order_by('-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        results = [{
+            "id": change.id,
+            "actor": change.actor_id,
+            "created_time": change.created_time,
+            "changes": history.decode(change.diff),
+        } for change in page]
+        return Response({"results": results, "next": page[-1].id if has_more else None})
+
+
+class IssueStatsAPIView(APIView):
+    """
+    API view aggregating the issue history of a project over a time window.
+    Both aggregates are computed from the status column of the history log, which is
+    indexed by project, status and time.
+    Endpoints:
+        GET /projects/{project_id}/issues/stats/?days={n} - Aggregates of the last n days (default 30)
+    Returns:
+        throughput: Number of issues moved to FINISHED per day.
+        cycle_time: Count, mean and median hours between the first move of an issue to
+                    IN_PROGRESS and its move to FINISHED, for the issues finished in the window.
+    Permissions:
+        - User must be authenticated
+        - User must be a contributor of the project
+    """
+    permission_classes = [IsAuthenticated, ProjectPermissions]
+
+    @query_budget(5)
+    def get(self, request, project_id):
+        get_object_or_404(CustomProject, id=project_id)
+        try:
+            days = max(1, min(int(request.query_params.get('days', 30)), 365))
+        except ValueError:
+            return Response({"error": "Invalid days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        finished = IssueChange.objects.filter(
+            project_id=project_id, status='FINISHED', created_time__gte=timezone.now() - timedelta(days=days)
+        )
+        throughput = (
+            finished.annotate(day=TruncDate('created_time')).values('day')
+            .annotate(count=Count('id')).order_by('day')
+        )
+        started = IssueChange.objects.filter(
+            issue=OuterRef('issue'), status='IN_PROGRESS', id__lt=OuterRef('id')
+        ).order_by('id').values('created_time')[:1]
+        durations = [
+            (finished_time - started_time).total_seconds() / 3600
+            for finished_time, started_time in finished.annotate(started=Subquery(started))
+            .values_list('created_time', 'started') if started_time is not None
+        ]
+
+        return Response({
+            "days": days,
+            "throughput": [{"day": row['day'], "count": row['count']} for row in throughput],
+            "cycle_time": {
+                "count": len(durations),
+                "mean_hours": statistics.fmean(durations) if durations else None,
+                "median_hours": statistics.median(durations) if durations else None,
+            },
+        })
+
+
+class ProjectWorkloadAPIView(APIView):
+    """
+    API view of the workload of the contributors of a project, read from the counters
+    kept up to date by every issue write, and of its rebalancing.
+    Endpoints:
+        GET /projects/{project_id}/workload/ - Contributors from the least to the most loaded
+        POST /projects/{project_id}/workload/rebalance/ - Reassign open issues to even out the workloads
+    Permissions:
+        - User must be authenticated
+        - User must be a contributor of the project
+        - POST: User must be a project maintainer or owner
+    """
+    permission_classes = [IsAuthenticated, ProjectPermissions]
+
+    @query_budget(3)
+    def get(self, request, project_id):
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        alias = database_for('projects.workload', project_id)
+        contributors = (
+            Contributor.objects.using(alias).filter(project_id=project_id)
+            .annotate(open_issues=Coalesce('workload__open_issues', 0), weight=Coalesce('workload__weight', 0))
+            .order_by('weight', 'pk')
+        )
+        return Response(WorkloadSerializer(contributors, many=True).data)
+
+    @query_budget(12)
+    def post(self, request, project_id):
+        """
+        Reassign the open issues of a project so the workloads of its contributors even out.
+        Returns:
+            Response:
+                - 200 OK with the reassigned issues
+                - 403 FORBIDDEN if the user is not a maintainer or owner of the project
+                - 404 NOT FOUND if the project is deleted or archived
+        """
+        membership = get_membership(request, project_id)
+        if not can(membership, 'change_issue'):
+            return Response({"error": "Only a project maintainer can rebalance the workload."},
+                            status=status.HTTP_403_FORBIDDEN)
+        if not membership.project_active:
+            raise Http404
+        with partitions.atomic():
+            issues = workload.rebalance(project_id, request.user)
+        return Response(IssueListSerializer(issues, many=True).data)
 
 
 class ProjectCommentAPIView(APIView):
@@ -449,16 +926,27 @@ class ProjectCommentAPIView(APIView):
     
     Endpoints:
         GET /projects/{project_id}/issues/{issue_id}/comments/ - List all comments for an issue
+        GET /projects/{project_id}/issues/{issue_id}/comments/?threads=true - One page of threads
         GET /projects/{project_id}/issues/{issue_id}/comments/{uuid}/ - Retrieve a specific comment
+        GET /projects/{project_id}/issues/{issue_id}/comments/{uuid}/?thread=true - A comment with all of its replies
         POST /projects/{project_id}/issues/{issue_id}/comments/ - Create a new comment (contributors only)
         PUT /projects/{project_id}/issues/{issue_id}/comments/{uuid}/ - Update a comment (author only)
-        DELETE /projects/{project_id}/issues/{issue_id}/comments/{uuid}/ - Delete a comment (author only)
+        DELETE /projects/{project_id}/issues/{issue_id}/comments/{uuid}/ - Delete a comment (author or maintainer only)
+
+    Query Parameters (threads page):
+        after (int, optional): ID of the last top-level comment of the previous page.
+        limit (int, optional): Threads per page, capped by ``COMMENT_THREAD_MAX_PAGE_SIZE``.
+    A thread is a top-level comment with its ``reply_count`` and its first
+    ``COMMENT_THREAD_REPLIES`` replies in thread order (depth-first, each reply giving
+    its ``parent`` and ``depth``). Replies are loaded with one query per page whatever
+    the size of the threads.
     
     Permissions:
         - User must be authenticated
         - User must be a contributor of the project
         - POST: Any project contributor can create comments
-        - PUT/DELETE: Only the comment author can modify/delete their comments
+        - PUT: Only the comment author can modify their comments
+        - DELETE: The comment author or a project maintainer can delete a comment
     """
     permission_classes = [IsAuthenticated, CommentPermissions]
 
@@ -477,15 +965,21 @@ class ProjectCommentAPIView(APIView):
                 - If uuid is None: Returns a QuerySet of all Comment objects for the issue
         Raises:
             Http404: If the project, issue, or comment with the given IDs doesn't exist.
+        Note:
+            The state of the project comes from the membership loaded by the permission
+            check, so the project itself is not queried.
         """
-        project = get_object_or_404(CustomProject, id=project_id)
-        issue = get_object_or_404(Issue, id=issue_id, project=project)
+        membership = get_membership(self.request, project_id)
+        if membership is None or not membership.project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
         
         if uuid:
             return get_object_or_404(Comment, uuid=uuid, issue=issue)
         else:
-            return Comment.objects.filter(issue=issue)
+            return Comment.objects.filter(issue=issue).defer('description')
 
+    @query_budget(5)
     def get(self, request, project_id, issue_id, uuid=None):
         """
         Retrieve comment(s) for a specific issue within a project.
@@ -497,20 +991,50 @@ class ProjectCommentAPIView(APIView):
             uuid (optional): UUID of a specific comment to retrieve
         Returns:
             Response: JSON response containing either:
-                - Single comment data if uuid is provided
-                - List of all comments for the issue if uuid is None
+                - Single comment data if uuid is provided, with all of its replies when
+                  ``thread`` is set
+                - One page of threads (``results`` and ``next`` cursor) if ``threads`` is set
+                - List of all comments for the issue otherwise
+                Lists and thread pages send the ``excerpt`` of each comment instead of
+                its description; single comments and whole threads send the full text.
+                - 400 if the page parameters are invalid
         Raises:
             Http404: If the project, issue, or comment does not exist
         """
         if uuid:
             comment = self.get_object(project_id, issue_id, uuid)
+            if request.query_params.get('thread') == 'true':
+                root, *replies = threads.subtree(comment)
+                return Response(serialize_thread(root, len(replies), replies))
             serializer = CommentSerializer(comment)
             return Response(serializer.data)
+        elif request.query_params.get('threads') == 'true':
+            return self.get_threads(request, project_id, issue_id)
         else:
             comments = self.get_object(project_id, issue_id)
-            serializer = CommentSerializer(comments, many=True)
+            serializer = CommentListSerializer(comments, many=True)
             return Response(serializer.data)
 
+    def get_threads(self, request, project_id, issue_id):
+        """Return one page of the threads of an issue, each with its first replies."""
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
+        try:
+            after = int(request.query_params['after']) if 'after' in request.query_params else None
+            limit = int(request.query_params.get('limit', settings.COMMENT_THREAD_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "Invalid after cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.COMMENT_THREAD_MAX_PAGE_SIZE))
+
+        page = threads.top_level_page(issue, after, limit + 1)
+        has_more = len(page) > limit
+        page = page[:limit]
+        replies = threads.first_replies(issue, page, settings.COMMENT_THREAD_REPLIES)
+        results = [serialize_thread(root, *replies[root.pk], CommentListSerializer) for root in page]
+        return Response({"results": results, "next": page[-1].pk if has_more else None})
+
+    @query_budget(10)
     def post(self, request, project_id, issue_id):
         """
         Create a new comment for a specific issue within a project.
@@ -524,22 +1048,28 @@ class ProjectCommentAPIView(APIView):
         Returns:
             Response: 
                 - 201 CREATED with serialized comment data if successful
-                - 403 FORBIDDEN if user is not a contributor
+                - 403 FORBIDDEN if user may not comment (not a contributor, or a viewer)
                 - 400 BAD REQUEST if serializer validation fails
         Raises:
             Http404: If project or issue doesn't exist
         """
-        project = get_object_or_404(CustomProject, id=project_id)
-        issue = get_object_or_404(Issue, id=issue_id, project=project)
-        
-        if not Contributor.objects.filter(user=request.user, project=project).exists():
+        # The membership tells whether the project is live: no query of the project, so a
+        # reply (whose parent the serializer loads) stays within the budget.
+        membership = get_membership(request, project_id)
+        if membership is None or not membership.project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
+
+        if not can(membership, 'create_comment'):
             return Response({"error": "You must be a contributor of the project to create a comment."},
                             status=status.HTTP_403_FORBIDDEN)
 
         serializer = CommentSerializer(data=request.data, context={'request': request, 'issue': issue})
         
         if serializer.is_valid():
-            serializer.save(author=request.user, issue=issue)
+            with partitions.atomic():
+                comment = serializer.save(author=request.user, issue=issue)
+                outbox.comment_created(comment, request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -564,7 +1094,7 @@ class ProjectCommentAPIView(APIView):
         """
         comment = self.get_object(project_id, issue_id, uuid)
 
-        if request.user != comment.author:
+        if not can(get_membership(request, project_id), 'change_comment', comment):
             return Response({"error": "Only the comment author can modify this comment."}, 
                           status=status.HTTP_403_FORBIDDEN)
 
@@ -577,7 +1107,8 @@ class ProjectCommentAPIView(APIView):
     def delete(self, request, project_id, issue_id, uuid):
         """
         Delete a specific comment from an issue.
-        This method allows the deletion of a comment only by the comment author.
+        This method allows the deletion of a comment by its author or by a project
+        maintainer moderating the discussion.
         
         Args:
             request: The HTTP request object containing user authentication data.
@@ -586,18 +1117,396 @@ class ProjectCommentAPIView(APIView):
             uuid (UUID): The unique identifier of the comment to be deleted.
         Returns:
             Response: HTTP 204 No Content on successful deletion.
-            Response: HTTP 403 Forbidden if user is not the comment author.
+            Response: HTTP 403 Forbidden if user is neither the comment author nor a maintainer.
+        The comment is soft-deleted with all of its replies: they are hidden at once
+        and removed with their issue or project by the purge job.
             Response: HTTP 404 Not Found if project, issue, or comment doesn't exist.
         Raises:
             Http404: When the specified project, issue, or comment is not found.
         Permissions:
-            - Only the comment author can delete their own comment
+            - The comment author can delete their own comment
+            - Project maintainers and owners can delete any comment
         """
         comment = self.get_object(project_id, issue_id, uuid)
         
-        if comment.author != request.user:
-            return Response({"error": "Only the comment author can delete this comment."}, 
+        if not can(get_membership(request, project_id), 'delete_comment', comment):
+            return Response({"error": "Only the comment author or a project maintainer can delete this comment."}, 
                           status=status.HTTP_403_FORBIDDEN)
         
-        comment.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        with partitions.atomic():
+            deleted = threads.subtree(comment)
+            Comment.all_objects.filter(pk__in=[row.pk for row in deleted]).update(deleted_time=timezone.now())
+            for change in record_changes(deleted, 'DELETE'):
+                publish_change(change)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def serialize_thread(root, reply_count, replies, serializer_class=CommentSerializer):
+    """Serialize a comment with the number of its replies and the loaded ones, in thread order."""
+    return {**serializer_class(root).data, "reply_count": reply_count,
+            "replies": serializer_class(replies, many=True).data}
+
+
+class IssueAttachmentAPIView(APIView):
+    """
+    API view for the files attached to an issue.
+    Uploads are streamed to the attachment storage in chunks and stored once per content;
+    downloads support Range and conditional requests.
+
+    Endpoints:
+        GET /projects/{project_id}/issues/{issue_id}/attachments/ - List the files of the issue
+        POST /projects/{project_id}/issues/{issue_id}/attachments/ - Upload a file (multipart ``file`` field)
+        GET /projects/{project_id}/issues/{issue_id}/attachments/{uuid}/ - Download a file
+        DELETE /projects/{project_id}/issues/{issue_id}/attachments/{uuid}/ - Remove a file
+
+    Permissions:
+        - User must be authenticated
+        - User must be a contributor of the project
+        - POST and DELETE: The same rights as for modifying the issue
+    """
+    permission_classes = [IsAuthenticated, ProjectPermissions]
+    content_negotiation_class = attachments.DownloadContentNegotiation
+
+    def get_target(self, request, project_id, issue_id, comment_uuid=None):
+        """
+        Return the issue and comment the files are attached to, checking the rights to
+        modify them for uploads and removals.
+
+        Returns:
+            tuple: The Issue and the Comment, None for the files of the issue itself.
+        Raises:
+            Http404: If the project or issue does not exist.
+            PermissionDenied: If the user may not modify the issue.
+        """
+        if not get_membership(request, project_id).project_active:
+            raise Http404
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
+        if request.method not in SAFE_METHODS and not can(get_membership(request, project_id), 'change_issue', issue):
+            self.permission_denied(request, message="Only the issue author, its assignee or a project maintainer can change its attachments.")
+        return issue, None
+
+    @query_budget(4)
+    def get(self, request, project_id, issue_id, comment_uuid=None, uuid=None):
+        """
+        List the files attached to the target, or download one of them.
+
+        Returns:
+            Response: The attachments of the target, or the file (see ``attachments.serve``).
+        Raises:
+            Http404: If the project, issue, comment or attachment does not exist.
+        """
+        issue, comment = self.get_target(request, project_id, issue_id, comment_uuid)
+        files = Attachment.objects.filter(issue=issue, comment=comment)
+        if uuid:
+            return attachments.serve(request, get_object_or_404(files, uuid=uuid))
+        return Response(AttachmentSerializer(files.order_by('pk'), many=True).data)
+
+    def post(self, request, project_id, issue_id, comment_uuid=None):
+        """
+        Upload a file and attach it to the target.
+        The multipart body is streamed to the attachment storage as it is read.
+
+        Returns:
+            Response:
+                - 201 CREATED with the attachment
+                - 400 BAD REQUEST if the request has no ``file`` part
+                - 413 REQUEST ENTITY TOO LARGE if the file exceeds ``ATTACHMENT_MAX_SIZE``
+        """
+        issue, comment = self.get_target(request, project_id, issue_id, comment_uuid)
+        handler = attachments.StorageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        upload = request.FILES.get('file')
+        if handler.too_large:
+            return Response({"error": f"Attachments are limited to {settings.ATTACHMENT_MAX_SIZE} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if upload is None:
+            return Response({"error": "Send the file in the 'file' part of a multipart/form-data body."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        attachment = Attachment.objects.create(
+            issue=issue, comment=comment, uploaded_by=request.user, name=upload.name[:255],
+            content_type=upload.content_type[:100], size=upload.size, sha256=upload.sha256,
+        )
+        return Response(AttachmentSerializer(attachment).data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, project_id, issue_id, uuid, comment_uuid=None):
+        """
+        Remove a file from the target.
+        The content stays in the storage, possibly shared with other attachments, until
+        the ``prune_attachments`` command finds it unreferenced.
+
+        Returns:
+            Response: HTTP 204 No Content.
+        Raises:
+            Http404: If the project, issue, comment or attachment does not exist.
+        """
+        issue, comment = self.get_target(request, project_id, issue_id, comment_uuid)
+        get_object_or_404(Attachment, issue=issue, comment=comment, uuid=uuid).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CommentAttachmentAPIView(IssueAttachmentAPIView):
+    """
+    API view for the files attached to a comment, with the endpoints of the issue
+    attachments under ``/projects/{project_id}/issues/{issue_id}/comments/{comment_uuid}/attachments/``.
+
+    Permissions:
+        - User must be authenticated
+        - User must be a contributor of the project
+        - POST: Only the comment author
+        - DELETE: The comment author or a project maintainer
+    """
+    permission_classes = [IsAuthenticated, CommentPermissions]
+
+    def get_target(self, request, project_id, issue_id, comment_uuid=None):
+        issue = get_object_or_404(Issue.objects.defer('description'), id=issue_id, project_id=project_id)
+        comment = get_object_or_404(Comment.objects.defer('description'), uuid=comment_uuid, issue=issue)
+        self.check_object_permissions(request, comment)
+        return issue, comment
+
+
+class SyncAPIView(APIView):
+    """
+    API view exposing the changes-since feed used by offline-capable clients.
+    It returns the creations, updates and deletions of the projects, contributors,
+    issues and comments visible to the caller (the projects they contribute to),
+    ordered by the monotonic change sequence of the ``Change`` journal.
+    Losing access to a project (removal, project deletion) is announced by the
+    tombstone of the caller's own contributor row; the client then drops the
+    project's data.
+    Endpoints:
+        GET /sync/ - First page of the feed, from the beginning of the journal
+        GET /sync/?since=<token> - Changes recorded after the given watermark
+    Query Parameters:
+        since (str, optional): Opaque watermark returned as ``next`` by a previous page.
+        limit (int, optional): Page size, capped by ``SYNC_MAX_PAGE_SIZE``.
+    Permissions:
+        - IsAuthenticated: User must be logged in
+    """
+    permission_classes = [IsAuthenticated]
+
+
+    @staticmethod
+    def encode_token(seq):
+        return base64.urlsafe_b64encode(f'v1:{seq}'.encode()).decode()
+
+
+    @staticmethod
+    def decode_token(token):
+        """
+        Decode a watermark token into a change sequence number.
+
+        Args:
+            token (str): The opaque token, or None for the start of the journal.
+        Returns:
+            int: The last change sequence number already known by the client.
+        Raises:
+            ValueError: If the token is malformed.
+        """
+        if not token:
+            return 0
+        try:
+            version, seq = base64.urlsafe_b64decode(token.encode()).decode().split(':')
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError(token)
+        if version != 'v1' or not seq.isdigit():
+            raise ValueError(token)
+        return int(seq)
+
+
+    # The token's user and the page, then on each database the contributors of the user
+    # (read on every shard) and one query per synced model for the rows of the page.
+    @query_budget(2, per_database=1 + len(CHANGE_SERIALIZERS))
+    def get(self, request):
+        """
+        Return one page of the changes visible to the authenticated user.
+        Several changes of the same row within a page are collapsed into the latest one,
+        whose ``data`` holds the current state of the row (None for deletions).
+
+        Args:
+            request: The HTTP request object.
+        Returns:
+            Response: JSON response containing the ``changes`` of the page, the ``next``
+                     watermark and a ``has_more`` flag, or a 400 error if the token or
+                     limit is invalid.
+        """
+        try:
+            since = self.decode_token(request.query_params.get('since'))
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "Invalid since token or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+
+        # The journal is on the default database, the contributors on every shard.
+        visible_projects = [project_id for ids in shards.fan_out(
+            lambda alias: list(Contributor.objects.using(alias).filter(user=request.user).values_list('project_id', flat=True))
+        ) for project_id in ids]
+        page = list(
+            Change.objects.filter(Q(project_id__in=visible_projects) | Q(model='contributor', user_id=request.user.pk),
+                                  id__gt=since).order_by('id')[:limit + 1]
+        )
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        changes = serialize_changes(page)
+
+        next_seq = page[-1].id if page else since
+        return Response({"changes": changes, "next": self.encode_token(next_seq), "has_more": has_more})
+
+
+class NotificationAPIView(APIView):
+    """
+    API view listing the notifications of the authenticated user, most recent first.
+    Notifications are produced by the outbox worker (``drain_outbox``) after issues
+    and comments are created in the user's projects. The list is keyset paginated on
+    the notification id, so every page costs one index range scan whatever its depth.
+    Endpoints:
+        GET /me/notifications/ - First page of the user's notifications
+        GET /me/notifications/?before={cursor} - Following page
+    Query Parameters:
+        before (int, optional): The ``next`` cursor returned by the previous page.
+        limit (int, optional): Page size, capped by ``NOTIFICATION_MAX_PAGE_SIZE``.
+    Permissions:
+        - IsAuthenticated: User must be logged in
+    """
+    permission_classes = [IsAuthenticated]
+
+    @query_budget(2)
+    def get(self, request):
+        """
+        Return one page of the notifications of the authenticated user.
+
+        Returns:
+            Response: JSON response with the ``results`` of the page and the ``next``
+                     cursor (None on the last page), or 400 if the parameters are invalid.
+        """
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            limit = int(request.query_params.get('limit', settings.NOTIFICATION_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "Invalid before cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.NOTIFICATION_MAX_PAGE_SIZE))
+
+        notifications = Notification.objects.filter(user=request.user)
+        if before is not None:
+            notifications = notifications.filter(id__lt=before)
+        page = list(notifications.order_by('-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        return Response({"results": NotificationSerializer(page, many=True).data,
+                         "next": page[-1].id if has_more else None})
+
+
+class ProjectWebhookAPIView(APIView):
+    """
+    API view managing the webhooks of a project.
+    Webhooks receive HMAC-signed batches of the issue, comment and contributor changes
+    of the project, delivered by the ``deliver_webhooks`` worker. The signature of each
+    payload is sent in the ``X-Softdesk-Signature`` header as ``sha256=<hex digest>``.
+    Endpoints:
+        GET /projects/{project_id}/webhooks/ - List the webhooks of a project
+        POST /projects/{project_id}/webhooks/ - Register a webhook
+        DELETE /projects/{project_id}/webhooks/{webhook_id}/ - Remove a webhook
+    Permissions:
+        - IsAuthenticated: User must be logged in
+        - Only the project owners can manage webhooks, as they expose their secret
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_project(self, request, project_id):
+        """
+        Retrieve a project whose webhooks the authenticated user may manage.
+
+        Raises:
+            Http404: If the project does not exist or the user may not manage its webhooks.
+        """
+        if not can(get_membership(request, project_id), 'manage_webhooks'):
+            raise Http404
+        return get_object_or_404(CustomProject, id=project_id)
+
+    @query_budget(4)
+    def get(self, request, project_id):
+        project = self.get_project(request, project_id)
+        serializer = WebhookSerializer(Webhook.objects.filter(project=project), many=True)
+        return Response(serializer.data)
+
+    def post(self, request, project_id):
+        """
+        Register a webhook. Its cursor starts at the end of the journal, so only the
+        changes made after the registration are delivered.
+
+        The host of the URL must resolve to public addresses only: the deliveries
+        must not reach the server itself or its private networks.
+
+        Returns:
+            Response: 201 with the webhook data, including the generated secret,
+                     or 400 with validation errors.
+        """
+        project = self.get_project(request, project_id)
+        serializer = WebhookSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                webhooks.check_url(serializer.validated_data['url'])
+            except webhooks.UnsafeURL as error:
+                return Response({"url": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+            last_change = Change.objects.filter(project_id=project.pk).order_by('-id').values_list('id', flat=True).first()
+            serializer.save(project=project, secret=secrets.token_hex(32), last_seq=last_change or 0)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, project_id, webhook_id):
+        project = self.get_project(request, project_id)
+        get_object_or_404(Webhook, id=webhook_id, project=project).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobAPIView(APIView):
+    """
+    API view reporting the progress of a background job: the purge started by a project or
+    issue deletion, or the archive or restore of a project.
+    Endpoints:
+        GET /jobs/{job_id}/ - Retrieve the status of a job
+    Permissions:
+        - IsAuthenticated: User must be logged in
+        - Only the user who requested the job can follow it
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(Job, id=job_id, requested_by=request.user)
+        return Response(JobSerializer(job).data)
+
+
+class ProjectArchiveAPIView(APIView):
+    """
+    API view moving a project to the archive tier and back.
+    Archiving hides the project at once and moves its issues, comments and history
+    out of the hot tables in the background; restoring moves them back.
+    Endpoints:
+        POST /projects/{project_id}/archive/ - Archive a project
+        DELETE /projects/{project_id}/archive/ - Restore an archived project
+    Permissions:
+        - IsAuthenticated: User must be logged in
+        - Only the project owners can archive or restore it
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, project_id):
+        project = get_object_or_404(CustomProject, id=project_id)
+        if not can(get_membership(request, project.pk), 'delete_project'):
+            return Response({"error": "Only the project owners can archive the project."},
+                            status=status.HTTP_403_FORBIDDEN)
+        job = jobs.archive(project, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def delete(self, request, project_id):
+        project = get_object_or_404(CustomProject.all_objects, id=project_id, deleted_time__isnull=True,
+                                    archived_time__isnull=False)
+        if not can(get_membership(request, project.pk), 'delete_project'):
+            return Response({"error": "Only the project owners can restore the project."},
+                            status=status.HTTP_403_FORBIDDEN)
+        if Job.objects.filter(action='RESTORE', target='projects.customproject', object_id=project.pk,
+                              status__in=['PENDING', 'RUNNING']).exists():
+            return Response({"error": "The project is already being restored."}, status=status.HTTP_409_CONFLICT)
+        job = jobs.restore(project, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, HTTPRedirectHandler, HTTPSHandler, ProxyHandler, Request, build_opener
+from uuid import uuid4
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from . import shards
+from .models import Change, Webhook, WebhookDeadLetter
+from .routers import placement, use_project
+from .serializers import serialize_changes
+
+logger = logging.getLogger(__name__)
+
+# Journal models delivered to webhooks.
+WEBHOOK_MODELS = ('contributor', 'issue', 'comment')
+
+
+class UnsafeURL(ValueError):
+    """The URL of a webhook is not an HTTP(S) URL, or its host is not a public address."""
+
+
+def check_address(address):
+    """
+    Reject the addresses of the server itself and of its private networks.
+    Only global unicast addresses are allowed, unless they belong to
+    ``WEBHOOK_ALLOWED_NETWORKS``.
+    Raises:
+        UnsafeURL: If the address is private, loopback, link-local, reserved or multicast.
+    """
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    if any(address in ipaddress.ip_network(network) for network in settings.WEBHOOK_ALLOWED_NETWORKS):
+        return
+    if not address.is_global or address.is_multicast:
+        raise UnsafeURL(f'{address} is not a public address.')
+
+
+def resolve(host, port):
+    """
+    Resolve a host and check every address it resolves to.
+    Returns:
+        list: The getaddrinfo entries of the host.
+    Raises:
+        UnsafeURL: If the host cannot be resolved or one of its addresses is not public.
+    """
+    try:
+        entries = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as error:
+        raise UnsafeURL(f'{host} cannot be resolved: {error}') from error
+    for *_, sockaddr in entries:
+        check_address(sockaddr[0].split('%')[0])
+    return entries
+
+
+def check_url(url):
+    """
+    Check that a webhook URL targets a public HTTP(S) endpoint.
+    Raises:
+        UnsafeURL: If the scheme is not http or https, or the host is not public.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise UnsafeURL('Only http and https URLs are allowed.')
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError as error:
+        raise UnsafeURL(str(error)) from error
+    resolve(parts.hostname, port)
+
+
+def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    socket.create_connection connecting only to checked addresses.
+    The host is resolved once and the socket connects to the addresses that were checked,
+    so a DNS answer changing between the check and the connection cannot reach an
+    internal service.
+    """
+    error = None
+    for family, type_, proto, _, sockaddr in resolve(*address):
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as exc:
+            error = exc
+            sock.close()
+    raise error
+
+
+class CheckedHTTPConnection(HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_connection
+
+
+class CheckedHTTPSConnection(HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_connection
+
+
+class CheckedHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(CheckedHTTPConnection, req)
+
+
+class CheckedHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(CheckedHTTPSConnection, req, context=self._context)
+
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    """Return redirects as HTTP errors: following them would bypass the address check."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# Opener of the deliveries: no proxy from the environment, no redirects, checked addresses.
+opener = build_opener(ProxyHandler({}), NoRedirectHandler, CheckedHTTPHandler, CheckedHTTPSHandler)
+
+
+def sign(secret, body):
+    """Return the HMAC-SHA256 signature header value of a payload."""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def due_webhooks():
+    """
+    Return the active webhooks that have undelivered changes and are not backing off.
+    The webhooks are read from every shard at once, then the pending changes are
+    detected with one query, comparing each webhook's cursor to the latest sequence
+    number of its project in the journal. Webhooks of a project being moved to another
+    shard wait for the move to end.
+    """
+    now = timezone.now()
+    webhooks = [webhook for rows in shards.fan_out(
+        lambda alias: list(Webhook.objects.using(alias).filter(is_active=True, next_attempt_time__lte=now))
+    ) for webhook in rows if not placement(webhook.project_id)[1]]
+    latest_seqs = dict(
+        Change.objects.filter(project_id__in={webhook.project_id for webhook in webhooks}).values('project_id')
+        .annotate(latest=Max('id')).values_list('project_id', 'latest')
+    )
+    return [webhook for webhook in webhooks if latest_seqs.get(webhook.project_id, 0) > webhook.last_seq]
+
+
+def prepare_batch(webhook):
+    """
+    Build the next payload of a webhook from the journal.
+    Changes recorded less than ``WEBHOOK_DEBOUNCE`` seconds ago are held back, so rapid
+    successive updates of the same issue coalesce into one event carrying its latest state.
+    Args:
+        webhook (Webhook): The webhook to deliver to.
+    Returns:
+        tuple: (payload dict or None if there is nothing to send yet,
+                sequence number of the last change covered by the batch).
+    """
+    settled = timezone.now() - timedelta(seconds=settings.WEBHOOK_DEBOUNCE)
+    changes = list(
+        Change.objects.filter(project_id=webhook.project_id, id__gt=webhook.last_seq, created_time__lte=settled)
+        .order_by('id')[:settings.WEBHOOK_BATCH_SIZE]
+    )
+    if not changes:
+        return None, webhook.last_seq
+    events = [event for event in serialize_changes(changes) if event['model'] in WEBHOOK_MODELS]
+    if not events:
+        return None, changes[-1].id
+    return {"delivery": str(uuid4()), "project": webhook.project_id, "events": events}, changes[-1].id
+
+
+def post(url, body, headers):
+    """
+    Send one payload synchronously. Returns None on success, the error message otherwise.
+    The request only reaches public addresses, redirects are not followed and at most
+    ``WEBHOOK_MAX_RESPONSE_SIZE`` bytes of the response are read.
+    """
+    request = Request(url, data=body, headers=headers, method='POST')
+    try:
+        with opener.open(request, timeout=settings.WEBHOOK_TIMEOUT) as response:
+            response.read(settings.WEBHOOK_MAX_RESPONSE_SIZE)
+    except HTTPError as error:
+        error.close()
+        return f'HTTP {error.code}'
+    except URLError as error:
+        return str(error.reason)
+    except (UnsafeURL, OSError) as error:
+        return str(error)
+    return None
+
+
+async def send_all(batches):
+    """
+    Post the prepared batches concurrently.
+    Requests run on a bounded thread pool (``WEBHOOK_CONCURRENCY``), and no more than
+    ``WEBHOOK_HOST_CONCURRENCY`` requests hit the same host at once.
+    Args:
+        batches (list): (webhook, payload) pairs.
+    Returns:
+        list: The error message of each batch, None for successful deliveries.
+    """
+    loop = asyncio.get_running_loop()
+    host_limits = {}
+
+    async def send(webhook, payload):
+        body = json.dumps(payload).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'SoftDesk-Webhooks',
+            'X-Softdesk-Delivery': payload['delivery'],
+            'X-Softdesk-Signature': sign(webhook.secret, body),
+        }
+        host = urlsplit(webhook.url).netloc
+        limit = host_limits.setdefault(host, asyncio.Semaphore(settings.WEBHOOK_HOST_CONCURRENCY))
+        async with limit:
+            return await loop.run_in_executor(executor, post, webhook.url, body, headers)
+
+    with ThreadPoolExecutor(max_workers=settings.WEBHOOK_CONCURRENCY) as executor:
+        return await asyncio.gather(*(send(webhook, payload) for webhook, payload in batches))
+
+
+def record_result(webhook, payload, last_seq, error):
+    """
+    Move the cursor of a webhook after a delivery attempt.
+    A failed batch is retried with exponential backoff; after ``WEBHOOK_MAX_ATTEMPTS``
+    attempts it is stored as a dead letter and the cursor moves past it.
+    """
+    with use_project(webhook.project_id):
+        if error is None:
+            Webhook.objects.filter(pk=webhook.pk).update(last_seq=last_seq, failures=0, next_attempt_time=timezone.now())
+            return
+        failures = webhook.failures + 1
+        logger.warning("Webhook %s delivery failed, attempt %s: %s", webhook.pk, failures, error)
+        if failures >= settings.WEBHOOK_MAX_ATTEMPTS:
+            WebhookDeadLetter.objects.create(webhook=webhook, payload=payload, attempts=failures, last_error=error)
+            Webhook.objects.filter(pk=webhook.pk).update(last_seq=last_seq, failures=0,
+                                                         next_attempt_time=timezone.now())
+            return
+        delay = min(settings.WEBHOOK_BACKOFF * 2 ** (failures - 1), settings.WEBHOOK_BACKOFF_MAX)
+        Webhook.objects.filter(pk=webhook.pk).update(
+            failures=failures, next_attempt_time=timezone.now() + timedelta(seconds=delay)
+        )
+
+
+def deliver():
+    """
+    Deliver one batch to every due webhook.
+
+    Returns:
+        tuple: (delivered, failed) batch counts.
+    """
+    batches = []
+    for webhook in due_webhooks():
+        payload, last_seq = prepare_batch(webhook)
+        if payload is None:
+            if last_seq != webhook.last_seq:
+                Webhook.objects.using(webhook._state.db).filter(pk=webhook.pk).update(last_seq=last_seq)
+            continue
+        batches.append((webhook, payload, last_seq))
+    if not batches:
+        return 0, 0
+
+    errors = asyncio.run(send_all([(webhook, payload) for webhook, payload, _ in batches]))
+    for (webhook, payload, last_seq), error in zip(batches, errors):
+        record_result(webhook, payload, last_seq, error)
+    failed = sum(error is not None for error in errors)
+    return len(batches) - failed, failed
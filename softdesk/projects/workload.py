@@ -0,0 +1,191 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+
+from . import history
+from .models import Contributor, Issue, IssueChange, Workload
+from .routers import database_for
+from .signals import publish_change, record_changes
+
+# Roles issues are never assigned to automatically: viewers cannot work on them.
+UNASSIGNABLE_ROLES = ('VIEWER',)
+
+
+def weight_of(status, priority):
+    """Return the weight an issue adds to the workload of its assignee: none once finished."""
+    return 0 if status == 'FINISHED' else settings.ISSUE_PRIORITY_WEIGHTS.get(priority, 0)
+
+
+def adjust(alias, project_id, deltas):
+    """
+    Apply changes to the workload counters of contributors, with a single UPDATE.
+    Counters are only ever incremented or decremented in the database, so concurrent
+    transactions cannot lose each other's changes. Contributors gaining issues get
+    their row first if they have none, with one INSERT ignoring the existing rows.
+    Args:
+        alias (str): The database of the project's issues.
+        project_id (int): The project.
+        deltas (dict): Contributor ID -> (change of open issues, change of weight).
+    """
+    deltas = {contributor_id: delta for contributor_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    new = [Workload(contributor_id=contributor_id, project_id=project_id)
+           for contributor_id, (issues, _) in deltas.items() if issues > 0]
+    if new:
+        Workload.objects.using(alias).bulk_create(new, ignore_conflicts=True)
+    Workload.objects.using(alias).filter(contributor_id__in=list(deltas)).update(
+        open_issues=F('open_issues') + Case(*[When(contributor_id=contributor_id, then=Value(issues))
+                                              for contributor_id, (issues, _) in deltas.items()]),
+        weight=F('weight') + Case(*[When(contributor_id=contributor_id, then=Value(weight))
+                                    for contributor_id, (_, weight) in deltas.items()]),
+    )
+
+
+def issue_saved(issue, before=None):
+    """
+    Move the weight of an issue between the counters after its creation or update, in
+    the transaction of the write.
+    Args:
+        issue (Issue): The saved issue.
+        before (dict, optional): Its ``history.snapshot`` taken before an update; None on creation.
+    """
+    deltas = defaultdict(lambda: (0, 0))
+    if before is not None:
+        weight = weight_of(before['status'], before['priority'])
+        if weight:
+            deltas[before['user_id']] = (-1, -weight)
+    weight = weight_of(issue.status, issue.priority)
+    if weight:
+        issues, total = deltas[issue.user_id]
+        deltas[issue.user_id] = (issues + 1, total + weight)
+    adjust(issue._state.db, issue.project_id, deltas)
+
+
+def issue_removed(issue):
+    """Remove the weight of a deleted issue from the counter of its assignee."""
+    weight = weight_of(issue.status, issue.priority)
+    if weight:
+        adjust(issue._state.db or database_for('projects.workload', issue.project_id), issue.project_id,
+               {issue.user_id: (-1, -weight)})
+
+
+def pick(project_id):
+    """
+    Return the ID of the contributor of a project with the lowest workload, to assign
+    a new issue to, or None if no contributor can be assigned issues.
+    Contributors without a counter row get an empty one first, with one INSERT ignoring
+    the existing rows. Then the least loaded counter is read from the (project, weight)
+    index and locked until the end of the transaction (on databases supporting it):
+    concurrent assignments to the same contributor wait for each other, and only that
+    row is locked.
+    Returns:
+        int or None: The contributor ID.
+    """
+    alias = database_for('projects.workload', project_id)
+    missing = list(Contributor.objects.using(alias).filter(project_id=project_id, workload__isnull=True)
+                   .exclude(role__in=UNASSIGNABLE_ROLES).values_list('pk', flat=True))
+    if missing:
+        Workload.objects.using(alias).bulk_create(
+            [Workload(contributor_id=contributor_id, project_id=project_id) for contributor_id in missing],
+            ignore_conflicts=True,
+        )
+    loads = (Workload.objects.using(alias).select_for_update(of=('self',)).filter(project_id=project_id)
+             .exclude(contributor__role__in=UNASSIGNABLE_ROLES).order_by('weight', 'contributor_id')
+             .values_list('contributor_id', flat=True)[:1])
+    return next(iter(loads), None)
+
+
+def plan_rebalance(loads, issues):
+    """
+    Choose the reassignments evening out the workload of a project.
+    The issues of contributors who cannot be assigned issues go to the least loaded
+    ones. Then, as long as an issue of the most loaded contributor weighs less than
+    the gap to the least loaded one, the heaviest such issue is moved, which strictly
+    narrows the spread of the workloads, so only the needed issues move.
+    Args:
+        loads (dict): Assignable contributor ID -> weight of its open issues.
+        issues (list): The open issues of the project.
+    Returns:
+        list: (issue, new contributor ID) pairs.
+    """
+    held = defaultdict(list)
+    holders = {}
+    for issue in issues:
+        if weight_of(issue.status, issue.priority):
+            held[issue.user_id].append(issue)
+            holders[issue.pk] = issue.user_id
+    moves = {}
+
+    def move(issue, target):
+        weight = weight_of(issue.status, issue.priority)
+        holder = holders[issue.pk]
+        if holder in loads:
+            loads[holder] -= weight
+        held[holder].remove(issue)
+        loads[target] += weight
+        held[target].append(issue)
+        holders[issue.pk] = target
+        # An issue moved twice keeps its last assignee only.
+        moves[issue.pk] = (issue, target)
+
+    for contributor_id in [contributor_id for contributor_id in held if contributor_id not in loads]:
+        for issue in list(held[contributor_id]):
+            move(issue, min(loads, key=lambda candidate: (loads[candidate], candidate)))
+    while len(loads) > 1:
+        high = max(loads, key=lambda candidate: (loads[candidate], -candidate))
+        low = min(loads, key=lambda candidate: (loads[candidate], candidate))
+        movable = [issue for issue in held[high]
+                   if weight_of(issue.status, issue.priority) < loads[high] - loads[low]]
+        if not movable:
+            break
+        move(max(movable, key=lambda issue: (weight_of(issue.status, issue.priority), -issue.pk)), low)
+    return [(issue, target) for issue, target in moves.values() if target != issue.user_id]
+
+
+def rebalance(project_id, actor):
+    """
+    Reassign open issues of a project so the workloads of its contributors even out.
+    Must run in a transaction (``partitions.atomic``): the counters are locked, the
+    issues updated, their history and sync journal written and the counters adjusted
+    together.
+    Args:
+        project_id (int): The project.
+        actor (CustomUser): The user asking for the rebalancing, recorded in the history.
+    Returns:
+        list: The reassigned issues.
+    """
+    alias = database_for('projects.workload', project_id)
+    assignable = (Contributor.objects.using(alias).filter(project_id=project_id)
+                  .exclude(role__in=UNASSIGNABLE_ROLES).values_list('pk', flat=True))
+    loads = {contributor_id: 0 for contributor_id in assignable}
+    if not loads:
+        return []
+    loads.update(Workload.objects.using(alias).select_for_update().filter(contributor_id__in=list(loads))
+                 .values_list('contributor_id', 'weight'))
+    issues = list(Issue.objects.using(alias).filter(project_id=project_id).exclude(status='FINISHED')
+                  .defer('description').order_by('pk'))
+    moves = plan_rebalance(loads, issues)
+    if not moves:
+        return []
+
+    deltas = defaultdict(lambda: (0, 0))
+    changes = []
+    by_target = defaultdict(list)
+    for issue, target in moves:
+        weight = weight_of(issue.status, issue.priority)
+        for contributor_id, sign in ((issue.user_id, -1), (target, 1)):
+            issues_delta, weight_delta = deltas[contributor_id]
+            deltas[contributor_id] = (issues_delta + sign, weight_delta + sign * weight)
+        changes.append(IssueChange(issue=issue, project_id=project_id, actor=actor,
+                                   diff=history.encode({'user_id': (issue.user_id, target)})))
+        by_target[target].append(issue.pk)
+        issue.user_id = target
+    Issue.objects.using(alias).filter(pk__in=[issue.pk for issue, _ in moves]).update(
+        user_id=Case(*[When(pk__in=ids, then=Value(target)) for target, ids in by_target.items()]))
+    IssueChange.objects.using(alias).bulk_create(changes)
+    for change in record_changes([issue for issue, _ in moves], 'UPDATE'):
+        publish_change(change)
+    adjust(alias, project_id, deltas)
+    return [issue for issue, _ in moves]
@@ -9,8 +9,47 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'softdesk.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded by get_asgi_application().
+from projects.streams import websocket_application  # noqa: E402
+from softdesk.warmup import warm_up  # noqa: E402
+
+
+async def lifespan(receive, send):
+    """
+    Answer the lifespan messages of the server, warming the worker up on startup.
+    ASGI servers import the application from their event loop, where the warm-up
+    cannot run (its queries raise SynchronousOnlyOperation): it runs in a thread on
+    startup instead, and the server accepts connections once it is over. Servers
+    without lifespan support start cold.
+    """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if settings.WARMUP_ON_START:
+                # Warm-up requests go through a WSGI handler: the routes, views and middleware are shared.
+                await sync_to_async(warm_up)()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """
+    Route WebSocket connections to the project event streams, lifespan events to the
+    warm-up and everything else to Django.
+    """
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,13 @@
+from rest_framework.authentication import BaseAuthentication
+
+
+class BatchAuthentication(BaseAuthentication):
+    """
+    Authenticate the sub-requests of a batch as the user of the batch request.
+    BatchAPIView attaches the ``(user, token)`` pair it authenticated to the HttpRequest
+    of each sub-request it builds, so the JWT is decoded and the user loaded once per
+    batch. Requests coming from clients never carry the attribute: it is not a header.
+    """
+
+    def authenticate(self, request):
+        return getattr(request._request, 'batch_auth', None)
@@ -0,0 +1,162 @@
+import logging
+import threading
+import traceback
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Counter of the request running in the current thread, for the worker threads it starts.
+current_counter = ContextVar('current_counter', default=None)
+
+
+def query_budget(queries, per_database=0):
+    """
+    Declare the most queries a view handler may run, whatever the size of its data.
+    The budget covers every query of the request from the view on: authentication,
+    permission checks and the handler itself, on every database and on the worker
+    threads it hands queries to (see ``counted``).
+
+        @query_budget(3)
+        def get(self, request, project_id):
+
+    Args:
+        queries (int): The budget.
+        per_database (int, optional): Queries added for each shard and partition
+                                      database, for handlers querying all of them.
+    """
+    def decorator(handler):
+        handler.query_budget = queries
+        handler.query_budget_per_database = per_database
+        return handler
+    return decorator
+
+
+def get_query_budget(view_func, method):
+    """Return the query budget of the handler of a view for an HTTP method, or None if it has none."""
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is None:
+        handler = view_func
+    else:
+        handler = getattr(view_class, 'get' if method == 'HEAD' else method.lower(), None)
+    budget = getattr(handler, 'query_budget', None)
+    if budget is None:
+        return None
+    databases = set(settings.SHARDS) | set(settings.ISSUE_PARTITIONS.values())
+    return budget + getattr(handler, 'query_budget_per_database', 0) * len(databases)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run on every connection of the thread
+    while it is started, and of the worker threads running functions wrapped by
+    ``counted``. Queries beyond the budget are kept with the stack of project code that
+    ran them (``QUERY_BUDGET_STACK_DEPTH`` frames), to find the offending loop.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.count = 0
+        self.offenders = []
+        self.lock = threading.Lock()
+        self.stack = None
+        self.previous = None
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+            over = self.count > self.budget
+        if over:
+            stack = project_stack()
+            with self.lock:
+                self.offenders.append((sql, stack))
+        return execute(sql, params, many, context)
+
+    def wrap_connections(self):
+        """Count the queries of every connection of the current thread until the returned ExitStack is closed."""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def start(self):
+        self.stack = self.wrap_connections()
+        self.previous = current_counter.get()
+        current_counter.set(self)
+
+    def stop(self):
+        self.stack.close()
+        current_counter.set(self.previous)
+
+    @property
+    def exceeded(self):
+        return self.count > self.budget
+
+    def report(self):
+        """Describe the count and the queries over budget with their stacks."""
+        lines = [f"{self.count} queries for a budget of {self.budget}. Queries over budget:"]
+        for sql, stack in self.offenders:
+            lines.append(f"  {sql}")
+            lines.extend(f"    {line}" for line in stack.rstrip().splitlines())
+        return '\n'.join(lines)
+
+
+def counted(function):
+    """
+    Return ``function`` counting its queries against the budget of the request running
+    in the calling thread, to hand it to a worker thread: connections belong to their
+    thread, and the counter only wraps those of the request's thread. Without a request
+    counter, the function is returned as is.
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return function
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with counter.wrap_connections():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def project_stack():
+    """Return the formatted frames of the current stack in project code, innermost last."""
+    root = str(Path(settings.BASE_DIR))
+    frames = [frame for frame in traceback.extract_stack()[:-2]
+              if frame.filename.startswith(root) and 'site-packages' not in frame.filename
+              and frame.filename != __file__]
+    return ''.join(traceback.format_list(frames[-settings.QUERY_BUDGET_STACK_DEPTH:]))
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries of the requests whose view declares a budget (see ``query_budget``)
+    and log a warning to the ``softdesk.budgets`` logger, with the stacks of the queries
+    over budget, when one is exceeded. Requests to views without a budget are not
+    instrumented. The counter is left on the response as ``query_counter`` for the tests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        counter = getattr(request, 'query_counter', None)
+        if counter is not None:
+            counter.stop()
+            response.query_counter = counter
+            if counter.exceeded:
+                logger.warning("Query budget exceeded by %s %s: %s", request.method, request.path, counter.report(),
+                               extra={'queries': counter.count, 'budget': counter.budget})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = get_query_budget(view_func, request.method)
+        if budget is not None:
+            request.query_counter = QueryCounter(budget)
+            request.query_counter.start()
@@ -0,0 +1,146 @@
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+# Layer shown before the frames of the files whose path contains these parts, to tell
+# the view, serializer, permission and database time apart in a flamegraph.
+LAYERS = (
+    ('views.py', 'view'),
+    ('serializers.py', 'serializer'),
+    ('rest_framework/fields.py', 'serializer'),
+    ('rest_framework/relations.py', 'serializer'),
+    ('permissions.py', 'permission'),
+    ('django/db/', 'db'),
+)
+
+
+def frame_label(code):
+    """Return the label of a code object in the collapsed stacks: its file, layer and qualified name."""
+    filename = code.co_filename
+    root = str(settings.BASE_DIR)
+    if filename.startswith(root) and 'site-packages' not in filename:
+        filename = filename[len(root):].lstrip('/')
+    elif 'site-packages/' in filename:
+        filename = filename.split('site-packages/', 1)[1]
+    layer = next((layer for part, layer in LAYERS if part in filename), None)
+    label = f'{filename}:{code.co_qualname}'
+    return f'[{layer}] {label}' if layer else label
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of a thread every ``interval`` seconds from a background thread, and
+    count the samples per distinct stack, from the ``root`` code object inwards.
+    Samples are taken when the interpreter switches threads, so intervals below
+    ``sys.getswitchinterval()`` (5 ms) only help while the profiled thread waits on I/O.
+    """
+
+    def __init__(self, thread_id, root, interval):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='softdesk-profiler', daemon=True)
+        # Labels of the code objects met, computed once each.
+        self.labels = {}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.root:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if frame is not None:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self, root_label):
+        """Return the samples in the collapsed stack format of flamegraph.pl and speedscope."""
+        lines = []
+        for stack, count in self.samples.most_common():
+            labels = [root_label]
+            for code in stack:
+                if code not in self.labels:
+                    self.labels[code] = frame_label(code)
+                labels.append(self.labels[code])
+            lines.append(f"{';'.join(labels)} {count}\n")
+        return ''.join(lines)
+
+
+def is_staff_request(request):
+    """Check whether the request carries the JWT of a staff user, without failing on an invalid one."""
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests with a SamplingProfiler and write their stacks to ``PROFILE_DIR``,
+    one file per request of collapsed stacks (``flamegraph.pl profile.folded > profile.svg``).
+    A request is profiled when it is drawn among the ``PROFILE_SAMPLE_RATE`` fraction of
+    the requests, or when a staff user asks for it with the ``X-Profile`` header; the
+    response of the latter names the file in its own ``X-Profile`` header. Other requests
+    cost a float comparison and a header lookup. Sampling starts with the view, after the
+    middleware; the query count of the QueryBudgetMiddleware is noted in the file name.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profiler = getattr(request, 'profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            try:
+                path = self.write(request, profiler)
+            except OSError:
+                logger.exception("Profile of %s %s not written", request.method, request.path)
+            else:
+                if 'HTTP_X_PROFILE' in request.META:
+                    response['X-Profile'] = path.name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rate = settings.PROFILE_SAMPLE_RATE
+        if (rate and random.random() < rate) or ('HTTP_X_PROFILE' in request.META and is_staff_request(request)):
+            request.profile_start = time.perf_counter()
+            request.profiler = SamplingProfiler(threading.get_ident(), self.__call__.__code__,
+                                                settings.PROFILE_INTERVAL)
+            request.profiler.start()
+
+    def write(self, request, profiler):
+        """Write the collapsed stacks of a request to a new file of ``PROFILE_DIR``, and return its path."""
+        duration = (time.perf_counter() - request.profile_start) * 1000
+        match = request.resolver_match
+        route = match.url_name if match is not None and match.url_name else 'unnamed'
+        counter = getattr(request, 'query_counter', None)
+        queries = f'-{counter.count}q' if counter is not None else ''
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / (f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{route}-{duration:.0f}ms{queries}"
+                            f"-{uuid.uuid4().hex[:8]}.folded")
+        path.write_text(profiler.collapsed(f'{request.method} {route}'))
+        return path
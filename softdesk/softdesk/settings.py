@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -52,6 +53,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.middleware.ProjectRoutingMiddleware',
+    'softdesk.throttling.RateLimitHeadersMiddleware',
+    'softdesk.profiling.ProfilingMiddleware',
+    'softdesk.budgets.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'softdesk.urls'
@@ -85,6 +90,18 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = ['projects.routers.ProjectRouter', 'projects.routers.ArchiveRouter']
+
+# Pragmas set on every SQLite connection: write-ahead logging lets the readers of
+# concurrent workers run during a write, and a 16 MiB page cache (negative sizes are
+# KiB) keeps the hot indexes in memory.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -130,6 +147,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Sub-requests of the batch endpoint, which carry no token of their own.
+        'softdesk.authentication.BatchAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'softdesk.throttling.UserThrottle',
+        'softdesk.throttling.AnonThrottle',
+        'softdesk.throttling.ProjectThrottle',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
@@ -141,3 +165,171 @@ SIMPLE_JWT = {
 }
 
 AUTH_USER_MODEL = "users.CustomUser"
+
+# Rate limiting: token buckets of 'requests/period' (s, min, hour, day) for each
+# authenticated user, each client IP on the routes open without a token (login,
+# sign-up) and the writes to each project, counted per route. Routes override them
+# by URL name; None disables a limit. Buckets live in THROTTLE_STORE: the local
+# store counts per process and holds about THROTTLE_MAX_KEYS buckets, the cache
+# store shares them between processes through the THROTTLE_CACHE cache.
+THROTTLE_RATES = {
+    'user': '600/min',
+    'anon': '30/min',
+    'project': '300/min',
+}
+THROTTLE_ROUTE_RATES = {
+    'token_obtain_pair': {'anon': '10/min'},
+    'create-user': {'anon': '5/min'},
+    'list_create_issues': {'project': '120/min'},
+}
+THROTTLE_STORE = 'softdesk.throttling.LocalBucketStore'
+THROTTLE_CACHE = 'default'
+THROTTLE_MAX_KEYS = 100000
+
+# Admin changelists count their rows up to ADMIN_COUNT_LIMIT; larger results are
+# paginated on an estimate (see users.admin.EstimatedCountPaginator).
+ADMIN_COUNT_LIMIT = 10000
+
+# Worker warm-up: the WSGI and ASGI applications resolve every route, build the
+# serializer fields, open the databases and send one request per route before the
+# server hands them traffic (see softdesk.warmup).
+WARMUP_ON_START = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'softdesk.warmup': {'handlers': ['console'], 'level': 'INFO'},
+        'softdesk.budgets': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Query budgets: frames of project code logged with each query over the budget
+# a view declares with softdesk.budgets.query_budget (see QueryBudgetMiddleware).
+QUERY_BUDGET_STACK_DEPTH = 8
+
+# Sampling profiler: fraction of the requests profiled (0 disables it; staff users
+# can still ask for a profile with the X-Profile header), seconds between stack
+# samples, and directory receiving the collapsed stacks (see softdesk.profiling).
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Workload balancing: weight an open issue adds to its assignee's workload, by priority.
+ISSUE_PRIORITY_WEIGHTS = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3}
+
+# Batch endpoint: maximum number of sub-requests per batch and worker threads
+# used for parallel reads.
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Project import: maximum number of projects created by one request.
+PROJECT_IMPORT_MAX_SIZE = 500
+
+# Bulk contributor endpoint: maximum number of usernames per request.
+CONTRIBUTORS_BULK_MAX_SIZE = 500
+
+# Bulk user import: rows validated, hashed and inserted together, processes hashing the
+# passwords (0 hashes them in the importing process), and directory keeping the files
+# uploaded to the API until their import job has run in the outbox worker.
+USER_IMPORT_CHUNK_SIZE = 1000
+USER_IMPORT_WORKERS = os.cpu_count() or 1
+USER_IMPORT_ROOT = BASE_DIR / 'imports'
+
+
+# Notifications: default and maximum number of notifications per page.
+NOTIFICATION_PAGE_SIZE = 50
+NOTIFICATION_MAX_PAGE_SIZE = 200
+
+# Sync feed: default and maximum number of changes per page.
+SYNC_PAGE_SIZE = 100
+SYNC_MAX_PAGE_SIZE = 500
+
+# Event streams: broker class fanning model changes out to the SSE/WebSocket
+# streams, per-stream queue size before a client is asked to resync, and
+# seconds between heartbeats on idle streams.
+EVENTS_BROKER = 'projects.events.LocalBroker'
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT = 15
+
+# Outbox: seconds a worker holds a claimed message, retry backoff (base and cap,
+# in seconds), attempts before a message is marked as failed, and default
+# number of handlers run concurrently by drain_outbox.
+OUTBOX_LEASE = 300
+OUTBOX_BACKOFF = 5
+OUTBOX_BACKOFF_MAX = 3600
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_CONCURRENCY = 4
+
+# Webhooks: changes per delivered batch, seconds a change is held back so rapid
+# updates coalesce, request timeout, thread pool size and per-host concurrency
+# of the deliveries, retry backoff (base and cap, in seconds) and attempts
+# before a batch goes to the dead-letter table.
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_DEBOUNCE = 2
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_CONCURRENCY = 10
+WEBHOOK_HOST_CONCURRENCY = 2
+WEBHOOK_BACKOFF = 10
+WEBHOOK_BACKOFF_MAX = 3600
+WEBHOOK_MAX_ATTEMPTS = 8
+
+# Webhook endpoints must resolve to public addresses: private, loopback, link-local
+# and reserved targets are refused at registration and at delivery, except in the
+# networks listed here (e.g. "10.1.2.0/24" for an internal relay). Redirects are not
+# followed and at most WEBHOOK_MAX_RESPONSE_SIZE bytes of a response are read.
+WEBHOOK_ALLOWED_NETWORKS = []
+WEBHOOK_MAX_RESPONSE_SIZE = 64 * 1024
+
+# Issue history: default and maximum number of changes per page.
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Comment threads: maximum nesting depth of replies (at most 11, the comment path
+# holding 12 IDs), default and maximum number of threads per page, and replies
+# loaded with each thread of a page.
+COMMENT_MAX_DEPTH = 10
+COMMENT_THREAD_PAGE_SIZE = 20
+COMMENT_THREAD_MAX_PAGE_SIZE = 100
+COMMENT_THREAD_REPLIES = 5
+
+# Attachments: storage class, directory of the local storage, maximum file size and
+# size of the chunks streamed to the storage (bytes), and seconds an unreferenced
+# content is kept before prune_attachments deletes it.
+ATTACHMENT_STORAGE = 'projects.storage.FileSystemStorage'
+ATTACHMENT_ROOT = BASE_DIR / 'attachments'
+ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+ATTACHMENT_PRUNE_GRACE = 3600
+
+# Purge, archive and restore jobs: rows processed per batch and pause (seconds)
+# between batches, letting concurrent writers take the database lock.
+JOB_BATCH_SIZE = 500
+JOB_PAUSE = 0.05
+
+# Database alias holding the archive tier (archived issues, comments and history).
+# Point it to a cheaper database declared in DATABASES to move cold rows off the
+# primary; the ArchiveRouter sends ArchivedRow queries and migrations there.
+ARCHIVE_DATABASE = 'default'
+
+# Shards: database aliases the projects are spread over. New projects are assigned
+# to one of them at random and the ProjectShard map records the choice; users and
+# the global tables stay on 'default'. Each shard must be declared in DATABASES and
+# prepared with ``prepare_database <alias>`` (except 'default'); projects are moved
+# between shards online with ``move_project``.
+SHARDS = ['default']
+# Seconds a process caches the shard of a project. Moves wait this long between steps.
+SHARD_MAP_TTL = 5
+
+# Opt-in partitions for large tenants: project ID -> database alias holding the
+# project's issues, comments and history. Each alias must be declared in DATABASES
+# and prepared with ``prepare_database <alias>``; existing data is moved with the
+# ``partition_project`` command.
+ISSUE_PARTITIONS = {}
+
+# ID block of each shard and partition database other than 'default': rows created
+# there get IDs starting at block * DATABASE_ID_BLOCK_SIZE, so IDs stay unique
+# across databases.
+DATABASE_ID_BLOCKS = {}
+DATABASE_ID_BLOCK_SIZE = 2 ** 40
@@ -0,0 +1,37 @@
+"""
+API-only settings profile for the workers serving the JSON API.
+
+The API authenticates every request with a JWT and renders JSON only, so the apps and
+middleware of the browser-facing parts (the admin, its sessions, messages, CSRF and
+clickjacking protections, static files and templates) are left out: workers boot faster
+and each request runs fewer middleware. Select it with
+``DJANGO_SETTINGS_MODULE=softdesk.settings_api``; the admin is served by workers using
+``softdesk.settings``. ``python -m benchmarks.startup`` compares both profiles.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+BROWSER_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+BROWSER_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in BROWSER_APPS]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in BROWSER_MIDDLEWARE]
+
+# No browsable API: its renderer is the only user of the templates.
+TEMPLATES = []
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
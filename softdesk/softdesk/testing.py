@@ -0,0 +1,50 @@
+from datetime import date
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import CustomUser
+
+PASSWORD = 'Str0ngPass!x'
+
+
+def create_user(username, **fields):
+    """Create an adult user with the test password, unless other fields are given."""
+    fields = {'date_of_birth': date(1990, 1, 1), 'can_be_contacted': False, 'can_data_be_shared': False, **fields}
+    return CustomUser.objects.create_user(username, PASSWORD, **fields)
+
+
+class QueryBudgetAssertions:
+    """Authentication and query budget helpers of the API test cases."""
+
+    def authenticate(self, user):
+        """Send the next requests of the test client with an access token of the user."""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def assertWithinQueryBudget(self, response):
+        """
+        Fail if the view of the response declares no query budget, or if the request
+        ran more queries than it, with the queries over budget and their stacks.
+        """
+        counter = getattr(response, 'query_counter', None)
+        if counter is None:
+            self.fail(f"{response.wsgi_request.method} {response.wsgi_request.path} has no query budget.")
+        if counter.exceeded:
+            self.fail(f"{response.wsgi_request.method} {response.wsgi_request.path}: {counter.report()}")
+
+
+@override_settings(THROTTLE_RATES={}, THROTTLE_ROUTE_RATES={})
+class BudgetedAPITestCase(QueryBudgetAssertions, APITestCase):
+    """
+    API test case checking requests against the query budget of their view.
+    Throttling is disabled: the buckets outlive each test.
+    """
+
+
+@override_settings(THROTTLE_RATES={}, THROTTLE_ROUTE_RATES={})
+class BudgetedAPITransactionTestCase(QueryBudgetAssertions, APITransactionTestCase):
+    """
+    BudgetedAPITestCase for the tests running requests or queries on several threads,
+    which cannot share the transaction of a TestCase.
+    """
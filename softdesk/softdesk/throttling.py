@@ -0,0 +1,184 @@
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+# Seconds of each period accepted in the rates ('60/min', '1000/hour'...).
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Bucket(NamedTuple):
+    """The state of a token bucket after a request took (or failed to take) a token from it."""
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the bucket is full again, and until the next token when denied.
+    reset: float
+    wait: float
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Return the capacity and refill rate (tokens per second) of a 'requests/period' rate."""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+def refill(tokens, stamp, now, capacity, per_second):
+    """Take a token from a bucket last seen at ``stamp`` with ``tokens`` left; return its new tokens and state."""
+    tokens = min(capacity, tokens + (now - stamp) * per_second)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return tokens, Bucket(allowed, capacity, int(tokens), (capacity - tokens) / per_second,
+                          0 if allowed else (1 - tokens) / per_second)
+
+
+class LocalBucketStore:
+    """
+    In-process token buckets, one per throttled key, behind a lock.
+    Taking a token is a dict lookup and a little arithmetic. Full buckets carry no state,
+    so they are dropped once more than ``THROTTLE_MAX_KEYS`` keys are held; the next
+    sweep waits for the dict to double, which keeps the cost per request constant. Each
+    worker process counts its own requests: with N workers a client gets up to N times
+    the configured rate, unless ``THROTTLE_STORE`` points to a shared store.
+    """
+
+    def __init__(self):
+        # Key -> (tokens, last request time, time the bucket is full again).
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.sweep_size = settings.THROTTLE_MAX_KEYS
+
+    def take(self, key, capacity, per_second):
+        """
+        Take a token from the bucket of a key, created full.
+
+        Args:
+            key (str): The throttled key.
+            capacity (int): Size of the bucket, the allowed burst.
+            per_second (float): Tokens added back per second.
+        Returns:
+            Bucket: Whether the request is allowed, and the state of the bucket.
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp, _ = self.buckets.get(key, (capacity, now, now))
+            tokens, bucket = refill(tokens, stamp, now, capacity, per_second)
+            self.buckets[key] = (tokens, now, now + bucket.reset)
+            if len(self.buckets) > self.sweep_size:
+                self.buckets = {key: state for key, state in self.buckets.items() if state[2] > now}
+                self.sweep_size = max(settings.THROTTLE_MAX_KEYS, 2 * len(self.buckets))
+        return bucket
+
+
+class CacheBucketStore:
+    """
+    Token buckets kept in the ``THROTTLE_CACHE`` cache, shared by every worker process.
+    Each check is one get and one set on the cache (Redis, Memcached...). Concurrent
+    requests of a key may read the same state, so bursts can exceed the limit by the
+    number of requests in flight.
+    """
+
+    def take(self, key, capacity, per_second):
+        cache = caches[settings.THROTTLE_CACHE]
+        now = time.time()
+        tokens, stamp = cache.get(f'throttle:{key}', (capacity, now))
+        tokens, bucket = refill(tokens, stamp, now, capacity, per_second)
+        cache.set(f'throttle:{key}', (tokens, now), timeout=int(bucket.reset) + 1)
+        return bucket
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    """Return the process-wide bucket store configured by the ``THROTTLE_STORE`` setting."""
+    return import_string(settings.THROTTLE_STORE)()
+
+
+class BucketThrottle(BaseThrottle):
+    """
+    Throttle taking a token from a bucket per route and per key for each request.
+    The rate of a route comes from ``THROTTLE_ROUTE_RATES[<route name>][<scope>]``, or
+    ``THROTTLE_RATES[<scope>]``; None disables the throttle. The tightest bucket of the
+    request is kept on it for the RateLimit headers (see RateLimitHeadersMiddleware).
+    """
+    scope = None
+
+    def get_key(self, request, view):
+        """Return the key the request is counted under, or None if this throttle does not apply."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        match = request.resolver_match
+        route = match.url_name if match is not None else None
+        rate = settings.THROTTLE_ROUTE_RATES.get(route, {}).get(self.scope, settings.THROTTLE_RATES.get(self.scope))
+        if rate is None:
+            return True
+
+        self.bucket = get_store().take(f'{self.scope}:{route}:{key}', *parse_rate(rate))
+        http_request = request._request
+        tightest = getattr(http_request, 'rate_limit', None)
+        if tightest is None or (self.bucket.allowed, self.bucket.remaining) < (tightest.allowed, tightest.remaining):
+            http_request.rate_limit = self.bucket
+        return self.bucket.allowed
+
+    def wait(self):
+        return self.bucket.wait
+
+
+class UserThrottle(BucketThrottle):
+    """Limit the requests of each authenticated user."""
+    scope = 'user'
+
+    def get_key(self, request, view):
+        return request.user.pk if request.user and request.user.is_authenticated else None
+
+
+class AnonThrottle(BucketThrottle):
+    """
+    Limit the anonymous requests of each client IP: logins and sign-ups, the only
+    routes open without a token.
+    """
+    scope = 'anon'
+
+    def get_key(self, request, view):
+        return None if request.user and request.user.is_authenticated else self.get_ident(request)
+
+
+class ProjectThrottle(BucketThrottle):
+    """Limit the writes to each project, whoever makes them."""
+    scope = 'project'
+
+    def get_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return view.kwargs.get(getattr(view, 'project_url_kwarg', 'project_id'))
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Add the ``RateLimit-Limit``, ``RateLimit-Remaining`` and ``RateLimit-Reset`` headers
+    of the tightest throttle bucket of the request to its response. Throttled responses
+    also get ``Retry-After`` from DRF.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        bucket = getattr(request, 'rate_limit', None)
+        if bucket is not None:
+            response['RateLimit-Limit'] = bucket.limit
+            response['RateLimit-Remaining'] = bucket.remaining
+            response['RateLimit-Reset'] = int(bucket.reset + 0.999)
+        return response
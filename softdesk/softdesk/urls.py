@@ -14,11 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path
 from django.shortcuts import redirect
-from projects.views import ProjectCommentAPIView, ProjectAPIView, ProjectContributorsView, ProjectIssueAPIView
-from users.views import UserAPIView, CreateUserAPIView
+from projects.views import ProjectCommentAPIView, ProjectAPIView, ProjectContributorsView, ProjectContributorsBulkView, ProjectIssueAPIView, SyncAPIView, NotificationAPIView, ProjectWebhookAPIView, IssueHistoryAPIView, IssueStatsAPIView, ProjectWorkloadAPIView, JobAPIView, ProjectArchiveAPIView, ProjectImportAPIView, IssueAttachmentAPIView, CommentAttachmentAPIView
+from projects.streams import project_events
+from users.views import UserAPIView, CreateUserAPIView, UserImportAPIView
+from softdesk.views import BatchAPIView
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -30,24 +32,52 @@ def redirect_to_token(request):
 
 urlpatterns = [
     path('', redirect_to_token, name='home'),
-    path('admin/', admin.site.urls),
     
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     path('api/users/create/', CreateUserAPIView.as_view(), name='create-user'),
+    path('api/users/import/', UserImportAPIView.as_view(), name='user-import'),
     path('api/users/', UserAPIView.as_view(), name='user-list'),
     path('api/users/<int:pk>/', UserAPIView.as_view(), name='user-detail'),
     
     path('projects/', ProjectAPIView.as_view(), name='project-list'),
+    path('projects/import/', ProjectImportAPIView.as_view(), name='project-import'),
     path('projects/<int:pk>/', ProjectAPIView.as_view(), name='project-detail'),
+    path('projects/<int:project_id>/archive/', ProjectArchiveAPIView.as_view(), name='project-archive'),
     
     path('projects/<int:project_id>/contributors/', ProjectContributorsView.as_view(), name='project-contributors'),
+    path('projects/<int:project_id>/contributors/bulk/', ProjectContributorsBulkView.as_view(), name='project-contributors-bulk'),
     path('projects/<int:project_id>/contributors/<int:user_id>/', ProjectContributorsView.as_view(), name='project-contributor'),
 
     path('projects/<int:project_id>/issues/', ProjectIssueAPIView.as_view(), name='list_create_issues'),
     path('projects/<int:project_id>/issues/<int:issue_id>/', ProjectIssueAPIView.as_view(), name='issue'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/history/', IssueHistoryAPIView.as_view(), name='issue-history'),
+    path('projects/<int:project_id>/issues/stats/', IssueStatsAPIView.as_view(), name='issue-stats'),
+    path('projects/<int:project_id>/workload/', ProjectWorkloadAPIView.as_view(), name='project-workload'),
+    path('projects/<int:project_id>/workload/rebalance/', ProjectWorkloadAPIView.as_view(), name='project-workload-rebalance'),
     
     path('projects/<int:project_id>/issues/<int:issue_id>/comments/', ProjectCommentAPIView.as_view(), name='comment-list-create'),
     path('projects/<int:project_id>/issues/<int:issue_id>/comments/<uuid:uuid>/', ProjectCommentAPIView.as_view(), name='comment-detail'),
+
+    path('projects/<int:project_id>/issues/<int:issue_id>/attachments/', IssueAttachmentAPIView.as_view(), name='issue-attachments'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/attachments/<uuid:uuid>/', IssueAttachmentAPIView.as_view(), name='issue-attachment'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/comments/<uuid:comment_uuid>/attachments/', CommentAttachmentAPIView.as_view(), name='comment-attachments'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/comments/<uuid:comment_uuid>/attachments/<uuid:uuid>/', CommentAttachmentAPIView.as_view(), name='comment-attachment'),
+
+    path('projects/<int:project_id>/webhooks/', ProjectWebhookAPIView.as_view(), name='project-webhooks'),
+    path('projects/<int:project_id>/webhooks/<int:webhook_id>/', ProjectWebhookAPIView.as_view(), name='project-webhook'),
+
+    path('projects/<int:project_id>/events/', project_events, name='project-events'),
+
+    path('sync/', SyncAPIView.as_view(), name='sync'),
+    path('jobs/<int:job_id>/', JobAPIView.as_view(), name='job'),
+    path('me/notifications/', NotificationAPIView.as_view(), name='notifications'),
+
+    path('batch/', BatchAPIView.as_view(), name='batch'),
 ]
+
+# The API-only settings profile (softdesk.settings_api) leaves the admin out.
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.append(path('admin/', admin.site.urls))
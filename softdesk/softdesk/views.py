@@ -0,0 +1,202 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from softdesk.budgets import counted
+
+_handler = None
+
+
+def get_handler():
+    """Return the handler running the sub-requests through the middleware chain, built on first use."""
+    global _handler
+    if _handler is None:
+        handler = BaseHandler()
+        handler.load_middleware()
+        _handler = handler
+    return _handler
+
+
+# Headers of the batch request that are forwarded to every sub-request.
+FORWARDED_META = ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST', 'HTTP_ACCEPT_LANGUAGE', 'wsgi.url_scheme')
+
+
+class BatchAPIView(APIView):
+    """
+    API view executing several API calls in a single round trip.
+    The request body holds a list of sub-requests targeting the routes declared in
+    ``softdesk/urls.py``. They are dispatched in-process through the middleware chain,
+    like any request (project routing, throttling, query budget, profiling), reusing
+    the user already authenticated for the batch (the JWT is decoded once, see
+    BatchAuthentication) and a membership cache shared by the permission checks of
+    every sub-request. Only the status and the JSON body of each sub-response are
+    returned: their headers (RateLimit-*, X-Profile) are not.
+    Request Data:
+        requests (list): Sub-requests, each a dict with ``method`` (default GET),
+                         ``path``, an optional JSON ``body`` and an optional ``id``
+                         echoed back in the result.
+        atomic (bool, optional): Run every sub-request in one transaction and roll it
+                                 back on the first failure. Defaults to True.
+        parallel (bool, optional): Run the sub-requests concurrently. Only honoured
+                                   when every sub-request is a read. Defaults to False.
+    Permissions:
+        - IsAuthenticated: User must be logged in
+    """
+    permission_classes = [IsAuthenticated]
+
+
+    def post(self, request):
+        """
+        Execute the sub-requests of a batch and return their responses in order.
+
+        Args:
+            request: HTTP request object containing the list of sub-requests
+        Returns:
+            Response: JSON response with one ``{id, status, body}`` entry per sub-request,
+                     or an error with 400 status if the batch is malformed
+        """
+        if not isinstance(request.data, dict):
+            return Response({"error": "The batch must be a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
+        sub_requests = request.data.get('requests')
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return Response({"error": "A non-empty list of requests is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(sub_requests) > max_requests:
+            return Response({"error": f"A batch cannot contain more than {max_requests} requests."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        for item in sub_requests:
+            if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+                return Response({"error": "Each request must be an object with a path."}, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(item.get('method', 'GET'), str):
+                return Response({"error": "The method of a request must be a string."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        membership_cache = {}
+        read_only = all(item.get('method', 'GET').upper() in SAFE_METHODS for item in sub_requests)
+
+        if request.data.get('parallel') and read_only:
+            run_in_thread = counted(self.run_in_thread)
+            with ThreadPoolExecutor(max_workers=getattr(settings, 'BATCH_MAX_WORKERS', 4)) as executor:
+                results = list(executor.map(lambda item: run_in_thread(request, item, membership_cache), sub_requests))
+        elif request.data.get('atomic', True):
+            results = self.run_atomic(request, sub_requests, membership_cache)
+        else:
+            results = [self.run(request, item, membership_cache) for item in sub_requests]
+
+        return Response(results)
+
+
+    def run_atomic(self, request, sub_requests, membership_cache):
+        """
+        Execute the sub-requests sequentially inside one transaction.
+        The first sub-request answering with an error status rolls back the whole
+        batch; the sub-requests after it are not executed. The transaction spans the
+        shards and project partitions as well, which sub-requests may write to.
+
+        Args:
+            request: The batch request.
+            sub_requests (list): The sub-request descriptions.
+            membership_cache (dict): The membership cache shared by the batch.
+        Returns:
+            list: One result entry per sub-request.
+        """
+        results = []
+        others = (set(settings.SHARDS) | set(settings.ISSUE_PARTITIONS.values())) - {DEFAULT_DB_ALIAS}
+        aliases = [DEFAULT_DB_ALIAS, *sorted(others)]
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            for item in sub_requests:
+                if results and results[-1]['status'] >= 400:
+                    results.append(self.result(item, status.HTTP_424_FAILED_DEPENDENCY, None))
+                    continue
+                results.append(self.run(request, item, membership_cache))
+            if any(result['status'] >= 400 for result in results):
+                for alias in aliases:
+                    transaction.set_rollback(True, using=alias)
+        return results
+
+
+    def run_in_thread(self, request, item, membership_cache):
+        """
+        Execute a read sub-request from a worker thread.
+        Each thread owns its database connection, which is released once the
+        sub-request is done. The sub-request counts its queries against its own budget.
+        """
+        try:
+            return self.run(request, item, membership_cache)
+        finally:
+            close_old_connections()
+
+
+    def run(self, request, item, membership_cache):
+        """
+        Resolve and dispatch a single sub-request.
+
+        Args:
+            request: The batch request providing the authenticated user.
+            item (dict): The sub-request description.
+            membership_cache (dict): The membership cache shared by the batch.
+        Returns:
+            dict: The ``{id, status, body}`` result of the sub-request.
+        """
+        method = item.get('method', 'GET').upper()
+        url = urlsplit(item['path'])
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return self.result(item, status.HTTP_404_NOT_FOUND, {"error": "Not found."})
+        if getattr(match.func, 'view_class', None) is BatchAPIView:
+            return self.result(item, status.HTTP_400_BAD_REQUEST, {"error": "Batches cannot be nested."})
+
+        sub_request = self.build_request(request, method, url, item.get('body'))
+        sub_request.membership_cache = membership_cache
+        response = get_handler().get_response(sub_request)
+
+        if method not in SAFE_METHODS:
+            # A write may change memberships (e.g. removing a contributor).
+            membership_cache.clear()
+
+        try:
+            body = json.loads(response.content) if response.content else None
+        except ValueError:
+            body = response.content.decode(response.charset, errors='replace')
+        return self.result(item, response.status_code, body)
+
+
+    def build_request(self, request, method, url, body):
+        """
+        Build the HttpRequest of a sub-request, authenticated as the batch user.
+        """
+        payload = json.dumps(body).encode() if body is not None else b''
+        environ = {key: value for key, value in request.META.items() if key in FORWARDED_META}
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(payload)),
+            'wsgi.input': BytesIO(payload),
+        })
+        sub_request = WSGIRequest(environ)
+        sub_request.batch_auth = (request.user, request.auth)
+        return sub_request
+
+
+    @staticmethod
+    def result(item, status_code, body):
+        return {"id": item.get('id'), "status": status_code, "body": body}
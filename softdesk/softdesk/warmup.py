@@ -0,0 +1,160 @@
+import importlib
+import logging
+import time
+import uuid
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DatabaseError, connections, router
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.urls.converters import IntConverter, UUIDConverter
+from django.utils.module_loading import module_has_submodule
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+logger = logging.getLogger(__name__)
+
+# Value given to each path converter to build a URL of every route.
+SAMPLE_VALUES = {IntConverter: 1, UUIDConverter: uuid.UUID(int=0)}
+# Client address of the warm-up requests, never a real client's throttle bucket.
+WARMUP_ADDRESS = '0.0.0.0'
+WARMUP_AUTHORIZATION = 'Bearer warmup'
+
+
+def sample_urls():
+    """
+    Compile the patterns of every route and return a URL of each top-level route.
+    Included URLconfs (the admin) are compiled but not requested.
+    Returns:
+        list: The (route name, path) pairs.
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict  # Compiles the patterns and the reverse lookups.
+    urls = []
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            pattern.reverse_dict
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            kwargs = {name: SAMPLE_VALUES.get(type(converter), 'warmup')
+                      for name, converter in pattern.pattern.converters.items()}
+            urls.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+    return urls
+
+
+def build_serializers():
+    """
+    Build the fields of every serializer declared in the ``serializers`` module of an
+    installed app, which loads the model metadata and field mappings DRF reads on use.
+    Returns:
+        int: The number of serializers built.
+    """
+    built = 0
+    for app_config in apps.get_app_configs():
+        if not module_has_submodule(app_config.module, 'serializers'):
+            continue
+        module = importlib.import_module(f'{app_config.name}.serializers')
+        for value in vars(module).values():
+            if (isinstance(value, type) and issubclass(value, BaseSerializer) and not issubclass(value, ListSerializer)
+                    and value.__module__ == module.__name__):
+                try:
+                    value(context={}).fields
+                    built += 1
+                except Exception:
+                    logger.debug("Serializer %s not warmed up", value.__name__, exc_info=True)
+    return built
+
+
+def send_requests(urls, application=None):
+    """
+    Send a GET request to each URL through the middleware and the views.
+    The requests carry an invalid token, so the API views refuse them (401) in their
+    authentication, before running any query of theirs; they still import and configure
+    the DRF request handling, the JWT authentication, the throttling and the rendering.
+    Args:
+        urls (list): The (route name, path) pairs to request.
+        application (WSGIHandler, optional): The application to send them to.
+    Returns:
+        int: The number of requests sent.
+    """
+    handler = application if isinstance(application, WSGIHandler) else WSGIHandler()
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+    host = hosts[0].lstrip('.') if hosts else 'localhost'
+    # Refused warm-up requests are expected: keep them out of the request log.
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        for _, path in urls:
+            response = handler({
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': host, 'SERVER_PORT': '80',
+                'HTTP_HOST': host, 'HTTP_AUTHORIZATION': WARMUP_AUTHORIZATION, 'REMOTE_ADDR': WARMUP_ADDRESS,
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+            }, lambda status, headers: None)
+            response.close()
+    finally:
+        request_logger.setLevel(level)
+    return len(urls)
+
+
+def prime_databases():
+    """
+    Open a connection to every database, applying its session settings (the SQLite
+    pragmas), and read one row of each table it holds, which loads the schema and the
+    first pages of the tables and indexes.
+    Returns:
+        int: The number of databases opened.
+    """
+    for alias in settings.DATABASES:
+        connection = connections[alias]
+        connection.ensure_connection()
+        for model in apps.get_models():
+            if router.allow_migrate_model(alias, model):
+                try:
+                    model._base_manager.using(alias).exists()
+                except DatabaseError:
+                    logger.debug("Table of %s not readable on %s", model._meta.label, alias, exc_info=True)
+    return len(settings.DATABASES)
+
+
+def warm_up(application=None):
+    """
+    Warm a worker up before it accepts traffic, and log how long it took.
+    The first requests served by a new worker otherwise pay for the URL pattern
+    compilation, the serializer fields, the lazy imports and settings of DRF and the
+    database connections. The databases are opened last, so that with persistent
+    connections (``CONN_MAX_AGE``) the first requests of the thread reuse them.
+    Servers loading the application before forking (gunicorn ``--preload``) must call
+    this from a worker hook (``post_worker_init``) instead: connections cannot be
+    shared between processes. Errors are logged and never prevent the worker from starting.
+    Args:
+        application (WSGIHandler, optional): The WSGI application to send the warm-up
+                                             requests through. A new one is built otherwise.
+    Returns:
+        dict: The duration (ms) of each phase and of the whole warm-up, or None on failure.
+    """
+    timings = {}
+
+    def timed(phase, function, *args):
+        phase_start = time.perf_counter()
+        result = function(*args)
+        timings[phase] = (time.perf_counter() - phase_start) * 1000
+        return result
+
+    start = time.perf_counter()
+    try:
+        urls = timed('routes', sample_urls)
+        serializers = timed('serializers', build_serializers)
+        requests = timed('requests', send_requests, urls, application)
+        databases = timed('databases', prime_databases)
+    except Exception:
+        logger.exception("Worker warm-up failed")
+        return None
+    timings['total'] = (time.perf_counter() - start) * 1000
+    logger.info(
+        "Worker warmed up in %.1f ms: %d routes (%.1f ms), %d serializers (%.1f ms), %d requests (%.1f ms), "
+        "%d databases (%.1f ms)", timings['total'], len(urls), timings['routes'], serializers, timings['serializers'],
+        requests, timings['requests'], databases, timings['databases'],
+    )
+    return timings
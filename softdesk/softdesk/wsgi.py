@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'softdesk.settings')
 
 application = get_wsgi_application()
+
+# Imported once the apps are loaded by get_wsgi_application().
+from softdesk.warmup import warm_up  # noqa: E402
+
+if settings.WARMUP_ON_START:
+    warm_up(application)
+
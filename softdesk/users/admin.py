@@ -1,8 +1,53 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
 from .models import CustomUser
 
 
-class UserAdmin(admin.ModelAdmin):
-    pass
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of the admin changelists of large tables.
+    Rows are counted up to ``ADMIN_COUNT_LIMIT``, with a count of a LIMIT subquery whose
+    cost does not grow with the table. Beyond it, PostgreSQL gives the planner estimate
+    of the filtered query; other databases report the limit, so the last pages of huge
+    changelists are reached by filtering rather than by page number.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        limit = settings.ADMIN_COUNT_LIMIT
+        counted = self.object_list.order_by()[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if connections[self.object_list.db].vendor == 'postgresql':
+            plan = json.loads(self.object_list.order_by().explain(format='json'))
+            return max(counted, int(plan[0]['Plan']['Plan Rows']))
+        return counted
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin of a table of millions of rows: pages are counted by the estimated-count
+    paginator and the unfiltered total is not counted at all. Subclasses show foreign keys
+    as raw IDs and join the ones they list, so a page costs the same queries whatever
+    the size of the table.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+
+
+class UserAdmin(LargeTableAdmin):
+    list_display = ('id', 'username', 'is_staff', 'is_active', 'created_time')
+    search_fields = ('=username',)
+
 
-admin.site.register(CustomUser, UserAdmin)
\ No newline at end of file
+admin.site.register(CustomUser, UserAdmin)
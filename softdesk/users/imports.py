@@ -0,0 +1,217 @@
+import csv
+import itertools
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import date, timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import password_validation
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .manager import AGE_ERROR, MINIMUM_AGE
+from .models import CustomUser
+from .serializers import UserImportSerializer
+
+FORMATS = ('csv', 'ndjson')
+TAKEN_ERROR = "A user with that username already exists."
+
+
+def guess_format(filename):
+    """Return the import format matching the extension of a file name, or None."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def upload_path(job_id, format):
+    """Return where the file uploaded for an import job is kept, under ``USER_IMPORT_ROOT``."""
+    return Path(settings.USER_IMPORT_ROOT) / f'{job_id}.{format}'
+
+
+def save_upload(upload, job_id, format):
+    """Write an uploaded file chunk by chunk to the path of its import job."""
+    path = upload_path(job_id, format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+
+
+def find_upload(job_id):
+    """Return the path of the file uploaded for an import job, or None once it is deleted."""
+    for format in FORMATS:
+        path = upload_path(job_id, format)
+        if path.exists():
+            return path
+    return None
+
+
+def read_rows(stream, format):
+    """
+    Read the rows of a user export one at a time, without loading the file.
+    Args:
+        stream: Text stream of the file; CSV files start with a header row.
+        format (str): 'csv' or 'ndjson' (one JSON object per line).
+    Yields:
+        tuple: (line number, row dict or None if the line is not a JSON object).
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def validate_chunk(rows, seen):
+    """
+    Validate a chunk of rows, and return the valid ones with the errors of the others.
+    Fields are checked row by row by UserImportSerializer; the age against one cutoff
+    date, the usernames against the database with one query for the chunk and against
+    the previous rows through ``seen``, and the passwords by AUTH_PASSWORD_VALIDATORS.
+    Args:
+        rows (list): (line number, row) pairs, as yielded by ``read_rows``.
+        seen (set): Usernames of the previous valid rows of the file, updated in place.
+    Returns:
+        tuple: (list of (line number, validated data), list of error dicts).
+    """
+    errors = []
+    parsed = []
+    for line, row in rows:
+        if row is None:
+            errors.append({'line': line, 'username': None, 'errors': {'non_field_errors': ["Invalid JSON object."]}})
+            continue
+        serializer = UserImportSerializer(data=row)
+        if serializer.is_valid():
+            parsed.append((line, serializer.validated_data))
+        else:
+            errors.append({'line': line, 'username': row.get('username'), 'errors': serializer.errors})
+
+    # Same rule as CustomUserManager.create_user: (today - date of birth).days // 365 >= MINIMUM_AGE.
+    cutoff = date.today() - timedelta(days=MINIMUM_AGE * 365)
+    taken = set(CustomUser.objects.filter(username__in=[data['username'] for _, data in parsed])
+                .values_list('username', flat=True))
+    valid = []
+    for line, data in parsed:
+        row_errors = {}
+        if data['date_of_birth'] > cutoff:
+            row_errors['date_of_birth'] = [AGE_ERROR]
+        if data['username'] in taken or data['username'] in seen:
+            row_errors['username'] = [TAKEN_ERROR]
+        try:
+            password_validation.validate_password(data['password'], CustomUser(**data))
+        except ValidationError as error:
+            row_errors['password'] = list(error.messages)
+        if row_errors:
+            errors.append({'line': line, 'username': data['username'], 'errors': row_errors})
+        else:
+            seen.add(data['username'])
+            valid.append((line, data))
+    return valid, errors
+
+
+def hashing_pool(workers):
+    """
+    Return a process pool hashing passwords, or a null context if ``workers`` is 0.
+    Workers are spawned rather than forked, the importing process possibly running
+    threads, and set Django up before their first task.
+    """
+    if not workers:
+        return nullcontext()
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+
+
+def insert(valid, hashes):
+    """
+    Insert the users of a validated chunk with one query, and mirror them to the shards.
+    Usernames taken by sign-ups completed since the validation are reported and the
+    others inserted again.
+    Args:
+        valid (list): (line number, validated data) pairs.
+        hashes: Iterable of the hashed passwords of the rows, in order.
+    Returns:
+        tuple: (list of created users, list of error dicts).
+    """
+    from projects import partitions
+
+    users = [CustomUser(**{**data, 'password': password}) for (_, data), password in zip(valid, hashes)]
+    lines = {user.username: line for (line, _), user in zip(valid, users)}
+    errors = []
+    while users:
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create(users)
+                partitions.mirror_created(users)
+            break
+        except IntegrityError:
+            taken = set(CustomUser.objects.filter(username__in=[user.username for user in users])
+                        .values_list('username', flat=True))
+            if not taken:
+                raise
+            errors.extend({'line': lines[username], 'username': username, 'errors': {'username': [TAKEN_ERROR]}}
+                          for username in sorted(taken, key=lines.get))
+            users = [user for user in users if user.username not in taken]
+    return users, errors
+
+
+def import_users(rows, chunk_size=None, workers=None, on_chunk=None):
+    """
+    Create users in bulk from the rows of an export, and report the rows rejected.
+    Rows go through in chunks: while the passwords of a chunk are hashed by the process
+    pool, the previous chunk is inserted and the next one read and validated. Every
+    chunk is inserted in its own transaction, so an interrupted import keeps the users
+    of the chunks already done, and a file can be imported again: its created users
+    are then reported as taken.
+    Args:
+        rows: Iterable of (line number, row) pairs, as yielded by ``read_rows``.
+        chunk_size (int, optional): Rows per chunk, ``USER_IMPORT_CHUNK_SIZE`` by default.
+        workers (int, optional): Hashing processes, ``USER_IMPORT_WORKERS`` by default.
+        on_chunk (callable, optional): Called with the number of users created and the
+            errors of each chunk once inserted, to report progress.
+    Returns:
+        dict: ``created`` (number of users created) and ``errors`` (list of the rejected
+              rows, each with its ``line``, ``username`` and field ``errors``, in line order).
+    """
+    chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+    workers = settings.USER_IMPORT_WORKERS if workers is None else workers
+    rows = iter(rows)
+    seen = set()
+    created, errors = 0, []
+
+    def flush(pending):
+        valid, hashes, chunk_errors = pending
+        users, insert_errors = insert(valid, hashes)
+        chunk_errors = sorted(chunk_errors + insert_errors, key=lambda error: error['line'])
+        errors.extend(chunk_errors)
+        if on_chunk is not None:
+            on_chunk(len(users), chunk_errors)
+        return len(users)
+
+    with hashing_pool(workers) as pool:
+        pending = None
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            valid, chunk_errors = validate_chunk(chunk, seen)
+            passwords = [data['password'] for _, data in valid]
+            if pool is None:
+                hashes = map(make_password, passwords)
+            else:
+                # Executor.map submits every password at once and returns their hashes in order.
+                hashes = pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+            if pending is not None:
+                created += flush(pending)
+            pending = (valid, hashes, chunk_errors)
+        if pending is not None:
+            created += flush(pending)
+    return {'created': created, 'errors': errors}
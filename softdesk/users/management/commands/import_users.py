@@ -0,0 +1,46 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import imports
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or NDJSON export, and report the rows rejected."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - to read the standard input.")
+        parser.add_argument('--format', choices=imports.FORMATS,
+                            help="Format of the file, guessed from its extension by default.")
+        parser.add_argument('--chunk-size', type=int, help="Rows validated, hashed and inserted together.")
+        parser.add_argument('--workers', type=int, help="Processes hashing the passwords (0: none).")
+        parser.add_argument('--report', help="File receiving the rejected rows, one JSON object per line "
+                                             "(standard error by default).")
+
+    def handle(self, *args, **options):
+        format = options['format'] or imports.guess_format(options['path'])
+        if format is None:
+            raise CommandError("Unknown file format: pass --format csv or --format ndjson.")
+        report = open(options['report'], 'w', encoding='utf-8') if options['report'] else self.stderr
+        created = 0
+
+        def on_chunk(count, errors):
+            nonlocal created
+            created += count
+            for error in errors:
+                report.write(json.dumps(error, ensure_ascii=False) + '\n')
+            self.stdout.write(f"{created} user(s) created so far.")
+
+        try:
+            with (open(options['path'], encoding='utf-8-sig', newline='') if options['path'] != '-'
+                  else sys.stdin) as stream:
+                result = imports.import_users(imports.read_rows(stream, format), options['chunk_size'],
+                                              options['workers'], on_chunk)
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(str(error))
+        finally:
+            if options['report']:
+                report.close()
+        self.stdout.write(f"{result['created']} user(s) created, {len(result['errors'])} row(s) rejected.")
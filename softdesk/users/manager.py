@@ -5,6 +5,10 @@ from rest_framework.exceptions import APIException
 from datetime import datetime, timedelta
 from django.utils.translation import gettext_lazy as _
 
+# Minimum age to sign up, in years of 365 days.
+MINIMUM_AGE = 15
+AGE_ERROR = "Vous devez avoir au moins 15 ans pour vous inscrire."
+
 
 class CustomUserManager(BaseUserManager):
     
@@ -68,8 +72,8 @@ class CustomUserManager(BaseUserManager):
         
         age = (datetime.now().date() - date_of_birth).days // 365
 
-        if age < 15:
-            raise APIException("Vous devez avoir au moins 15 ans pour vous inscrire.", code=status.HTTP_400_BAD_REQUEST)
+        if age < MINIMUM_AGE:
+            raise APIException(AGE_ERROR, code=status.HTTP_400_BAD_REQUEST)
 
         user = self.model(username=username, date_of_birth=date_of_birth, can_be_contacted=can_be_contacted, can_data_be_shared=can_data_be_shared, **extra_fields)
         user.set_password(password)
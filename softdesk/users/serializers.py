@@ -31,4 +31,15 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = CustomUser.objects.create_user(**validated_data)
-        return user
\ No newline at end of file
+        return user
+
+class UserImportSerializer(UserSerializer):
+    """
+    Serializer validating the rows of a bulk user import.
+    It checks the fields of one row like UserSerializer, but not the uniqueness of the
+    username: the importer checks the usernames of a whole chunk with one query.
+    """
+    class Meta(UserSerializer.Meta):
+        fields = ['username', 'password', 'date_of_birth', 'can_be_contacted', 'can_data_be_shared']
+        read_only_fields = []
+        extra_kwargs = {'username': {'validators': []}}
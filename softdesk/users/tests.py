@@ -1,3 +1,188 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from projects import outbox
+from softdesk.testing import PASSWORD, BudgetedAPITestCase, create_user
+from softdesk.throttling import get_store
+from users import imports
+from users.models import CustomUser
+
+CSV_HEADER = 'username,password,date_of_birth,can_be_contacted,can_data_be_shared\n'
+
+
+class UserQueryBudgetTests(BudgetedAPITestCase):
+    """The user endpoints stay within their query budget whatever the number of users."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+
+    def user_data(self, **fields):
+        return {'username': 'new', 'password': PASSWORD, 'date_of_birth': '1990-01-01', 'can_be_contacted': False,
+                'can_data_be_shared': False, **fields}
+
+    def test_sign_up_within_budget(self):
+        response = self.client.post(reverse('create-user'), self.user_data(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(CustomUser.objects.get(username='new').check_password(PASSWORD))
+
+    def test_reads_within_budget_at_any_size(self):
+        self.authenticate(self.user)
+        for size in (1, 20):
+            for number in range(size):
+                create_user(f'user{size}-{number}')
+            for url in (reverse('user-list'), reverse('user-detail', args=[self.user.pk])):
+                with self.subTest(url=url, size=size):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertWithinQueryBudget(response)
+
+
+@override_settings(THROTTLE_RATES={'user': '2/min', 'anon': '30/min'}, THROTTLE_ROUTE_RATES={'create-user': {'anon': '1/min'}})
+class ThrottleTests(BudgetedAPITestCase):
+    """Clients over their rate get a 429 with Retry-After, and every response the state of their bucket."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+
+    def setUp(self):
+        get_store.cache_clear()
+        self.addCleanup(get_store.cache_clear)
+
+    def test_user_rate(self):
+        self.authenticate(self.user)
+        remaining = [self.client.get(reverse('user-list'))['RateLimit-Remaining'] for _ in range(2)]
+        self.assertEqual(remaining, ['1', '0'])
+        response = self.client.get(reverse('user-list'))
+        self.assertEqual(response.status_code, 429)
+        # A token comes back every 30 seconds at 2/min.
+        self.assertEqual((response['Retry-After'], response['RateLimit-Limit']), ('30', '2'))
+        self.assertEqual(self.client.get(reverse('user-detail', args=[self.user.pk])).status_code, 200)
+
+    def test_route_rate(self):
+        data = {'username': 'new', 'password': PASSWORD, 'date_of_birth': '1990-01-01', 'can_be_contacted': False,
+                'can_data_be_shared': False}
+        self.assertEqual(self.client.post(reverse('create-user'), data, format='json').status_code, 201)
+        response = self.client.post(reverse('create-user'), {**data, 'username': 'other'}, format='json')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '60'))
+        self.assertFalse(CustomUser.objects.filter(username='other').exists())
+        # Other anonymous routes keep the default rate.
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'new', 'password': PASSWORD})
+        self.assertEqual((response.status_code, response['RateLimit-Limit']), (200, '30'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], USER_IMPORT_WORKERS=0)
+class UserImportTests(BudgetedAPITestCase):
+    """Bulk imports create the valid rows in chunks and report every rejected row with its line."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(USER_IMPORT_ROOT=self.directory / 'uploads')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def import_file(self, name, content, *args):
+        path = self.directory / name
+        path.write_text(content)
+        report = self.directory / 'report.ndjson'
+        call_command('import_users', str(path), '--report', str(report), *args, stdout=io.StringIO())
+        return [json.loads(line) for line in report.read_text().splitlines()]
+
+    def test_command_imports_csv_in_chunks(self):
+        rows = [f'user{number},{PASSWORD},1990-01-01,true,false' for number in range(5)] + [
+            f'young,{PASSWORD},2020-01-01,true,false',
+            f'user1,{PASSWORD},1990-01-01,true,false',
+            f'staff,{PASSWORD},1990-01-01,true,false',
+            'weak,123,1990-01-01,true,false',
+            f'dated,{PASSWORD},01/01/1990,true,false',
+        ]
+        errors = self.import_file('users.csv', CSV_HEADER + '\n'.join(rows) + '\n', '--chunk-size', '3')
+        self.assertEqual([(error['line'], error['username'], sorted(error['errors'])) for error in errors], [
+            (7, 'young', ['date_of_birth']),
+            (8, 'user1', ['username']),
+            (9, 'staff', ['username']),
+            (10, 'weak', ['password']),
+            (11, 'dated', ['date_of_birth']),
+        ])
+        self.assertEqual(CustomUser.objects.filter(username__startswith='user').count(), 5)
+        user = CustomUser.objects.get(username='user3')
+        self.assertTrue(user.check_password(PASSWORD))
+        self.assertTrue(user.can_be_contacted)
+
+    def test_command_hashes_in_process_pool(self):
+        rows = [json.dumps({'username': f'pooled{number}', 'password': PASSWORD, 'date_of_birth': '1990-01-01',
+                            'can_be_contacted': False, 'can_data_be_shared': False}) for number in range(2)]
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            errors = self.import_file('users.ndjson', '\n'.join(rows) + '\n', '--workers', '1')
+            users = CustomUser.objects.filter(username__startswith='pooled')
+            self.assertEqual(errors, [])
+            self.assertEqual(len(users), 2)
+            for user in users:
+                self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+                self.assertTrue(user.check_password(PASSWORD))
+
+    def upload(self, name, content):
+        self.authenticate(self.staff)
+        response = self.client.post(reverse('user-import'), {'file': SimpleUploadedFile(name, content)},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual((response.data['action'], response.data['status']), ('IMPORT', 'PENDING'))
+        return response.data['id']
+
+    def job(self, job_id):
+        response = self.client.get(reverse('job', args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_endpoint_queues_import_job(self):
+        lines = [json.dumps({'username': f'api{number}', 'password': PASSWORD, 'date_of_birth': '1990-01-01',
+                             'can_be_contacted': True, 'can_data_be_shared': True}) for number in range(9)]
+        lines.insert(3, '{"username": ')
+        job_id = self.upload('users.ndjson', '\n'.join(lines).encode())
+        self.assertFalse(CustomUser.objects.filter(username__startswith='api').exists())
+        self.assertTrue(imports.upload_path(job_id, 'ndjson').exists())
+
+        # The outbox worker hashes with the process pool, threads standing in for its processes here.
+        with override_settings(USER_IMPORT_WORKERS=2), \
+                mock.patch.object(imports, 'ProcessPoolExecutor',
+                                  side_effect=lambda workers, **options: ThreadPoolExecutor(workers)) as pool:
+            self.assertEqual(outbox.drain(concurrency=1), (1, 0))
+        self.assertEqual(pool.call_args.args, (2,))
+        job = self.job(job_id)
+        self.assertEqual((job['status'], job['processed_rows']), ('DONE', 10))
+        self.assertEqual(job['report'], {'created': 9, 'errors': [
+            {'line': 4, 'username': None, 'errors': {'non_field_errors': ["Invalid JSON object."]}}]})
+        self.assertEqual(CustomUser.objects.filter(username__startswith='api').count(), 9)
+        self.assertIsNone(imports.find_upload(job_id))
+
+    def test_unreadable_file_reported_on_job(self):
+        job_id = self.upload('users.csv', CSV_HEADER.encode() + b'\xff\xfe,,\n')
+        self.assertEqual(outbox.drain(concurrency=1), (1, 0))
+        job = self.job(job_id)
+        self.assertEqual(job['status'], 'DONE')
+        self.assertTrue(job['report']['error'].startswith('Unreadable file:'))
+        self.assertIsNone(imports.find_upload(job_id))
+
+    def test_endpoint_reserved_to_staff(self):
+        self.authenticate(create_user('member'))
+        upload = SimpleUploadedFile('users.csv', CSV_HEADER.encode())
+        response = self.client.post(reverse('user-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
@@ -1,11 +1,15 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from django.http import Http404
+from projects import jobs
+from projects.serializers import JobSerializer
+from softdesk.budgets import query_budget
+from users import imports
 from users.models import CustomUser
 from .serializers import UserSerializer
-from rest_framework.response import Response
-from rest_framework import status
 
 
 class CreateUserAPIView(APIView):
@@ -19,6 +23,7 @@ class CreateUserAPIView(APIView):
         Response: JSON response with user data and 201 status on success,
                   or validation errors with 400 status on failure.
     """
+    @query_budget(2)
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
@@ -27,6 +32,46 @@ class CreateUserAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserImportAPIView(APIView):
+    """
+    API view creating users in bulk from an uploaded CSV or NDJSON export.
+    Endpoint:
+        POST /api/users/import/
+    Permissions:
+        - IsAdminUser: Only staff users can import users
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    @query_budget(5)
+    def post(self, request):
+        """
+        Keep the uploaded file and queue the job importing it, whatever its size.
+        The outbox worker validates and creates the users with the process pool of the
+        ``import_users`` command; the job reports its progress, then the users created
+        and the rejected rows.
+
+        Request Data:
+            file: The CSV file (with a header row) or NDJSON file (one object per line) of
+                users, with the fields of the sign-up endpoint.
+            format (str, optional): 'csv' or 'ndjson', guessed from the file name by default.
+        Returns:
+            Response: JSON response with one of the following:
+                - 202: The import job, whose ``report`` holds once done the number of users
+                  ``created`` and the rejected rows under ``errors``, each with its ``line``,
+                  ``username`` and field ``errors``
+                - 400: Missing file or unknown format
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A 'file' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.data.get('format') or imports.guess_format(upload.name)
+        if format not in imports.FORMATS:
+            return Response({"error": "The format must be 'csv' or 'ndjson'."}, status=status.HTTP_400_BAD_REQUEST)
+        job = jobs.start_import(upload, format, request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
 class UserAPIView(APIView):
     
     def get_object(self, pk):
@@ -81,6 +126,7 @@ class UserAPIView(APIView):
         user.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+    @query_budget(2)
     def get(self, request, pk=None):
         """
         Retrieve user(s) information.